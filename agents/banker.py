@@ -1,4 +1,3 @@
-import random
 from decimal import Decimal as Dec
 from typing import Optional, Tuple
 
@@ -16,7 +15,7 @@ class Banker(MarketPlayer):
         """The time the order was placed as well as the fiat/hvn order"""
         self.nomin_havven_order: Optional[Tuple[int, "ob.Bid"]] = None
         self.nomin_fiat_order: Optional[Tuple[int, "ob.Ask"]] = None
-        self.sell_rate: Dec = hm.round_decimal(Dec(random.random()/3 + 0.1))
+        self.sell_rate: Dec = hm.round_decimal(Dec(self.model.random.random()/3 + 0.1))
         self.trade_premium: Dec = Dec('0.01')
         self.trade_duration: int = 10
         # step when initialised so nomins appear on the market.
@@ -453,6 +453,12 @@ class MarketPlayer(Agent):
         """
         return self.model.manager.round_decimal(self.nomins - self.unavailable_nomins)
 
+    def available(self, currency: str) -> Dec:
+        """
+        This agent's quantity of the named currency not tied up in orders.
+        """
+        return self.__getattribute__(f"available_{currency}")
+
     def round_values(self) -> None:
         """
         Apply rounding to this player's nomin, fiat, havven values.
@@ -1,4 +1,4 @@
-import random
+from functools import partial
 from decimal import Decimal as Dec
 from typing import Tuple, Optional, Callable
 
@@ -21,23 +21,23 @@ class Speculator(MarketPlayer):
 
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
-        self.risk_factor = Dec(random.random()/5+0.05)    # (5-25)%
+        self.risk_factor = Dec(self.model.random.random()/5+0.05)    # (5-25)%
         """How likely is the speculator going to place a trade if he
         doesn't have an active one"""
 
-        self.hold_duration = Dec(random.randint(20, 30))
+        self.hold_duration = Dec(self.model.random.randint(20, 30))
         """How long a speculator wants to hodl onto a trade"""
 
-        self.profit_goal = Dec(random.random()/10 + 0.01)  # (1-2)%
+        self.profit_goal = Dec(self.model.random.random()/10 + 0.01)  # (1-2)%
         """How much a speculator wants to profit on any trade"""
 
-        self.loss_cutoff = Dec(random.random()/20 + 0.01)  # (1-1.5)%
+        self.loss_cutoff = Dec(self.model.random.random()/20 + 0.01)  # (1-1.5)%
         """At what point does the speculator get rid of a trade"""
 
-        self.investment_fraction = Dec(random.random()/10 + 0.4)  # (40-50)%
+        self.investment_fraction = Dec(self.model.random.random()/10 + 0.4)  # (40-50)%
         """How much wealth does the speculator throw into a trade"""
 
-        self.primary_currency = random.choice(["havvens", "fiat", "nomins"])
+        self.primary_currency = self.model.random.choice(["havvens", "fiat", "nomins"])
         self.set_avail_primary()
 
     @property
@@ -51,11 +51,11 @@ class Speculator(MarketPlayer):
         the currency isn't one of the main 3
         """
         if self.primary_currency == "havvens":
-            self.avail_primary = lambda: self.available_havvens
+            self.avail_primary = partial(self.available, "havvens")
         elif self.primary_currency == "fiat":
-            self.avail_primary = lambda: self.available_fiat
+            self.avail_primary = partial(self.available, "fiat")
         elif self.primary_currency == "nomins":
-            self.avail_primary = lambda: self.available_nomins
+            self.avail_primary = partial(self.available, "nomins")
         else:
             raise Exception(f"currency:{self.primary_currency} isn't in [havvens, fiat, nomins]")
 
@@ -137,7 +137,7 @@ class Speculator(MarketPlayer):
         Making a trade involves buying into one of the markets, then deciding on a price
         to sell.
         """
-        if random.random() < self.risk_factor:
+        if self.model.random.random() < self.risk_factor:
             if direction == "ask":
                 price = market.highest_bid_price()
                 bid = market.bid(price, self.avail_primary()*self.investment_fraction, self)
@@ -190,7 +190,7 @@ class HavvenSpeculator(Speculator):
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
 
-        self.primary_currency = random.choice(["havvens", "havvens", "fiat", "nomins"])
+        self.primary_currency = self.model.random.choice(["havvens", "havvens", "fiat", "nomins"])
         # give an equal chance to short/long havvens
         self.change_currency()
 
@@ -207,22 +207,22 @@ class HavvenSpeculator(Speculator):
             self.set_avail_primary()
 
         if self.primary_currency == "havvens":
-            self.secondary_currency = random.choice(["fiat", "nomins"])
+            self.secondary_currency = self.model.random.choice(["fiat", "nomins"])
             self.direction = "bid"
             if self.secondary_currency == "fiat":
                 self.market = self.havven_fiat_market
-                self.avail_secondary = lambda: self.available_fiat
+                self.avail_secondary = partial(self.available, "fiat")
                 self.place_function = self.place_havven_fiat_bid_with_fee
                 self.sell_function = self.sell_fiat_for_havvens_with_fee
             else:  # secondary: nomins
                 self.market = self.havven_nomin_market
-                self.avail_secondary = lambda: self.available_nomins
+                self.avail_secondary = partial(self.available, "nomins")
                 self.place_function = self.place_nomin_fiat_bid_with_fee
                 self.sell_function = self.sell_nomins_for_havvens_with_fee
 
         elif self.primary_currency == "fiat":
             self.secondary_currency = "havvens"
-            self.avail_secondary = lambda: self.available_havvens
+            self.avail_secondary = partial(self.available, "havvens")
             self.market = self.havven_fiat_market
             self.direction = "ask"
             self.place_function = self.place_havven_fiat_ask_with_fee
@@ -230,7 +230,7 @@ class HavvenSpeculator(Speculator):
 
         else:  # primary: nomins
             self.secondary_currency = "havvens"
-            self.avail_secondary = lambda: self.available_havvens
+            self.avail_secondary = partial(self.available, "havvens")
             self.market = self.havven_nomin_market
             self.direction = "ask"
             self.place_function = self.place_havven_nomin_ask_with_fee
@@ -291,43 +291,43 @@ class NaiveSpeculator(Speculator):
             self.active_trade_b = None
 
         if self.primary_currency == "nomins":
-            self.avail_primary = lambda: self.available_nomins
+            self.avail_primary = partial(self.available, "nomins")
             self.direction_a = "bid"
-            self.a_currency = lambda: self.available_fiat
+            self.a_currency = partial(self.available, "fiat")
             self.market_a: ob.OrderBook = self.model.market_manager.nomin_fiat_market
             self.place_a_function = self.place_nomin_fiat_bid_with_fee
             self.sell_a_function = self.sell_fiat_for_nomins_with_fee
 
             self.direction_b = "ask"
-            self.b_currency = lambda: self.available_havvens
+            self.b_currency = partial(self.available, "havvens")
             self.market_b: ob.OrderBook = self.model.market_manager.havven_nomin_market
             self.place_b_function = self.place_havven_nomin_ask_with_fee
             self.sell_b_function = self.sell_havvens_for_nomins_with_fee
 
         if self.primary_currency == "havvens":
-            self.avail_primary = lambda: self.available_havvens
+            self.avail_primary = partial(self.available, "havvens")
             self.direction_a = "bid"
-            self.a_currency = lambda: self.available_nomins
+            self.a_currency = partial(self.available, "nomins")
             self.market_a: ob.OrderBook = self.model.market_manager.havven_nomin_market
             self.place_a_function = self.place_havven_nomin_bid_with_fee
             self.sell_a_function = self.sell_nomins_for_havvens_with_fee
 
             self.direction_b = "bid"
-            self.b_currency = lambda: self.available_fiat
+            self.b_currency = partial(self.available, "fiat")
             self.market_b: ob.OrderBook = self.model.market_manager.havven_fiat_market
             self.place_b_function = self.place_havven_fiat_bid_with_fee
             self.sell_b_function = self.sell_fiat_for_havvens_with_fee
 
         if self.primary_currency == "fiat":
-            self.avail_primary = lambda: self.available_fiat
+            self.avail_primary = partial(self.available, "fiat")
             self.direction_a = "ask"
-            self.a_currency = lambda: self.available_nomins
+            self.a_currency = partial(self.available, "nomins")
             self.market_a: ob.OrderBook = self.model.market_manager.nomin_fiat_market
             self.place_a_function = self.place_nomin_fiat_ask_with_fee
             self.sell_a_function = self.sell_nomins_for_fiat_with_fee
 
             self.direction_b = "ask"
-            self.b_currency = lambda: self.available_havvens
+            self.b_currency = partial(self.available, "havvens")
             self.market_b: ob.OrderBook = self.model.market_manager.havven_fiat_market
             self.place_b_function = self.place_havven_fiat_ask_with_fee
             self.sell_b_function = self.sell_havvens_for_fiat_with_fee
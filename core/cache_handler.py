@@ -9,12 +9,31 @@ these cached runs, without using large amounts of server resources by
 generating new data per user.
 """
 
-import pickle
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
 
 import tqdm
 
 from core import model
 from core import settingsloader
+from core.cache_store import CacheStore
+
+
+cache_path = "./cache_data"
+"""The directory holding the cache store."""
+
+legacy_cache_path = "./cache_data.pkl"
+"""
+Where caches were pickled before the cache store existed. Those caches are
+not imported, as they aren't keyed by the settings and code that made them,
+so their datasets are generated again.
+"""
+
+default_seed = 0
+"""The random seed of runs which don't set their own."""
 
 
 run_settings = [
@@ -22,6 +41,7 @@ run_settings = [
     # name: having a "Default" run is required
     #   - all names have to be unique
     # max_steps: required, and ignore whatever is in settings.ini
+    # seed: optional, the random seed for the run, default_seed if left out
     # settings: change the defaults set in settings.ini, per run
     #   - any settings that are not in settings.ini are ignored
     {
@@ -135,87 +155,220 @@ run_settings = [
 ]
 
 
-def generate_new_caches(data):
+def resolve_settings(item: Dict[str, Any]) -> Dict[str, Any]:
+    """The default settings, overwritten by the settings of a run_settings item."""
+    settings = settingsloader.get_defaults()
+
+    for section in item["settings"]:
+        for setting in item['settings'][section]:
+            settings[section][setting] = item["settings"][section][setting]
+    return settings
+
+
+def code_fingerprint() -> str:
     """
-    generate a new dataset for each dataset that doesn't already exist in data
+    A hash of the source of everything that determines the rendered frames:
+    the agents, managers, model, order book, statistics and visualisation
+    modules, and the element class the modules are built on.
+    Cached after the first call, as the code can't change under a running process.
+    """
+    global _code_fingerprint
+    if _code_fingerprint is None:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        paths = [os.path.join(root, "core", name) for name in fingerprinted_core_files]
+        paths.extend(os.path.join(root, "visualization", name) for name in fingerprinted_visualization_files)
+        for package in fingerprinted_packages:
+            for directory, _, files in os.walk(os.path.join(root, package)):
+                paths.extend(os.path.join(directory, f) for f in files if f.endswith(".py"))
+        digest = hashlib.sha256()
+        for path in sorted(paths):
+            digest.update(os.path.relpath(path, root).encode())
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        _code_fingerprint = digest.hexdigest()
+    return _code_fingerprint
 
-    overwrites the defined default settings for every run
 
-    generate visualisation results for every step up to max_steps, and save it to 'result'
+_code_fingerprint: Optional[str] = None
+
+fingerprinted_core_files = ["model.py", "orderbook.py", "stats.py", "server.py", "snapshot.py"]
+fingerprinted_visualization_files = ["visualization_element.py"]
+fingerprinted_packages = ["agents", "managers", os.path.join("visualization", "modules")]
 
-    store the result in the format:
-      data["name"] = {"data": result, "settings": settings, "max_steps": max_steps}
+
+def cache_key(settings: Dict[str, Any], seed: int) -> str:
+    """
+    The key of a cached run: a hash of its fully resolved settings, its seed
+    and the model code. max_steps is left out, as a longer run with the same
+    key begins with exactly the same frames.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(settings, sort_keys=True).encode())
+    digest.update(str(seed).encode())
+    digest.update(code_fingerprint().encode())
+    return digest.hexdigest()[:32]
+
+
+def generate_dataset(store: CacheStore, item: Dict[str, Any], key: str, progress: bool = True,
+                     checkpoint_interval: int = 0, resume: bool = True) -> str:
+    """
+    Run the model with the settings of a single run_settings item, and stream
+    the visualisation results of every step up to max_steps into a new
+    entry directory in the store.
+
+    Every checkpoint_interval steps, and at the end, the model and visualisation
+    elements are checkpointed with the frames. If resume is True, the run
+    continues from the last checkpoint of an interrupted run or of the stored
+    entry for this key, rather than from step 0, unless that checkpoint is past
+    max_steps.
+
+    Return the finished directory, which still has to be installed into the store.
     """
     from core.server import get_vis_elements
 
-    for n, item in enumerate(run_settings):
-        if item["name"] in data and len(data[item['name']]['data']) == item['max_steps']:
-            print("already have:", item['name'])
-            continue
-        print("\nGenerating", item["name"])
-        result = []
-        settings = settingsloader.get_defaults()
+    settings = resolve_settings(item)
+    seed = item.get("seed", default_seed)
 
-        for section in item["settings"]:
-            for setting in item['settings'][section]:
-                settings[section][setting] = item["settings"][section][setting]
+    model_settings = settings['Model']
+    model_settings['agent_fractions'] = settings['AgentFractions']
 
-        model_settings = settings['Model']
-        model_settings['agent_fractions'] = settings['AgentFractions']
+    writer = store.writer(item["name"], key, {
+        "settings": settings,
+        "seed": seed,
+        "max_steps": item["max_steps"],
+        "description": item["description"]
+    })
+    state = writer.start(resume)
+    if writer.steps > item["max_steps"]:
+        # the checkpoint is past the end of a run that got shorter
+        state = writer.start(resume=False)
 
+    if state is not None:
+        havven_model, vis_elements = state
+    else:
         havven_model = model.HavvenModel(
             model_settings,
             settings['Fees'],
             settings['Agents'],
-            settings['Havven']
+            settings['Havven'],
+            history_window=2,
+            seed=seed
         )
         vis_elements = get_vis_elements()
 
-        # # The following is for running the loop without tqdm
-        # # as when profiling the model tqdm shows up as ~17% runtime
-        # for i in range(item["max_steps"]):
-        #     if not i % 100:
-        #         print(f"{n+1}/{len(run_settings)} [{'='*(i//100)}{'-'*(item['max_steps']//100 - i//100)}" +
-        #               f"] {i}/{item['max_steps']}")
-
-        for i in tqdm.tqdm(range(item["max_steps"])):
-            havven_model.step()
-            step_data = []
-            for element in vis_elements:
-                if i == 0:
-                    if hasattr(element, "sent_data"):
-                        element.sent_data = False
-                        element_data = element.render(havven_model)
-                    else:
-                        element_data = element.render(havven_model)
-                else:
-                    element_data = element.render(havven_model)
-                step_data.append(element_data)
-
-            result.append(step_data)
-        data[item["name"]] = {
-            "data": result,
-            "settings": settings,
-            "max_steps": item["max_steps"],
-            "description": item["description"]
-        }
-    return data
-
-
-def load_saved():
-    try:
-        with open("./cache_data.pkl", 'rb') as f:
-            print("Loading from cache_data.pkl...")
-            data = pickle.load(f)
-    except IOError:
-        data = {}
-    except EOFError:
-        data = {}
-    return data
-
-
-def save_data(data):
-    """overwrite existing cache file with the presented data"""
-    with open("./cache_data.pkl", "wb") as f:
-        pickle.dump(data, f)
-    print("Caches saved to cache_data.pkl")
+    # # The following is for running the loop without tqdm
+    # # as when profiling the model tqdm shows up as ~17% runtime
+    # for i in range(item["max_steps"]):
+    #     if not i % 100:
+    #         print(f"{n+1}/{len(run_settings)} [{'='*(i//100)}{'-'*(item['max_steps']//100 - i//100)}" +
+    #               f"] {i}/{item['max_steps']}")
+
+    # if interrupted, the frames up to the last checkpoint are left to resume from
+    for i in tqdm.tqdm(range(writer.steps, item["max_steps"]), disable=not progress,
+                       initial=writer.steps, total=item["max_steps"]):
+        havven_model.step()
+        frame = havven_model.frame_snapshot()
+        step_data = []
+        for element in vis_elements:
+            if i == 0 and hasattr(element, "sent_data"):
+                element.sent_data = False
+            step_data.append(element.render(frame))
+        writer.append(step_data)
+        if checkpoint_interval > 0 and writer.steps % checkpoint_interval == 0:
+            writer.checkpoint((havven_model, vis_elements))
+    if checkpoint_interval > 0 and writer.steps % checkpoint_interval != 0:
+        writer.checkpoint((havven_model, vis_elements))
+    return writer.finish()
+
+
+def _generate_in_worker(path: str, chunk_size: int, item: Dict[str, Any], key: str,
+                        checkpoint_interval: int, resume: bool) -> str:
+    """Generate a dataset in a pool worker, which opens the store for itself."""
+    return generate_dataset(CacheStore(path, chunk_size), item, key, progress=False,
+                            checkpoint_interval=checkpoint_interval, resume=resume)
+
+
+def generate_new_caches(store: CacheStore, regenerate: bool = False,
+                        workers: Optional[int] = None,
+                        max_bytes: Optional[int] = None,
+                        checkpoint_interval: int = 0) -> CacheStore:
+    """
+    generate a new dataset for each dataset that isn't already in the store
+    under its current cache key, or every dataset if regenerate is True
+
+    overwrites the defined default settings for every run
+
+    a dataset whose settings, seed or model code have changed since it was
+    generated has a different key, so it is regenerated, unless an entry
+    with the new key is still stored, in which case the dataset points back at it
+
+    each dataset is independent, so they are simulated in parallel across a pool
+    of worker processes, one dataset per worker; each one is installed into the
+    store as soon as it finishes. workers is the size of the pool, one per CPU
+    if None or 0, and with a single worker everything runs in this process.
+
+    datasets are checkpointed every checkpoint_interval steps, so a dataset whose
+    max_steps grew, or whose generation was interrupted, carries on from its last
+    checkpoint; a dataset whose max_steps shrank is generated again from scratch,
+    as its checkpoint is past the new end, and regenerating starts every dataset
+    from scratch
+
+    afterwards, entries no dataset uses are evicted until the store fits in max_bytes
+    """
+    for name in store.names():
+        if name not in [item["name"] for item in run_settings]:
+            store.unlink(name)
+
+    to_generate: List[Tuple[Dict[str, Any], str]] = []
+    duplicates: List[Tuple[Dict[str, Any], str]] = []
+    for item in run_settings:
+        key = cache_key(resolve_settings(item), item.get("seed", default_seed))
+        reader = store.entry_reader(key)
+        if not regenerate and reader is not None and reader.steps == item['max_steps']:
+            if store.datasets.get(item["name"]) != key:
+                store.link(item["name"], key)
+            print("already have:", item['name'])
+            continue
+        if not regenerate and item["name"] in store:
+            print("stale:", item['name'])
+        if any(key == queued_key for _, queued_key in to_generate):
+            # identical runs share an entry, which is only generated once
+            duplicates.append((item, key))
+            continue
+        to_generate.append((item, key))
+
+    workers = min(workers or os.cpu_count() or 1, max(len(to_generate), 1))
+    if workers == 1:
+        for item, key in to_generate:
+            print("\nGenerating", item["name"])
+            store.install(item["name"], key, generate_dataset(
+                store, item, key, checkpoint_interval=checkpoint_interval, resume=not regenerate
+            ))
+    elif to_generate:
+        print(f"\nGenerating {len(to_generate)} datasets across {workers} processes")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(_generate_in_worker, store.path, store.chunk_size, item, key,
+                            checkpoint_interval, not regenerate): (item, key)
+                for item, key in to_generate
+            }
+            for future in tqdm.tqdm(as_completed(futures), total=len(futures)):
+                item, key = futures[future]
+                store.install(item["name"], key, future.result())
+                tqdm.tqdm.write(f"Generated {item['name']}")
+
+    for item, key in duplicates:
+        store.link(item["name"], key)
+
+    if max_bytes is not None:
+        for key in store.evict(max_bytes):
+            print("evicted:", key)
+    return store
+
+
+def load_saved() -> CacheStore:
+    """Open the cache store."""
+    if os.path.exists(legacy_cache_path):
+        print(f"{legacy_cache_path} is from an older version and is no longer read; "
+              f"its datasets will be generated again in {cache_path}, and it can be deleted.")
+    return CacheStore(cache_path)
@@ -0,0 +1,422 @@
+"""
+cache_store.py
+
+An on-disk store for cached model runs, holding each dataset in its own
+directory as a sequence of chunks of pre-rendered frames, so that single
+steps can be read through memory maps without loading the whole cache.
+
+Layout:
+    <store>/index.json            maps dataset names to the keys of their entries,
+                                  and records the size and last use of each entry
+    <store>/<key>/meta.json       the entry's settings, description and step count
+    <store>/<key>/chunk_00000.dat
+                                  the JSON encoded frames of steps [0, chunk_size)
+    <store>/<key>/chunk_00000.idx
+                                  the end offset of each frame in the .dat file,
+                                  as little-endian uint64
+    <store>/<key>/chunk_00000.json.gz
+                                  optionally, a chunk's frames as a precompressed JSON
+                                  array of [step, frame] pairs, written when first served
+                                  over HTTP (.json.br too, if brotli is installed)
+    <store>/<key>/checkpoint.pkl  optionally, the state to resume generating from
+    <store>/<key>.partial/        an entry that is still being generated
+
+Entries are written into a temporary directory and swapped into place
+when finished, so regenerating one dataset never touches the others, and
+a reader never sees a half written dataset.
+"""
+
+import gzip
+import json
+import mmap
+import os
+import pickle
+import shutil
+import sys
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional
+
+from core.metrics import Counter
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _read_json(path: str) -> Any:
+    with open(path) as f:
+        return json.load(f)
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    """Hard link a file, copying it if it can't be linked."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _write_json(path: str, value: Any) -> None:
+    """Write a json file atomically, by writing a temporary file and replacing."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(value, f)
+    os.replace(tmp_path, path)
+
+
+def encode_frame(frame: Any) -> bytes:
+    """Encode a rendered frame the same way every time, as compact JSON."""
+    return json.dumps(frame, separators=(',', ':')).encode()
+
+
+compressed_chunks = Counter("cache_compressed_chunks_total",
+                            "Requests for compressed chunks, by whether they were compressed already.")
+
+compressors = {"gzip": (".gz", lambda data: gzip.compress(data, 9, mtime=0))}
+"""The content encodings chunks can be precompressed with, by name: the file extension and compressor."""
+if brotli is not None:
+    compressors["br"] = (".br", brotli.compress)
+
+
+class DatasetWriter:
+    """
+    Append frames to a new version of a dataset, writing out each chunk as it
+    fills, so only one chunk of frames is ever held in memory.
+
+    The writer can store checkpoints alongside the frames: any picklable state
+    which is enough to carry on generating from the current step. A later
+    writer for the same key resumes from the last checkpoint, either of an
+    unfinished (e.g. interrupted) dataset, or of the stored entry, to extend it.
+    """
+
+    checkpoint_name = "checkpoint.pkl"
+
+    def __init__(self, store: "CacheStore", name: Optional[str], key: str, meta: Dict[str, Any]) -> None:
+        self.store = store
+        self.name = name
+        self.key = key
+        self.meta = dict(meta)
+        self.chunk_size: int = self.meta.setdefault("chunk_size", store.chunk_size)
+        self.path = os.path.join(store.path, f"{key}.partial")
+
+        self.steps = 0
+        self._frames: List[bytes] = []
+        """The frames of the current chunk, which is not yet full."""
+
+    def start(self, resume: bool = True) -> Optional[Any]:
+        """
+        Prepare the dataset directory. If resuming, pick up from the last
+        checkpoint of an unfinished or stored version of this entry, and
+        return the checkpointed state, or None if there is nothing to resume.
+        """
+        if not resume and os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        if resume and not os.path.exists(self.path):
+            entry_path = os.path.join(self.store.path, self.key)
+            if os.path.exists(os.path.join(entry_path, self.checkpoint_name)):
+                # files are replaced rather than rewritten, so the entry's can be shared
+                shutil.copytree(entry_path, self.path, copy_function=_link_or_copy)
+        os.makedirs(self.path, exist_ok=True)
+
+        checkpoint_path = os.path.join(self.path, self.checkpoint_name)
+        if not resume or not os.path.exists(checkpoint_path):
+            self._truncate(0)
+            return None
+        with open(checkpoint_path, "rb") as f:
+            checkpoint = pickle.load(f)
+        if checkpoint["chunk_size"] != self.chunk_size:
+            self._truncate(0)
+            return None
+        self._truncate(checkpoint["step"])
+        return checkpoint["state"]
+
+    def _truncate(self, steps: int) -> None:
+        """
+        Throw away every frame from the given step on, loading the frames
+        before it in the last, unfinished chunk back into memory.
+        """
+        self.steps = steps
+        last_chunk, remainder = divmod(steps, self.chunk_size)
+        self._frames = []
+        if remainder:
+            reader = DatasetReader(self.path, {"steps": steps, "chunk_size": self.chunk_size})
+            first = last_chunk * self.chunk_size
+            self._frames = [bytes(reader.frame_bytes(step)) for step in range(first, steps)]
+            reader.close()
+        for entry in os.scandir(self.path):
+            if entry.name.startswith("chunk_") and int(entry.name[6:11]) >= last_chunk:
+                os.remove(entry.path)
+
+    def append(self, frame: Any) -> None:
+        """Add the rendered frame for the next step."""
+        self._frames.append(encode_frame(frame))
+        self.steps += 1
+        if len(self._frames) >= self.chunk_size:
+            self._write_chunk()
+            self._frames = []
+
+    def _write_chunk(self) -> None:
+        """Write the frames of the current chunk, which may not be full yet."""
+        if not self._frames:
+            return
+        chunk = (self.steps - 1) // self.chunk_size
+        offsets = array('Q')
+        end = 0
+        for frame in self._frames:
+            end += len(frame)
+            offsets.append(end)
+        if sys.byteorder != "little":
+            offsets.byteswap()
+        base = os.path.join(self.path, f"chunk_{chunk:05d}")
+        with open(f"{base}.dat", "wb") as f:
+            f.write(b"".join(self._frames))
+        with open(f"{base}.idx", "wb") as f:
+            offsets.tofile(f)
+
+    def checkpoint(self, state: Any) -> None:
+        """
+        Save the given state as the point to resume from at the current step,
+        writing out the frames so far so that they survive with it.
+        """
+        self._write_chunk()
+        checkpoint_path = os.path.join(self.path, self.checkpoint_name)
+        with open(f"{checkpoint_path}.tmp", "wb") as f:
+            pickle.dump({"step": self.steps, "chunk_size": self.chunk_size, "state": state}, f)
+        os.replace(f"{checkpoint_path}.tmp", checkpoint_path)
+
+    def finish(self) -> str:
+        """
+        Write the last partial chunk and the dataset's metadata, returning the
+        finished temporary directory, ready to be installed into a store.
+        """
+        self._write_chunk()
+        self.meta["name"] = self.name
+        self.meta["key"] = self.key
+        self.meta["steps"] = self.steps
+        _write_json(os.path.join(self.path, "meta.json"), self.meta)
+        return self.path
+
+    def close(self) -> None:
+        """Finish the dataset and swap it into the store."""
+        self.store.install(self.name, self.key, self.finish())
+
+    def abort(self) -> None:
+        """Throw away the partially written dataset."""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class DatasetReader:
+    """
+    Read frames of a dataset, memory mapping chunks as they are first needed.
+    """
+
+    def __init__(self, path: str, meta: Optional[Dict[str, Any]] = None) -> None:
+        self.path = path
+        if meta is None:
+            meta = _read_json(os.path.join(path, "meta.json"))
+        self.meta: Dict[str, Any] = meta
+        self.steps: int = self.meta["steps"]
+        self.chunk_size: int = self.meta["chunk_size"]
+        self._chunks: Dict[int, tuple] = {}
+
+    def _chunk(self, chunk: int) -> tuple:
+        if chunk not in self._chunks:
+            base = os.path.join(self.path, f"chunk_{chunk:05d}")
+            offsets = array('Q')
+            with open(f"{base}.idx", "rb") as f:
+                offsets.frombytes(f.read())
+            if sys.byteorder != "little":
+                offsets.byteswap()
+            with open(f"{base}.dat", "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._chunks[chunk] = (offsets, data)
+        return self._chunks[chunk]
+
+    def frame_bytes(self, step: int) -> bytes:
+        """The encoded frame of a step, which must be in [0, steps)."""
+        chunk, i = divmod(step, self.chunk_size)
+        offsets, data = self._chunk(chunk)
+        start = offsets[i - 1] if i > 0 else 0
+        return data[start:offsets[i]]
+
+    def frame(self, step: int) -> Any:
+        """The decoded frame of a step, which must be in [0, steps)."""
+        return json.loads(self.frame_bytes(step).decode())
+
+    @property
+    def chunk_count(self) -> int:
+        return -(-self.steps // self.chunk_size)
+
+    def chunk_steps(self, chunk: int) -> range:
+        """The steps held in a chunk."""
+        return range(chunk * self.chunk_size, min((chunk + 1) * self.chunk_size, self.steps))
+
+    def chunk_json(self, chunk: int) -> bytes:
+        """
+        A chunk's frames as a JSON array of [step, frame] pairs, with steps
+        numbered from 1, as they are sent to clients.
+        """
+        return b"[%s]" % b",".join(
+            b"[%d,%s]" % (step + 1, self.frame_bytes(step)) for step in self.chunk_steps(chunk)
+        )
+
+    def compressed_chunk(self, chunk: int, encoding: str) -> bytes:
+        """
+        The chunk_json of a chunk, compressed with one of the compressors.
+        It is compressed once, and then kept on disk next to the chunk.
+        """
+        extension, compress = compressors[encoding]
+        path = os.path.join(self.path, f"chunk_{chunk:05d}.json{extension}")
+        compressed_chunks.inc(result="hit" if os.path.exists(path) else "miss")
+        if not os.path.exists(path):
+            with open(f"{path}.tmp-{os.getpid()}", "wb") as f:
+                f.write(compress(self.chunk_json(chunk)))
+            os.replace(f"{path}.tmp-{os.getpid()}", path)
+        with open(path, "rb") as f:
+            return f.read()
+
+    def checkpoint(self) -> Optional[Dict[str, Any]]:
+        """The checkpoint stored with the entry, as {"step": ..., "state": ...}, or None."""
+        path = os.path.join(self.path, DatasetWriter.checkpoint_name)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    def close(self) -> None:
+        for _, data in self._chunks.values():
+            data.close()
+        self._chunks = {}
+
+
+class CacheStore:
+    """
+    A directory of independently written, chunked datasets.
+
+    Each stored run is an entry addressed by a key, which the caller derives
+    from everything that determines the run's frames, and each dataset name
+    points at the entry for its current key. Entries which no name points at
+    any more are kept, in case their key comes back, until the store grows
+    past its size limit and they are evicted, least recently used first.
+    """
+
+    def __init__(self, path: str, chunk_size: int = 128) -> None:
+        self.path = path
+        self.chunk_size = chunk_size
+        os.makedirs(path, exist_ok=True)
+        self.index_path = os.path.join(path, "index.json")
+        self.datasets: Dict[str, str] = {}
+        """Dataset names and the keys of the entries they point at."""
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        """The size and last use time of every stored entry, by key."""
+        if os.path.exists(self.index_path):
+            index = _read_json(self.index_path)
+            if index.get("version") == 2:
+                self.datasets = index["datasets"]
+                self.entries = index["entries"]
+        self._readers: Dict[str, DatasetReader] = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.datasets
+
+    def names(self) -> List[str]:
+        return list(self.datasets)
+
+    def has_entry(self, key: str) -> bool:
+        return key in self.entries
+
+    def entry_reader(self, key: str) -> Optional[DatasetReader]:
+        """A reader for the entry with this key, or None if it isn't stored."""
+        if key not in self.entries:
+            return None
+        if key not in self._readers:
+            self._readers[key] = DatasetReader(os.path.join(self.path, key))
+        return self._readers[key]
+
+    def reader(self, name: str) -> Optional[DatasetReader]:
+        """A reader for the named dataset, or None if it isn't stored."""
+        if name not in self.datasets:
+            return None
+        return self.entry_reader(self.datasets[name])
+
+    def meta(self, name: str) -> Optional[Dict[str, Any]]:
+        reader = self.reader(name)
+        return reader.meta if reader is not None else None
+
+    def writer(self, name: Optional[str], key: str, meta: Dict[str, Any]) -> DatasetWriter:
+        """
+        Create a writer for the entry of a dataset, which must be started
+        before writing; the name points at the entry once it's installed.
+        """
+        return DatasetWriter(self, name, key, meta)
+
+    def link(self, name: str, key: str) -> None:
+        """Point a dataset name at an existing entry."""
+        self.datasets[name] = key
+        self.entries[key]["last_used"] = time.time()
+        self._save_index()
+
+    def unlink(self, name: str) -> None:
+        """Forget a dataset name, leaving its entry to be evicted."""
+        if self.datasets.pop(name, None) is not None:
+            self._save_index()
+
+    def install(self, name: Optional[str], key: str, tmp_path: str) -> None:
+        """
+        Swap a finished temporary dataset directory in as the entry for a key,
+        replacing any old version, and point the name at it. Entries installed
+        without a name can be evicted straight away.
+        Only one process should install into a store at a time, as this
+        rewrites the index.
+        """
+        self._drop_reader(key)
+        final_path = os.path.join(self.path, key)
+        old_path = None
+        if os.path.exists(final_path):
+            old_path = f"{final_path}.old-{os.getpid()}"
+            os.rename(final_path, old_path)
+        os.rename(tmp_path, final_path)
+        if old_path is not None:
+            shutil.rmtree(old_path, ignore_errors=True)
+        size = sum(entry.stat().st_size for entry in os.scandir(final_path))
+        self.entries[key] = {"size": size, "last_used": time.time()}
+        if name is not None:
+            self.link(name, key)
+        else:
+            self._save_index()
+
+    def evict(self, max_bytes: int, keep: Iterable[str] = ()) -> List[str]:
+        """
+        Delete unnamed entries, least recently used first, until the store
+        is no larger than max_bytes, except those with keys in keep.
+        Return the evicted keys.
+        """
+        total = sum(entry["size"] for entry in self.entries.values())
+        named = set(self.datasets.values()) | set(keep)
+        evicted = []
+        for key in sorted(self.entries, key=lambda k: self.entries[k]["last_used"]):
+            if total <= max_bytes:
+                break
+            if key in named:
+                continue
+            total -= self.entries.pop(key)["size"]
+            self._drop_reader(key)
+            shutil.rmtree(os.path.join(self.path, key), ignore_errors=True)
+            evicted.append(key)
+        if evicted:
+            self._save_index()
+        return evicted
+
+    def _drop_reader(self, key: str) -> None:
+        reader = self._readers.pop(key, None)
+        if reader is not None:
+            reader.close()
+
+    def _save_index(self) -> None:
+        _write_json(self.index_path, {"version": 2, "datasets": self.datasets, "entries": self.entries})
+
+    def close(self) -> None:
+        for key in list(self._readers):
+            self._drop_reader(key)
@@ -0,0 +1,210 @@
+"""
+metrics.py
+
+Operational metrics of the servers, exposed at /metrics in the Prometheus
+text format, for tuning them.
+
+Metrics are created once, at import, in the modules they measure, and are
+registered in the module's registry. Each can be split by labels, given as
+keyword arguments when it is updated. Gauges of things the servers already
+keep track of (sessions, pools) are read when the metrics are scraped.
+"""
+
+import abc
+import bisect
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import tornado.web
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        '%s="%s"' % (name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{%s}" % ",".join(escaped)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Metric(abc.ABC):
+    """A named metric, with a value for each set of labels it has been updated with."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, registry: Optional["Registry"] = None) -> None:
+        self.name = name
+        self.description = description
+        self.lock = threading.Lock()
+        (registry if registry is not None else default_registry).register(self)
+
+    @abc.abstractmethod
+    def samples(self) -> List[str]:
+        """The exposition lines of the metric's values."""
+
+    def remove(self, **labels) -> None:
+        """Forget the value of a set of labels, e.g. of a session that has closed."""
+        with self.lock:
+            self.values.pop(_label_key(labels), None)
+
+    def expose(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(Metric):
+    """A count that only goes up, like requests served or bytes sent."""
+
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            return [f"{self.name}{_format_labels(key)} {_format_value(value)}"
+                    for key, value in self.values.items()]
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down. Either set, or read from read() whenever
+    the metrics are scraped, which returns a value, or a list of (labels, value).
+    """
+
+    kind = "gauge"
+
+    def __init__(self, *args, read: Optional[Callable] = None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.values: Dict[LabelKey, float] = {}
+        self.read = read
+
+    def set(self, value: float, **labels) -> None:
+        with self.lock:
+            self.values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self) -> List[str]:
+        if self.read is not None:
+            read = self.read()
+            if not isinstance(read, list):
+                read = [({}, read)]
+            values = {_label_key(labels): value for labels, value in read}
+        else:
+            with self.lock:
+                values = dict(self.values)
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in values.items()]
+
+
+class Histogram(Metric):
+    """The distribution of observed values, like latencies, counted into buckets."""
+
+    kind = "histogram"
+
+    default_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, *args, buckets: Sequence[float] = default_buckets, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = sorted(buckets)
+        # per set of labels: the count in each bucket (not cumulative), and the sum
+        self.values: Dict[LabelKey, Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total = self.values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[index] += 1
+            self.values[key] = (counts, total + value)
+
+    def time(self, **labels) -> "_Timer":
+        """A context manager observing the seconds its body takes."""
+        return _Timer(self, labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self.lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self.values.items()}
+        for key, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + [math.inf], counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, object]) -> None:
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Registry:
+    """The metrics to expose, by name."""
+
+    def __init__(self) -> None:
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        if metric.name in self.metrics:
+            raise ValueError(f"A metric named {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+
+    def expose(self) -> str:
+        """Every metric, in the Prometheus text format."""
+        return "\n".join(metric.expose() for metric in self.metrics.values()) + "\n"
+
+
+default_registry = Registry()
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    """
+    GET /metrics: the servers' metrics, in the Prometheus text format.
+    Only served to requests from the same machine.
+    """
+
+    def get(self):
+        if self.request.remote_ip not in ("127.0.0.1", "::1"):
+            raise tornado.web.HTTPError(403)
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.set_header("Cache-Control", "no-cache")
+        self.write(default_registry.expose())
@@ -1,7 +1,8 @@
 """model.py: The Havven model itself lives here."""
 
+import random
 from decimal import Decimal as Dec
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 from mesa import Model
 from mesa.time import RandomActivation
@@ -10,7 +11,21 @@ import agents as ag
 from managers import (HavvenManager, MarketManager,
                   FeeManager, Mint,
                   AgentManager)
-from core import stats
+from core import stats, snapshot
+from core.sinks import MetricSink
+
+
+class SeededActivation(RandomActivation):
+    """
+    Activate the agents in a random order per step, drawn from the model's
+    own random number generator rather than the one shared by the process.
+    """
+    def step(self) -> None:
+        self.model.random.shuffle(self.agents)
+        for agent in self.agents[:]:
+            agent.step()
+        self.steps += 1
+        self.time += 1
 
 
 class HavvenModel(Model):
@@ -26,7 +41,10 @@ class HavvenModel(Model):
                  model_settings: Dict[str, Any],
                  fee_settings: Dict[str, Any],
                  agent_settings: Dict[str, Any],
-                 havven_settings: Dict[str, Any]) -> None:
+                 havven_settings: Dict[str, Any],
+                 sinks: Optional[List[MetricSink]] = None,
+                 history_window: int = 0,
+                 seed: Optional[int] = None) -> None:
         """
 
         :param model_settings: Setting that are modifiable on the frontend
@@ -38,6 +56,12 @@ class HavvenModel(Model):
         :param fee_settings: explained in feemanager.py
         :param agent_settings: explained in agentmanager.py
         :param havven_settings: explained in havvenmanager.py
+        :param sinks: metric sinks which are written to after every step
+        :param history_window: if positive, only this many steps of collected
+         data are kept in memory (at least two, so visualisations can still
+         tell the first step apart); use sinks to keep the rest
+        :param seed: the seed for the model's random number generator, which makes
+         runs with the same settings reproducible; random if None
         """
         agent_fractions = model_settings['agent_fractions']
         num_agents = model_settings['num_agents']
@@ -45,13 +69,19 @@ class HavvenModel(Model):
         continuous_order_matching = model_settings['continuous_order_matching']
 
         # Mesa setup.
-        super().__init__()
+        super().__init__(seed)
+
+        # Every random choice in the run is drawn from here, so that runs don't
+        # depend on which thread built them, or what else uses the global generator.
+        self.random = random.Random(seed)
 
         # The schedule will activate agents in a random order per step.
-        self.schedule = RandomActivation(self)
+        self.schedule = SeededActivation(self)
 
         # Set up data collection.
         self.datacollector = stats.create_datacollector()
+        self.sinks: List[MetricSink] = sinks if sinks is not None else []
+        self.history_window: int = max(2, history_window) if history_window > 0 else 0
 
         # Initialise simulation managers.
         self.manager = HavvenManager(
@@ -73,6 +103,27 @@ class HavvenModel(Model):
             agent_settings
         )
 
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        The datacollector's reporters are lambdas, which can't be pickled,
+        so only its collected values are kept, and it is rebuilt on unpickling.
+        """
+        state = self.__dict__.copy()
+        state['datacollector'] = (self.datacollector.model_vars, self.datacollector.agent_vars)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        model_vars, agent_vars = state['datacollector']
+        self.__dict__.update(state)
+        self.datacollector = stats.create_datacollector()
+        self.datacollector.model_vars = model_vars
+        self.datacollector.agent_vars = agent_vars
+        # everything the model holds has been restored by now
+        for book in (self.market_manager.havven_nomin_market,
+                     self.market_manager.havven_fiat_market,
+                     self.market_manager.nomin_fiat_market):
+            book.restore_order_lists()
+
     def fiat_value(self, havvens=Dec('0'), nomins=Dec('0'),
                    fiat=Dec('0')) -> Dec:
         """Return the equivalent fiat value of the given currency basket."""
@@ -88,6 +139,9 @@ class HavvenModel(Model):
 
     def step(self) -> None:
         """Advance the model by one step."""
+        # the model may be stepped on a different thread to the one that created it
+        self.manager.set_rounding()
+
         # Agents submit trades.
         self.schedule.step()
 
@@ -103,10 +157,26 @@ class HavvenModel(Model):
 
         # Distribute fees periodically.
         if (self.manager.time % self.fee_manager.fee_period) == 0:
-            self.fee_manager.distribute_fees(self.schedule.agents)
+            self.fee_manager.distribute_fees(self.agent_manager.ordered_agents())
 
         # Collect data.
         self.datacollector.collect(self)
+        for sink in self.sinks:
+            sink.write(self)
+        if self.history_window:
+            stats.trim_history(self.datacollector, self.history_window)
 
         # Advance Time Itself.
         self.manager.time += 1
+
+    def frame_snapshot(self) -> "snapshot.FrameSnapshot":
+        """
+        A snapshot of the latest step, in plain values, for the visualisation
+        modules to render from, without needing the model itself.
+        """
+        return snapshot.take_snapshot(self)
+
+    def close_sinks(self) -> None:
+        """Flush and close every metric sink, to be called once the run is over."""
+        for sink in self.sinks:
+            sink.close()
@@ -1,6 +1,6 @@
 """orderbook: an order book for trading in a market."""
 
-from typing import Iterable, Callable, List, Optional, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from decimal import Decimal as Dec
 from itertools import takewhile
 from collections import namedtuple
@@ -158,6 +158,16 @@ class TradeRecord:
                f" + ({self.bid_fee}, {self.ask_fee}) t:{self.completion_time} {self.book.name}"
 
 
+def _descending(price: Dec) -> Dec:
+    """Key for ordering price buckets highest-first (a named function, so books can be pickled)."""
+    return -price
+
+
+def _ascending(price: Dec) -> Dec:
+    """Key for ordering price buckets lowest-first."""
+    return price
+
+
 # A type for matching functions in the order book.
 Matcher = Callable[[Bid, Ask], Optional[TradeRecord]]
 
@@ -219,8 +229,8 @@ class OrderBook:
         self.asks = SortedListWithKey(key=Ask.comparator)
 
         # These dicts store the quantities demanded or supplied at each price.
-        self.bid_price_buckets = SortedDict(lambda x: -x)
-        self.ask_price_buckets = SortedDict(lambda x: x)
+        self.bid_price_buckets = SortedDict(_descending)
+        self.ask_price_buckets = SortedDict(_ascending)
 
         # These members save on recomputation of the price when it's consulted multiple times per step.
         self._cached_price: Dec = Dec('1.0')
@@ -244,6 +254,14 @@ class OrderBook:
         # A list of all successful trades.
         self.history: List[TradeRecord] = []
 
+        # The total quantity each agent has bought and sold in this market,
+        # by unique id, kept up as trades are made.
+        self.filled_volume: Dict[int, List[Dec]] = {}
+
+        # The total quantity of each agent's open asks and bids in this market,
+        # by unique id, kept up as orders are placed, updated, filled and cancelled.
+        self.open_quantity: Dict[int, List[Dec]] = {}
+
         # A list keeping track of each tick's open, close, high, low
         self.candle_data: List[List[Dec]] = [[Dec(1), Dec(1), Dec(1), Dec(1)]]
         self.price_data: List[Dec] = [self._cached_price]
@@ -252,6 +270,26 @@ class OrderBook:
         # Try to match orders after each trade is submitted
         self.continuous_order_matching: bool = continuous_order_matching
 
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        Pickle the sorted order lists as plain lists: unpickling a sorted list
+        sorts it straight away, but the orders in it refer back to the book,
+        so they may not have been restored yet at that point.
+        """
+        state = self.__dict__.copy()
+        state['bids'] = list(self.bids)
+        state['asks'] = list(self.asks)
+        return state
+
+    def restore_order_lists(self) -> None:
+        """
+        Turn the order lists back into sorted lists after unpickling,
+        once every order has been restored.
+        """
+        if isinstance(self.bids, list):
+            self.bids = SortedListWithKey(self.bids, key=Bid.comparator)
+            self.asks = SortedListWithKey(self.asks, key=Ask.comparator)
+
     @property
     def name(self) -> str:
         """
@@ -618,6 +656,7 @@ class OrderBook:
 
         # Update the cumulative price totals with the new quantity.
         self._bid_bucket_add(bid.price, bid.quantity)
+        self._open(bid.issuer)[1] += bid.quantity
 
         # Advance time
         self.step()
@@ -663,6 +702,7 @@ class OrderBook:
         bid.issuer.__dict__[f"unavailable_{self.quoted}"] += \
             (HavvenManager.round_decimal(new_quantity*new_price) + new_fee) - \
             (HavvenManager.round_decimal(bid.quantity*bid.price) + bid.fee)
+        self._open(bid.issuer)[1] += new_quantity - bid.quantity
 
         if bid.price == new_price:
             # We may assume the current price is already recorded,
@@ -706,6 +746,7 @@ class OrderBook:
 
         # Remove this order's remaining quantity from its price bucket
         self._bid_bucket_deduct(bid.price, bid.quantity)
+        self._open(bid.issuer)[1] -= bid.quantity
 
         # Delete the order from the ask list and issuer.
         self.bids.remove(bid)
@@ -735,6 +776,7 @@ class OrderBook:
 
         # Update the cumulative price totals with the new quantity.
         self._ask_bucket_add(ask.price, ask.quantity)
+        self._open(ask.issuer)[0] += ask.quantity
 
         # Advance time.
         self.step()
@@ -779,6 +821,7 @@ class OrderBook:
         # deducting the old and crediting the new.
         ask.issuer.__dict__[f"unavailable_{self.base}"] += \
             (new_quantity + new_fee) - (ask.quantity + ask.fee)
+        self._open(ask.issuer)[0] += new_quantity - ask.quantity
 
         if ask.price == new_price:
             # We may assume the current price is already recorded,
@@ -822,6 +865,7 @@ class OrderBook:
 
         # Remove this order's remaining quantity from its price bucket.
         self._ask_bucket_deduct(ask.price, ask.quantity)
+        self._open(ask.issuer)[0] -= ask.quantity
 
         # Delete order from the ask list and issuer.
         self.asks.remove(ask)
@@ -830,6 +874,36 @@ class OrderBook:
         self.step()
         ask.issuer.notify_cancelled(ask)
 
+    def record_trade(self, trade: TradeRecord) -> None:
+        """Save a trade in the history and the filled volumes, and notify its parties."""
+        self.history.append(trade)
+        self._filled(trade.buyer)[0] += trade.quantity
+        self._filled(trade.seller)[1] += trade.quantity
+        trade.buyer.notify_trade(trade)
+        trade.seller.notify_trade(trade)
+
+    def _filled(self, agent: "ag.MarketPlayer") -> List[Dec]:
+        filled = self.filled_volume.get(agent.unique_id)
+        if filled is None:
+            filled = self.filled_volume[agent.unique_id] = [Dec(0), Dec(0)]
+        return filled
+
+    def _open(self, agent: "ag.MarketPlayer") -> List[Dec]:
+        quantities = self.open_quantity.get(agent.unique_id)
+        if quantities is None:
+            quantities = self.open_quantity[agent.unique_id] = [Dec(0), Dec(0)]
+        return quantities
+
+    def open_quantities(self, agent: "ag.MarketPlayer") -> Tuple[Dec, Dec]:
+        """The total quantity of the agent's open asks and bids in this market."""
+        asks, bids = self.open_quantity.get(agent.unique_id, (Dec(0), Dec(0)))
+        return asks, bids
+
+    def filled_quantities(self, agent: "ag.MarketPlayer") -> Tuple[Dec, Dec]:
+        """The total quantity the agent has bought and sold in this market."""
+        bought, sold = self.filled_volume.get(agent.unique_id, (Dec(0), Dec(0)))
+        return bought, sold
+
     def match(self) -> None:
         """Match bids with asks and perform any trades that can be made."""
         prev_bid, prev_ask = None, None
@@ -847,9 +921,7 @@ class OrderBook:
 
             # If a trade was made, then save it in the history.
             if trade is not None:
-                self.history.append(trade)
-                trade.buyer.notify_trade(trade)
-                trade.seller.notify_trade(trade)
+                self.record_trade(trade)
 
                 # update closing price every time there is a new trade
                 self.candle_data[-1][1] = trade.price
@@ -872,9 +944,7 @@ class OrderBook:
 
             # If a trade was made, then save it in the history.
             if trade is not None:
-                self.history.append(trade)
-                trade.buyer.notify_trade(trade)
-                trade.seller.notify_trade(trade)
+                self.record_trade(trade)
 
             return trade
 
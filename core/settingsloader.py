@@ -18,10 +18,35 @@ def get_defaults():
             # whether to run the model in a separate thread for each socket connection
             # it runs worse with threading, so better to just leave it as false...
             'threaded': False,
+            # number of worker processes to run connections' models in, one model per process,
+            # so models don't share the server's cpu; 0 to run them in the server process.
+            # connections beyond this many run in the server process, as above.
+            'model_processes': 0,
+            # number of models with the default parameters to build ahead of time, so new connections
+            # can start straight away; with model_processes, also the number of processes started ahead
+            'warm_models': 2,
+            # random seed of the realtime server's models; with a seed, connections with the same parameters
+            # share one run, which is saved in the cache store once they all leave. -1 for unseeded runs
+            'realtime_seed': -1,
+            # frames of a shared realtime run to hold in memory, before writing them out to the cache store
+            'realtime_held_frames': 256,
+            # steps between whole frames sent by the realtime server, which sends the steps in between as
+            # changes from the step before, to use less bandwidth with many agents; 0 to send whole frames
+            'delta_keyframe_interval': 0,
+            # send the realtime server's steps as binary messages, with numbers packed as 32 or 64 bit floats,
+            # which are smaller and quicker to encode than JSON; 0 to send JSON
+            'binary_frames': 0,
             'port': 3000,
             'fps_max': 15,  # max fps for the model to run at
             'fps_default': 15,
-            'max_steps': 1500  # max number of steps to generate up to
+            'max_steps': 1500,  # max number of steps to generate up to
+            # number of processes to generate cached datasets with, 0 for one per cpu
+            'cache_workers': 0,
+            # size the cached datasets are allowed to take up on disk, unused old versions are evicted past this
+            'cache_max_mb': 1024,
+            # steps between checkpoints of datasets being generated, which extending a dataset
+            # or generating after a crash continue from, 0 to not checkpoint
+            'cache_checkpoint_interval': 250
         },
         'Model': {
             'num_agents_max': 175,
@@ -39,7 +64,10 @@ def get_defaults():
             'stable_havven_fee_level': '0.005',
             'stable_fiat_fee_level': '0.005',
             'stable_nomin_issuance_fee': '0',
-            'stable_nomin_redemption_fee': '0'
+            'stable_nomin_redemption_fee': '0',
+            # what collected fees are paid out in proportion to: issued_nomins, escrowed_havvens,
+            # havvens (held and escrowed), or motility (nomins sent and received in the fee period)
+            'fee_distribution': 'issued_nomins'
         },
         'Agents': {
             'agent_minimum': 1,
@@ -0,0 +1,161 @@
+"""
+sinks.py
+
+Pluggable sinks which write the model's collected metrics to disk
+incrementally while the model runs.
+
+Each sink holds a small bounded buffer of rows, and appends them to its
+file whenever the buffer fills, so long runs keep a flat memory footprint
+and everything up to the last flush survives a crash. A sink's first flush
+replaces anything left at its path by an earlier run.
+
+Sinks are handed to the HavvenModel, which passes itself to each sink once
+per step, after the datacollector has collected:
+
+    sinks = [JSONLSink("run.jsonl"), ColumnSink("run_columns")]
+    havven_model = HavvenModel(..., sinks=sinks)
+    for _ in range(100000):
+        havven_model.step()
+    havven_model.close_sinks()
+"""
+
+import abc
+import csv
+import json
+import os
+import sys
+from array import array
+from decimal import Decimal as Dec
+from typing import Any, Dict, List, Optional
+
+
+Row = Dict[str, Any]
+
+
+class MetricSink(abc.ABC):
+    """
+    Base class for metric sinks. Buffers one row of the latest model-level
+    values per step, and writes the buffer out with _write_rows when full.
+
+    Only scalar values (numbers, bools and strings) are recorded; reporters
+    which return objects (such as the order books) are skipped.
+    """
+
+    def __init__(self, path: str, reporters: Optional[List[str]] = None,
+                 buffer_size: int = 256) -> None:
+        """
+        :param path: the file (or directory, for column sinks) to write to
+        :param reporters: the datacollector model reporters to record,
+         all scalar reporters if None
+        :param buffer_size: the number of rows to hold in memory before writing
+        """
+        self.path = path
+        self.reporters = reporters
+        self.buffer_size = max(1, buffer_size)
+        self.columns: Optional[List[str]] = None
+        self.buffer: List[Row] = []
+        self.rows_written = 0
+
+    def write(self, havven_model: "model.HavvenModel") -> None:
+        """Record the latest collected values of the model, flushing if the buffer is full."""
+        model_vars = havven_model.datacollector.model_vars
+        if self.columns is None:
+            names = self.reporters if self.reporters is not None else list(model_vars)
+            self.columns = ["step"] + [
+                name for name in names
+                if model_vars.get(name) and self._accepts(model_vars[name][-1])
+            ]
+        row = {"step": havven_model.manager.time}
+        for name in self.columns[1:]:
+            row[name] = _to_plain(model_vars[name][-1])
+        self.buffer.append(row)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write out and clear any buffered rows."""
+        if not self.buffer:
+            return
+        self._write_rows(self.buffer)
+        self.rows_written += len(self.buffer)
+        self.buffer = []
+
+    def close(self) -> None:
+        """Flush the remaining rows; the sink holds no open handles between flushes."""
+        self.flush()
+
+    def _accepts(self, value: Any) -> bool:
+        """Whether a reporter with this kind of value is recorded by the sink."""
+        return isinstance(value, (int, float, Dec, str))
+
+    @abc.abstractmethod
+    def _write_rows(self, rows: List[Row]) -> None:
+        """Write rows out to the sink's file."""
+
+    def __enter__(self) -> "MetricSink":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class CSVSink(MetricSink):
+    """Write rows to a CSV file, with the header written on the first flush."""
+
+    def _write_rows(self, rows: List[Row]) -> None:
+        with open(self.path, "a" if self.rows_written else "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=self.columns)
+            if not self.rows_written:
+                writer.writeheader()
+            writer.writerows(rows)
+
+
+class JSONLSink(MetricSink):
+    """Write rows to a file as one JSON object per line."""
+
+    def _write_rows(self, rows: List[Row]) -> None:
+        with open(self.path, "a" if self.rows_written else "w") as f:
+            for row in rows:
+                f.write(json.dumps(row))
+                f.write("\n")
+
+
+class ColumnSink(MetricSink):
+    """
+    Write rows to a directory of binary column files, one little-endian
+    float64 file per column, with a small json header listing the columns
+    and the number of complete rows.
+
+    Each flush appends one chunk to every column file, and then rewrites the
+    header, so a reader only trusts the first `rows` values of each column.
+    Columns can be loaded with numpy.fromfile(path, dtype="<f8").
+    """
+
+    header_name = "columns.json"
+
+    def _write_rows(self, rows: List[Row]) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        for name in self.columns:
+            values = array('d', (float(row[name]) for row in rows))
+            if sys.byteorder != "little":
+                values.byteswap()
+            with open(self.column_path(name), "ab" if self.rows_written else "wb") as f:
+                values.tofile(f)
+        with open(os.path.join(self.path, self.header_name), "w") as f:
+            json.dump({"columns": self.columns, "rows": self.rows_written + len(rows)}, f)
+
+    def column_path(self, name: str) -> str:
+        """The file holding a column; names are kept readable but made filesystem-safe."""
+        safe = "".join(c if c.isalnum() else "_" for c in name)
+        return os.path.join(self.path, f"{safe}.f64")
+
+    def _accepts(self, value: Any) -> bool:
+        # strings can't be stored in a float column
+        return isinstance(value, (int, float, Dec))
+
+
+def _to_plain(value: Any) -> Any:
+    """Convert Decimals to floats so they can be written by every sink."""
+    if isinstance(value, Dec):
+        return float(value)
+    return value
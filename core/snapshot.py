@@ -0,0 +1,125 @@
+"""
+snapshot.py
+
+A compact snapshot of everything the visualisation modules show of a step.
+
+The modules used to read the model's datacollector and live agents while
+rendering, so rendering had to happen in the model's thread, straight after
+each step. Instead, the model takes a FrameSnapshot of itself once per step,
+holding only plain numbers, strings and lists of them, and the modules render
+from that alone. A snapshot can be pickled and sent elsewhere, and rendered
+later, or again, without the model it came from.
+
+    havven_model.step()
+    frame = havven_model.frame_snapshot()
+    state = [element.render(frame) for element in visualization_elements]
+"""
+
+from collections import namedtuple
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from core import orderbook as ob
+
+FrameSnapshot = namedtuple(
+    "FrameSnapshot", ["first", "model_vars", "books", "agents"])
+FrameSnapshot.__doc__ = """
+first: whether this is the first step collected, which modules send their static data with
+model_vars: the latest value of each of the datacollector's scalar model reporters
+books: a BookSnapshot of each order book reporter, by reporter name
+agents: an AgentsSnapshot of the agents, in order of their unique ids
+"""
+
+BookSnapshot = namedtuple(
+    "BookSnapshot", ["price", "candle", "rolling_price", "volume",
+                     "bid_prices", "bid_quantities", "ask_prices", "ask_quantities"])
+BookSnapshot.__doc__ = """
+price: the book's current price
+candle: the (high, low, open, close) of the last finished candle
+rolling_price, volume: the price and traded volume of the latest step
+bid_prices, ask_prices: arrays of the price of each price bucket, best first
+bid_quantities, ask_quantities: arrays of the quantity in each of those buckets
+"""
+
+AgentsSnapshot = namedtuple(
+    "AgentsSnapshot", ["names", "wealth", "portfolio", "fiat_portfolio", "order_totals", "trade_totals"])
+AgentsSnapshot.__doc__ = """
+Each field is a list with an entry per agent.
+portfolio, fiat_portfolio: the agent's portfolio, in its own currencies and in fiat
+order_totals: the quantity of the agent's open orders, as
+ (nomin/fiat ask, nomin/fiat bid, havven/fiat ask, havven/fiat bid, havven/nomin ask, havven/nomin bid)
+trade_totals: the quantity the agent has traded, in the same order,
+ where the ask columns count its purchases and the bid columns its sales
+"""
+
+
+def order_totals(agent: "ag.MarketPlayer", books: List["ob.OrderBook"]) -> Tuple[float, ...]:
+    """The quantity of the agent's open asks and bids in each of the books, from their open quantities."""
+    totals = []
+    for book in books:
+        totals.extend(float(quantity) for quantity in book.open_quantities(agent))
+    return tuple(totals)
+
+
+def trade_totals(agent: "ag.MarketPlayer", books: List["ob.OrderBook"]) -> Tuple[float, ...]:
+    """The quantity the agent has bought and sold in each of the books, from their filled volumes."""
+    totals = []
+    for book in books:
+        totals.extend(float(quantity) for quantity in book.filled_quantities(agent))
+    return tuple(totals)
+
+
+def book_snapshot(book: "ob.OrderBook") -> BookSnapshot:
+    """The state of an order book, as of the latest step."""
+    candle = book.candle_data[-2] if len(book.candle_data) > 1 else None
+    return BookSnapshot(
+        price=float(book.price),
+        candle=tuple(float(value) for value in candle) if candle is not None else None,
+        rolling_price=float(book.price_data[-1]) if len(book.price_data) > 1 else None,
+        volume=float(book.volume_data[-1]) if len(book.volume_data) > 1 else None,
+        bid_prices=np.array(book.bid_price_buckets.keys(), dtype=float),
+        bid_quantities=np.array(book.bid_price_buckets.values(), dtype=float),
+        ask_prices=np.array(book.ask_price_buckets.keys(), dtype=float),
+        ask_quantities=np.array(book.ask_price_buckets.values(), dtype=float)
+    )
+
+
+def agents_snapshot(agents: List["ag.MarketPlayer"], books: List["ob.OrderBook"]) -> AgentsSnapshot:
+    """
+    The wealth and orders of each of the given agents, with books being
+    the nomin/fiat, havven/fiat and havven/nomin markets, in that order.
+    """
+    return AgentsSnapshot(
+        names=[agent.name for agent in agents],
+        wealth=[float(agent.wealth()) for agent in agents],
+        portfolio=[tuple(float(value) for value in agent.portfolio(False)) for agent in agents],
+        fiat_portfolio=[tuple(float(value) for value in agent.portfolio(True)) for agent in agents],
+        order_totals=[order_totals(agent, books) for agent in agents],
+        trade_totals=[trade_totals(agent, books) for agent in agents]
+    )
+
+
+def take_snapshot(havven_model: "model.HavvenModel") -> FrameSnapshot:
+    """Snapshot the values the datacollector collected for the latest step of the model."""
+    collected = havven_model.datacollector
+    model_vars: Dict[str, Any] = {}
+    books: Dict[str, BookSnapshot] = {}
+    for name, values in collected.model_vars.items():
+        if not values:
+            continue
+        if isinstance(values[-1], ob.OrderBook):
+            books[name] = book_snapshot(values[-1])
+        else:
+            model_vars[name] = values[-1]
+
+    market_manager = havven_model.market_manager
+    markets = [market_manager.nomin_fiat_market, market_manager.havven_fiat_market,
+               market_manager.havven_nomin_market]
+
+    return FrameSnapshot(
+        first=len(collected.agent_vars.get("Agents", [])) <= 1,
+        model_vars=model_vars,
+        books=books,
+        agents=agents_snapshot(havven_model.agent_manager.ordered_agents(), markets)
+    )
@@ -113,6 +113,17 @@ def nomin_supply(havven_model: "model.HavvenModel") -> float:
     return havvens + fiat
 
 
+def trim_history(datacollector: DataCollector, window: int) -> None:
+    """
+    Drop all but the last window entries of every collected series,
+    to keep the memory used by long runs bounded.
+    """
+    for series in (datacollector.model_vars, datacollector.agent_vars):
+        for name in series:
+            if len(series[name]) > window:
+                del series[name][:-window]
+
+
 def create_datacollector() -> DataCollector:
     base_reporters = {
         "0": lambda x: 0,  # Note: workaround for showing labels (more info server.py)
@@ -1,6 +1,8 @@
 from decimal import Decimal as Dec
 from typing import Dict, List
 
+from sortedcontainers import SortedDict
+
 import agents as ag
 
 
@@ -33,6 +35,10 @@ class AgentManager:
         }
         self.agents["others"] = []
 
+        # Every agent in the model by unique id, kept in order of id
+        # as agents are added and removed, so it never needs sorting.
+        self.by_id: SortedDict = SortedDict()
+
         # Normalise the fractions of the population each agent occupies.
         total_value = sum(agent_fractions.values())
         normalised_fractions = {}
@@ -55,6 +61,7 @@ class AgentManager:
                 agent.setup(self.wealth_parameter)
                 self.havven_model.schedule.add(agent)
                 self.agents[agent_type].append(agent)
+                self.by_id[agent.unique_id] = agent
                 running_player_total += 1
 
         # Add a central stabilisation bank
@@ -66,6 +73,7 @@ class AgentManager:
 
     def add(self, agent):
         self.havven_model.schedule.add(agent)
+        self.by_id[agent.unique_id] = agent
         for name, item in ag.player_names.items():
             if type(agent) == item:
                 self.agents[name].append(agent)
@@ -73,6 +81,17 @@ class AgentManager:
         else:
             self.agents['others'].append(agent)
 
+    def remove(self, agent):
+        self.havven_model.schedule.remove(agent)
+        self.by_id.pop(agent.unique_id, None)
+        for agents in self.agents.values():
+            if agent in agents:
+                agents.remove(agent)
+
+    def ordered_agents(self) -> List["ag.MarketPlayer"]:
+        """Every agent in the model, in order of unique id."""
+        return list(self.by_id.values())
+
     def _add_central_bank(self, unique_id, num_agents, init_value):
         central_bank = ag.CentralBank(
             unique_id, self.havven_model, fiat=Dec(num_agents * init_value),
@@ -81,4 +100,5 @@ class AgentManager:
         self.havven_model.endow_havvens(central_bank,
                                  Dec(num_agents * init_value))
         self.havven_model.schedule.add(central_bank)
+        self.by_id[central_bank.unique_id] = central_bank
         self.agents["others"].append(central_bank)
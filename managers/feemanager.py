@@ -1,16 +1,50 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from decimal import Decimal as Dec
-from random import shuffle
 
 import agents 
 from .havvenmanager import HavvenManager
 
 
+def pro_rata_shares(pool: int, weights: List[int], total: int) -> List[int]:
+    """
+    Split pool into shares in proportion to weights, out of a total weight
+    which should be at least their sum, all in integer units.
+    Each share is rounded down, and the units left over, to bring the shares
+    up to the rounded value of their exact sum, go one each to the largest
+    remainders, or the earliest weights among equal ones.
+    """
+    total = max(total, sum(weights))
+    if pool <= 0 or total <= 0:
+        return [0] * len(weights)
+
+    quotients = [divmod(pool * weight, total) for weight in weights]
+    shares = [share for share, _ in quotients]
+
+    # the exact sum of the shares, rounded half up
+    target = (2 * pool * sum(weights) + total) // (2 * total)
+    leftover = target - sum(shares)
+    if leftover > 0:
+        # a stable sort, so equal remainders stay in order
+        by_remainder = sorted(range(len(weights)), key=lambda i: quotients[i][1], reverse=True)
+        for i in by_remainder[:leftover]:
+            shares[i] += 1
+    return shares
+
+
 class FeeManager:
     """
     Handles fee calculation.
     """
 
+    distribution_modes = ("issued_nomins", "escrowed_havvens", "havvens", "motility")
+    """
+    What fees are distributed in proportion to:
+     - issued_nomins: the nomins each agent has issued
+     - escrowed_havvens: the havvens each agent has escrowed
+     - havvens: the havvens each agent holds, escrowed or not
+     - motility: the nomins each agent has sent or received since the last distribution
+    """
+
     def __init__(self, model_manager: HavvenManager, fee_settings: Dict[str, Any]) -> None:
         """
         :param model_manager: a model_manager object
@@ -21,6 +55,8 @@ class FeeManager:
          - stable_fiat_fee_level: the fee rate for fiat
          - stable_nomin_issuance_fee: the fee rate for nomin issuance
          - stable_nomin_redemption_fee: the fee rate for nomin redemption
+         - fee_distribution: what fees are distributed in proportion to,
+         one of distribution_modes
         """
         self.model_manager = model_manager
 
@@ -38,6 +74,17 @@ class FeeManager:
 
         self.fees_distributed = Dec(0)
 
+        self.distribution_mode: str = fee_settings.get('fee_distribution', "issued_nomins")
+        if self.distribution_mode not in self.distribution_modes:
+            raise ValueError(f"Unknown fee distribution mode {self.distribution_mode}, "
+                             f"expected one of {', '.join(self.distribution_modes)}")
+
+        # The nomins each agent has sent or received since fees were last
+        # distributed, by unique id, and their total, for the motility mode.
+        # Kept in integer units of the currency precision, so the total stays exact.
+        self.nomins_moved: Dict[int, int] = {}
+        self.total_nomins_moved = 0
+
     def transferred_fiat_received(self, quantity: Dec) -> Dec:
         """
         Returns the fiat received by the recipient if a given quantity (with fee)
@@ -83,28 +130,67 @@ class FeeManager:
         """
         return HavvenManager.round_decimal(quantity * self.nomin_fee_rate)
 
+    def record_nomin_transfer(self, sender: "agents.MarketPlayer",
+                              recipient: "agents.MarketPlayer", quantity: Dec) -> None:
+        """Note a transfer of nomins between agents, towards their motility."""
+        if self.distribution_mode != "motility":
+            return
+        units = HavvenManager.to_units(quantity)
+        moved = self.nomins_moved
+        moved[sender.unique_id] = moved.get(sender.unique_id, 0) + units
+        moved[recipient.unique_id] = moved.get(recipient.unique_id, 0) + units
+        self.total_nomins_moved += 2 * units
+
+    def fee_weights(self, schedule_agents: List["agents.MarketPlayer"]
+                    ) -> Tuple[List["agents.MarketPlayer"], List[int], int]:
+        """
+        The agents with a share of the fees under the distribution mode,
+        their weights, and the total weight across all agents, in integer
+        units of the currency precision. The totals are kept up as the
+        weights change, rather than summed here.
+        """
+        manager = self.model_manager
+        to_units = HavvenManager.to_units
+        if self.distribution_mode == "issued_nomins":
+            weights = [agent.issued_nomins for agent in schedule_agents]
+            total = manager.nomin_supply
+        elif self.distribution_mode == "escrowed_havvens":
+            weights = [agent.escrowed_havvens for agent in schedule_agents]
+            total = manager.escrowed_havvens
+        elif self.distribution_mode == "havvens":
+            weights = [agent.havvens + agent.escrowed_havvens for agent in schedule_agents]
+            # every havven not held by havven itself is held by an agent; pro_rata_shares
+            # takes the weights' sum instead if some were endowed outside the supply
+            total = manager.havven_supply - manager.havvens
+        else:
+            moved = self.nomins_moved
+            recipients = [agent for agent in schedule_agents if moved.get(agent.unique_id, 0) > 0]
+            return recipients, [moved[agent.unique_id] for agent in recipients], self.total_nomins_moved
+
+        recipients = [agent for agent, weight in zip(schedule_agents, weights) if weight > 0]
+        return recipients, [to_units(weight) for weight in weights if weight > 0], to_units(total)
+
     def distribute_fees(self, schedule_agents: List["agents.MarketPlayer"]) -> None:
         """
-        Distribute currently held nomins to holders of havvens.
-        """
-        # Different fee modes:
-        #  * distributed by held havvens
-        # TODO: * distribute by escrowed havvens
-        # TODO: * distribute by issued nomins
-        # TODO: * distribute by motility
-
-        # reward in random order in case there's
-        # some ordering bias I'm missing.
-        shuffled_agents = list(schedule_agents)
-        shuffle(shuffled_agents)
-
-        pre_nomins = self.model_manager.nomins
-        supply = self.model_manager.nomin_supply
-        for agent in shuffled_agents:
-            if self.model_manager.nomins <= 0:
-                break
-            qty = min(HavvenManager.round_decimal(pre_nomins * agent.issued_nomins / supply),
-                      self.model_manager.nomins)
-            agent.nomins += qty
-            self.model_manager.nomins -= qty
-            self.fees_distributed += qty
+        Distribute currently held nomins to the agents, in proportion to
+        their weights under the distribution mode.
+        All shares are computed at once, in integer units of the currency
+        precision, and credited together. Units left over from rounding go to
+        the earliest agents among equals, so schedule_agents should be in a
+        fixed order, like that of their unique ids.
+        """
+        recipients, weights, total = self.fee_weights(schedule_agents)
+        shares = pro_rata_shares(HavvenManager.to_units(self.model_manager.nomins), weights, total)
+
+        from_units = HavvenManager.from_units
+        for agent, share in zip(recipients, shares):
+            if share > 0:
+                agent.nomins += from_units(share)
+
+        distributed = from_units(sum(shares))
+        self.model_manager.nomins -= distributed
+        self.fees_distributed += distributed
+
+        # motility only counts the nomins moved within each fee period
+        self.nomins_moved = {}
+        self.total_nomins_moved = 0
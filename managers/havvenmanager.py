@@ -27,7 +27,7 @@ class HavvenManager:
          - use_volume_weighted_avg: whether to use volume in calculating the rolling price average
         """
         # Set the decimal rounding mode
-        getcontext().rounding = ROUND_HALF_UP
+        self.set_rounding()
 
         # Initiate Time
         self.time: int = 0
@@ -53,6 +53,23 @@ class HavvenManager:
         self.volume_weighted_average: bool = havven_settings['use_volume_weighted_avg']
         """Whether to calculate the rolling average taking into account the volume of the trades"""
 
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        # The rounding mode is part of the decimal context, which belongs to
+        # the thread, so it has to be set for the thread a model is unpickled
+        # on. The model sets it again whenever it is stepped, in case that
+        # happens on another thread.
+        self.set_rounding()
+        self.__dict__.update(state)
+
+    @staticmethod
+    def set_rounding() -> None:
+        """
+        Round Decimals half up in the current thread. Decimal contexts are
+        per-thread, so every thread that creates, loads or steps a model
+        must set it.
+        """
+        getcontext().rounding = ROUND_HALF_UP
+
     @classmethod
     def round_float(cls, value: float) -> Dec:
         """
@@ -79,3 +96,16 @@ class HavvenManager:
         # if value < Dec('1E-8'):
         #     return Dec(0)
         return round(value, cls.currency_precision)
+
+    @classmethod
+    def to_units(cls, value: Dec) -> int:
+        """
+        Convert a Decimal to an integer number of the smallest units the
+        precision setting allows, rounding it first if necessary.
+        """
+        return int(value.scaleb(cls.currency_precision).to_integral_value())
+
+    @classmethod
+    def from_units(cls, units: int) -> Dec:
+        """Convert an integer number of the smallest currency units back to a Decimal."""
+        return Dec(units).scaleb(-cls.currency_precision)
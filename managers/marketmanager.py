@@ -193,6 +193,7 @@ class MarketManager:
             sender.nomins -= quantity + fee
             recipient.nomins += quantity
             self.model_manager.nomins += fee
+            self.fee_manager.record_nomin_transfer(sender, recipient, quantity)
             return True
         return False
 
@@ -10,7 +10,13 @@ if __name__ == "__main__":
         os.remove("settings.ini")
         settings = settingsloader.load_settings()
 
-    x = input("Clear and refresh cache_data.pkl (y/[any])? ")
+    x = input(f"Clear and refresh {cache_handler.cache_path} (y/[any])? ")
     if x.lower() in ['y', 'yes']:
-        data = cache_handler.generate_new_caches({})
-        cache_handler.save_data(data)
+        settings = settingsloader.load_settings()
+        cache_handler.generate_new_caches(
+            cache_handler.load_saved(),
+            regenerate=True,
+            workers=settings['Server']['cache_workers'],
+            max_bytes=settings['Server']['cache_max_mb'] * 2**20,
+            checkpoint_interval=settings['Server']['cache_checkpoint_interval']
+        )
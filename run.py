@@ -3,5 +3,7 @@ from mesa.visualization.ModularVisualization import ModularServer
 
 from core import server
 
-S: ModularServer = server.make_server()
-S.launch()
+if __name__ == "__main__":
+    # guarded, as model worker processes import this module when they start
+    S: ModularServer = server.make_server()
+    S.launch()
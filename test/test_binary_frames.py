@@ -0,0 +1,72 @@
+import json
+import struct
+
+import numpy as np
+
+from visualization.binary_frames import pack_message
+
+TYPES = {32: "<f4", 64: "<f8"}
+
+
+def unpack_message(data):
+    """Decode a binary message, as unpackMessage in runcontrol.js does, with arrays as lists."""
+    skeleton_length, = struct.unpack_from("<I", data)
+    skeleton = json.loads(data[4:4 + skeleton_length].decode())
+    arrays_start = -(-(4 + skeleton_length) // 8) * 8
+
+    def unpack(value):
+        if isinstance(value, list):
+            return [unpack(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        if "$b" in value:
+            offset, length, bits, columns = value["$b"]
+            assert((arrays_start + offset) % 8 == 0)
+            values = np.frombuffer(data, TYPES[bits], length, arrays_start + offset).tolist()
+            if columns == 0:
+                return values
+            return [values[i:i + columns] for i in range(0, length, columns)]
+        return {key: unpack(item) for key, item in value.items()}
+    return unpack(skeleton)
+
+
+def test_pack_message_round_trip():
+    message = {
+        "type": "viz_state",
+        "run_num": 3,
+        "data": [[0, [
+            [0.1 * i for i in range(10)],
+            [1.0, [[1.0 + i / 7, float(i)] for i in range(6)], [[2.0, 0.5]]],
+            (["a", "b"], ["red", "blue"], [1, 1], ["x"] * 9, [float(i) for i in range(9)], [-1.5] * 9),
+            [1, 2, 3],
+            [1.0, "mixed", 2.0, 3.0, 4.0, 5.0, 6.0, 7.0],
+            [[1.0], [2.0, 3.0], [4.0], [5.0], [6.0], [7.0], [8.0], [9.0]],
+            [],
+            None
+        ]]]
+    }
+    data = pack_message(message)
+    expected = json.loads(json.dumps(message))
+    assert(unpack_message(data) == expected)
+
+    # long lists of numbers, and of equal rows of them, are packed; the rest stay in the JSON
+    skeleton = json.loads(data[4:4 + struct.unpack_from("<I", data)[0]].decode())
+    frame = skeleton["data"][0][1]
+    assert(frame[0] == {"$b": [0, 10, 64, 0]})
+    assert(frame[1][1] == {"$b": [80, 12, 64, 2]})
+    assert(frame[1][2] == [[2.0, 0.5]])
+    assert(frame[2][3] == ["x"] * 9 and "$b" in frame[2][4])
+    assert(frame[3] == [1, 2, 3])
+    assert(frame[4] == expected["data"][0][1][4])
+    assert(frame[5] == expected["data"][0][1][5])
+
+
+def test_pack_message_32_bit():
+    values = [1 / 3, 2.5, 1e6, -7.25, 0.1, 0.0, 1.0, 2.0, 3.0]
+    data = pack_message([values, [[1, 2, 3]] * 3], bits=32)
+    unpacked = unpack_message(data)
+    assert(unpacked[0] == np.array(values, dtype="<f4").tolist())
+    assert(unpacked[1] == [[1.0, 2.0, 3.0]] * 3)
+    # a message with nothing to pack is just its JSON
+    data = pack_message({"type": "end"})
+    assert(unpack_message(data) == {"type": "end"})
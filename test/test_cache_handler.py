@@ -0,0 +1,65 @@
+from core import cache_handler
+from core.cache_store import CacheStore
+
+
+def small_run(name, num_agents, seed=0):
+    return {
+        "name": name,
+        "description": name,
+        "max_steps": 6,
+        "seed": seed,
+        "settings": {"Model": {"num_agents": num_agents}}
+    }
+
+
+def stored_frames(store, name):
+    reader = store.reader(name)
+    return [reader.frame_bytes(i) for i in range(reader.steps)]
+
+
+def test_parallel_generation(tmpdir, monkeypatch):
+    monkeypatch.setattr(cache_handler, "run_settings", [
+        small_run("a", 10), small_run("b", 12, seed=3), small_run("a again", 10)
+    ])
+    serial = cache_handler.generate_new_caches(CacheStore(str(tmpdir.join("serial"))), workers=1)
+    parallel = cache_handler.generate_new_caches(CacheStore(str(tmpdir.join("parallel"))), workers=2)
+
+    # the datasets come out the same whichever process simulated them
+    assert(sorted(parallel.names()) == ["a", "a again", "b"])
+    for name in parallel.names():
+        assert(stored_frames(parallel, name) == stored_frames(serial, name))
+        assert(len(stored_frames(parallel, name)) == 6)
+    # identical runs are only generated once, and share an entry
+    assert(parallel.datasets["a"] == parallel.datasets["a again"])
+    assert(parallel.datasets["a"] != parallel.datasets["b"])
+
+    # a store which is up to date generates nothing
+    monkeypatch.setattr(cache_handler, "generate_dataset", None)
+    cache_handler.generate_new_caches(parallel, workers=2)
+
+
+def test_resumed_generation(tmpdir, monkeypatch):
+    item = small_run("a", 10)
+    longer = dict(item, max_steps=9)
+    key = cache_handler.cache_key(cache_handler.resolve_settings(item), 0)
+
+    def generate(store, item, **kwargs):
+        store.install(item["name"], key, cache_handler.generate_dataset(
+            store, item, key, progress=False, checkpoint_interval=4, **kwargs))
+        return stored_frames(store, item["name"])
+
+    scratch = generate(CacheStore(str(tmpdir.join("scratch"))), longer, resume=False)
+    store = CacheStore(str(tmpdir.join("resumed")))
+    assert(generate(store, item) == scratch[:6])
+
+    # raising max_steps carries on from the checkpoint at the end of the stored run,
+    # without building a new model, and gives the same bytes as a run from scratch
+    with monkeypatch.context() as m:
+        m.setattr(cache_handler, "model", None)
+        assert(generate(store, longer) == scratch)
+    assert(store.reader("a").checkpoint()["step"] == 9)
+
+    # lowering it puts the checkpoint past the end, so the run starts again
+    shorter = dict(item, max_steps=3)
+    assert(generate(store, shorter) == scratch[:3])
+    assert(store.reader("a").checkpoint()["step"] == 3)
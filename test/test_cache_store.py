@@ -0,0 +1,100 @@
+import gzip
+import json
+
+from core.cache_store import CacheStore
+
+
+def write_dataset(store, name, key, steps):
+    writer = store.writer(name, key, {"description": name, "max_steps": steps})
+    writer.start(resume=False)
+    for i in range(steps):
+        writer.append([i, [float(i)] * (i % 3), {"step": i}])
+    writer.close()
+
+
+def test_round_trip(tmpdir):
+    store = CacheStore(str(tmpdir), chunk_size=4)
+    write_dataset(store, "a", "key_a", 10)
+
+    reader = store.reader("a")
+    assert(reader.steps == 10)
+    assert(reader.meta["max_steps"] == 10)
+    assert(reader.meta["key"] == "key_a")
+    for i in range(10):
+        assert(reader.frame(i) == [i, [float(i)] * (i % 3), {"step": i}])
+
+    # a new store on the same directory reads from the saved index
+    store.close()
+    assert(CacheStore(str(tmpdir)).reader("a").frame(9)[0] == 9)
+
+
+def test_rewrite_leaves_other_datasets(tmpdir):
+    store = CacheStore(str(tmpdir), chunk_size=4)
+    write_dataset(store, "a", "key_a", 5)
+    write_dataset(store, "b", "key_b", 6)
+    b_frames = [store.reader("b").frame_bytes(i) for i in range(6)]
+
+    write_dataset(store, "a", "key_a", 9)
+    assert(store.reader("a").steps == 9)
+    assert([store.reader("b").frame_bytes(i) for i in range(6)] == b_frames)
+
+
+def test_eviction(tmpdir):
+    store = CacheStore(str(tmpdir), chunk_size=4)
+    write_dataset(store, "a", "old_key", 5)
+    write_dataset(store, "a", "new_key", 5)
+
+    # the old entry is kept until the store is too large, and can be linked again
+    assert(store.has_entry("old_key"))
+    assert(store.evict(10**9) == [])
+
+    assert(store.evict(0) == ["old_key"])
+    assert(not store.has_entry("old_key"))
+    assert(store.reader("a").meta["key"] == "new_key")
+
+
+def test_resume_from_checkpoint(tmpdir):
+    store = CacheStore(str(tmpdir), chunk_size=4)
+    writer = store.writer("a", "key_a", {"description": "a", "max_steps": 10})
+    assert(writer.start() is None)
+    for i in range(6):
+        writer.append([i])
+    writer.checkpoint({"next": 6})
+    # frames after the last checkpoint are lost when the run is interrupted
+    writer.append([6])
+    writer.append([7])
+    writer.append([8])
+
+    writer = store.writer("a", "key_a", {"description": "a", "max_steps": 10})
+    assert(writer.start() == {"next": 6})
+    assert(writer.steps == 6)
+    for i in range(6, 10):
+        writer.append([i])
+    writer.checkpoint({"next": 10})
+    writer.close()
+    assert([store.reader("a").frame(i) for i in range(10)] == [[i] for i in range(10)])
+
+    # an installed entry with a checkpoint can be extended
+    writer = store.writer("a", "key_a", {"description": "a", "max_steps": 12})
+    assert(writer.start() == {"next": 10})
+    writer.append([10])
+    writer.close()
+    assert(store.reader("a").steps == 11)
+    assert(store.reader("a").frame(9) == [9])
+
+    writer = store.writer("a", "key_a", {"description": "a", "max_steps": 12})
+    assert(writer.start(resume=False) is None)
+    assert(writer.steps == 0)
+
+
+def test_compressed_chunks(tmpdir):
+    store = CacheStore(str(tmpdir), chunk_size=4)
+    write_dataset(store, "a", "key_a", 6)
+    reader = store.reader("a")
+    assert(reader.chunk_count == 2)
+
+    pairs = json.loads(gzip.decompress(reader.compressed_chunk(1, "gzip")).decode())
+    assert(pairs == [[5, reader.frame(4)], [6, reader.frame(5)]])
+    # served from disk after the first time
+    assert(tmpdir.join("key_a", "chunk_00001.json.gz").check())
+    assert(reader.compressed_chunk(1, "gzip") == reader.compressed_chunk(1, "gzip"))
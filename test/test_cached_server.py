@@ -0,0 +1,156 @@
+import gzip
+import json
+import types
+
+import pytest
+from tornado.concurrent import Future
+from tornado.ioloop import IOLoop
+from tornado.testing import AsyncHTTPTestCase
+
+from core import cache_handler, cache_store, settingsloader
+from core.cache_store import CacheStore, compressors
+from visualization.cached_server import (CachedDataHandler, CachedModularServer, CachedSocketHandler,
+                                         end_message)
+
+
+def frame(step):
+    return [[step, 0.5], {"step": step}, [1.25] * (step % 3), "text"]
+
+
+def make_data_handler(tmpdir, monkeypatch):
+    store = CacheStore(str(tmpdir), chunk_size=4)
+    writer = store.writer("a", "a1", {"description": "a", "max_steps": 10})
+    writer.start(resume=False)
+    for i in range(10):
+        writer.append(frame(i))
+    writer.close()
+    monkeypatch.setattr(cache_handler, "load_saved", lambda: store)
+    monkeypatch.setattr(cache_handler, "generate_new_caches", lambda *args, **kwargs: store)
+    return CachedDataHandler(settingsloader.get_defaults())
+
+
+def test_step_messages(tmpdir, monkeypatch):
+    handler = make_data_handler(tmpdir, monkeypatch)
+
+    # the stored frame bytes make up a valid message, with the steps numbered from 1
+    message = handler.get_steps("a", 3, 6)
+    assert(isinstance(message, bytes))
+    assert(json.loads(message) == {"type": "viz_state", "dataset": "a",
+                                   "data": [[i + 1, frame(i)] for i in range(3, 6)]})
+
+    # ranges are clamped to the dataset, and there is nothing past its end
+    assert([step for step, _ in json.loads(handler.get_steps("a", 8, 20))["data"]] == [9, 10])
+    assert(handler.get_steps("a", 10, 11) is None)
+    assert(handler.get_steps("missing", 0, 1) is None)
+    assert(handler.get_step_count("a") == 10)
+    assert(json.loads(end_message("a")) == {"type": "end", "dataset": "a"})
+
+
+class StubSocket:
+    """Stands in for a connection, recording the messages streamed to it."""
+    steps_per_message = 4
+    session = 0
+
+    def __init__(self, data_handler, cancel_after=None):
+        self.application = types.SimpleNamespace(cached_data_handler=data_handler)
+        self.request_count = 1
+        self.cancel_after = cancel_after
+        self.sent = []
+
+    def write_message(self, message):
+        self.sent.append(json.loads(message))
+        if len(self.sent) == self.cancel_after:
+            # a newer request comes in while the stream is being sent
+            self.request_count += 1
+        done = Future()
+        done.set_result(None)
+        return done
+
+    def stream(self, step_start, step_end, dataset="a"):
+        loop = IOLoop()
+        loop.run_sync(lambda: CachedSocketHandler.stream_steps(
+            self, self.request_count, dataset, step_start, step_end))
+        loop.close()
+        sent, self.sent = self.sent, []
+        return [[step for step, _ in msg["data"]] if msg["type"] == "viz_state" else msg["type"]
+                for msg in sent]
+
+
+def test_stream_steps(tmpdir, monkeypatch):
+    socket = StubSocket(make_data_handler(tmpdir, monkeypatch))
+
+    # ranges are sent in batches, with the end message only once the dataset is finished
+    assert(socket.stream(1, 7) == [[2, 3, 4, 5], [6, 7]])
+    assert(socket.stream(3, None) == [[4, 5, 6, 7], [8, 9, 10], "end"])
+    assert(socket.stream(6, 30) == [[7, 8, 9, 10], "end"])
+    # past the end, or outside the dataset, there is only the end message
+    assert(socket.stream(12, None) == ["end"])
+    assert(socket.stream(-2, 3) == ["end"])
+    assert(socket.stream(0, None, dataset="missing") == ["end"])
+
+
+def test_stream_steps_cancelled(tmpdir, monkeypatch):
+    socket = StubSocket(make_data_handler(tmpdir, monkeypatch), cancel_after=2)
+
+    # a newer request stops the stream after the batch in flight, without an end message
+    assert(socket.stream(0, None) == [[1, 2, 3, 4], [5, 6, 7, 8]])
+
+
+class TestDataEndpoints(AsyncHTTPTestCase):
+    @pytest.fixture(autouse=True)
+    def data_handler(self, tmpdir, monkeypatch):
+        make_data_handler(tmpdir, monkeypatch)
+
+    def get_app(self):
+        return CachedModularServer(settingsloader.get_defaults(), [], "Havven")
+
+    def test_dataset_list(self):
+        response = self.fetch("/data")
+        assert(response.code == 200)
+        assert([meta["name"] for meta in json.loads(response.body)] == ["a"])
+        assert(response.headers["Cache-Control"] == "no-cache")
+
+        # the client's copy is current while the listing doesn't change
+        etag = response.headers["Etag"]
+        response = self.fetch("/data", headers={"If-None-Match": etag})
+        assert(response.code == 304 and response.body == b"")
+        assert(self.fetch("/data", headers={"If-None-Match": '"stale"'}).code == 200)
+
+    def test_dataset(self):
+        response = self.fetch("/data/a")
+        assert(response.code == 200)
+        meta = json.loads(response.body)
+        assert(meta["steps"] == 10 and meta["chunks"] == 3)
+        assert(meta["chunk_url"] == "/entries/a1/chunks/{chunk}")
+
+        response = self.fetch("/data/a", headers={"If-None-Match": response.headers["Etag"]})
+        assert(response.code == 304)
+        assert(self.fetch("/data/missing").code == 404)
+
+    def test_chunks(self):
+        # full chunks never change, while the last one may still grow
+        response = self.fetch("/entries/a1/chunks/0", decompress_response=False)
+        assert(response.code == 200 and "Content-Encoding" not in response.headers)
+        assert(json.loads(response.body) == [[i + 1, frame(i)] for i in range(4)])
+        assert("immutable" in response.headers["Cache-Control"])
+        assert(self.fetch("/entries/a1/chunks/2").headers["Cache-Control"] == "no-cache")
+
+        response = self.fetch("/entries/a1/chunks/0", headers={"If-None-Match": response.headers["Etag"]})
+        assert(response.code == 304)
+        assert(self.fetch("/entries/a1/chunks/3").code == 404)
+        assert(self.fetch("/entries/b2/chunks/0").code == 404)
+
+        # the encoding is picked from those the client accepts, and which are available
+        for accepted, encoding in [("gzip", "gzip"), ("deflate, gzip;q=0.5", "gzip"),
+                                   ("br, gzip", "br" if "br" in compressors else "gzip"),
+                                   ("deflate", None)]:
+            response = self.fetch("/entries/a1/chunks/1", headers={"Accept-Encoding": accepted},
+                                  decompress_response=False)
+            assert(response.headers.get("Content-Encoding") == encoding)
+            assert(response.headers["Vary"] == "Accept-Encoding")
+            body = response.body
+            if encoding == "gzip":
+                body = gzip.decompress(body)
+            elif encoding == "br":
+                body = cache_store.brotli.decompress(body)
+            assert(json.loads(body) == [[i + 1, frame(i)] for i in range(4, 8)])
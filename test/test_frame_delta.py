@@ -0,0 +1,130 @@
+import json
+from types import SimpleNamespace
+
+from tornado.ioloop import IOLoop
+
+from core.model import HavvenModel
+from core.server import get_vis_elements
+from visualization.frame_delta import diff, encode_steps
+from visualization.realtime_server import SocketHandler
+from visualization.shared_runs import FrameLog
+from test.test_server import default_settings
+
+
+def apply_patch(value, patch):
+    """Apply a patch to a value, as applyPatch in runcontrol.js does."""
+    if patch is None:
+        return value
+    if "r" in patch:
+        return patch["r"]
+    patched = list(value[:patch["n"]])
+    patched.extend([None] * (patch["n"] - len(patched)))
+    for index, item in patch.get("s", []):
+        patched[index] = item
+    for index, item_patch in patch.get("d", []):
+        patched[index] = apply_patch(patched[index], item_patch)
+    return patched
+
+
+def decode_steps(items, prev=None):
+    """The (step, frame) pairs of a viz_state message's items, as the client rebuilds them."""
+    steps = []
+    for item in json.loads(json.dumps(items)):
+        if len(item) == 3:
+            frame = [apply_patch(prev[1][i], patch) for i, patch in enumerate(item[1])]
+        else:
+            frame = item[1]
+        prev = (item[0], frame)
+        steps.append(prev)
+    return steps
+
+
+def test_diff():
+    prev = [1, [0, 1, 2, 3, 4, 5, 6, 7], "a", [[1, 2], [3, 4, 5, 6, 7]]]
+    assert(diff(prev, prev) is None)
+    assert(diff([1, 2], [1, 3]) == {"r": [1, 3]})
+
+    value = [1, [0, 1, 2, 3, 4, 5, 9, 7, 8], "a", [[1, 2], [3, 4, 5, 0, 7]]]
+    patch = diff(prev, value)
+    # the two-item list is too short to patch, so it is replaced
+    assert(patch == {"n": 4, "s": [[3, [[1, 2], [3, 4, 5, 0, 7]]]], "d": [[1, {"n": 9, "s": [[6, 9], [8, 8]]}]]})
+    assert(apply_patch(prev, patch) == value)
+
+    # lists shrink, and a patch changing most of a list replaces it
+    assert(apply_patch(prev, diff(prev, prev[:3] + [[1, 2]])) == prev[:3] + [[1, 2]])
+    assert(diff(list(range(8)), list(range(1, 9))) == {"r": list(range(1, 9))})
+
+
+def test_encode_steps():
+    frames = [(step, [step // 3, [0, 1, 2, step, 4, 5], ["x"] * (step % 4 + 4)]) for step in range(10)]
+
+    items = encode_steps(frames, None, 4)
+    assert([len(item) for item in items] == [2, 3, 3, 3, 2, 3, 3, 3, 2, 3])
+    assert(decode_steps(items) == frames)
+
+    # the client's last frame is carried on from, unless it isn't the step before
+    assert(len(encode_steps(frames[5:], frames[4], 4)[0]) == 3)
+    assert(len(encode_steps(frames[5:], frames[3], 4)[0]) == 2)
+    assert(decode_steps(encode_steps(frames[5:], frames[4], 4), frames[4]) == frames[5:])
+    assert(encode_steps(frames, None, 0) == [list(frame) for frame in frames])
+
+
+def test_model_frames_round_trip():
+    settings, model_params = default_settings()
+    havven_model = HavvenModel(model_settings=model_params, fee_settings=settings['Fees'],
+                               agent_settings=settings['Agents'], havven_settings=settings['Havven'], seed=2)
+    elements = get_vis_elements()
+    frames = []
+    for step in range(30):
+        havven_model.step()
+        snapshot = havven_model.frame_snapshot()
+        frames.append((step, json.loads(json.dumps([element.render(snapshot) for element in elements]))))
+
+    items = encode_steps(frames, None, 10)
+    assert(sum(len(item) == 3 for item in items) == 27)
+    assert(decode_steps(items) == frames)
+
+
+class RecordingLog(FrameLog):
+    """A frame log which records the frames read from it."""
+    def __init__(self):
+        super().__init__()
+        self.reads = []
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            self.reads.append(index)
+        return super().__getitem__(index)
+
+
+def sent_steps(delta_keyframe_interval, data, step):
+    """The items of the viz_state a connection is sent for a get_steps message."""
+    sent = []
+    socket = SimpleNamespace(
+        application=SimpleNamespace(verbose=False, max_steps=100, binary_frames=False,
+                                    delta_keyframe_interval=delta_keyframe_interval,
+                                    runs=SimpleNamespace(acknowledge=lambda *args: None)),
+        model_handler=SimpleNamespace(threaded=False, data=data),
+        current_run_num=0, session=0, write_message=sent.append
+    )
+    loop = IOLoop()
+    loop.run_sync(lambda: SocketHandler.on_message(
+        socket, json.dumps({"type": "get_steps", "run_num": 0, "step": step})))
+    loop.close()
+    return sent[0]["data"]
+
+
+def test_previous_frame_lookup():
+    data = RecordingLog()
+    for step in range(4):
+        data.append((step, [[step, 1]]))
+
+    # the frame before is only read when the frame can be sent as a delta against it
+    assert(sent_steps(0, data, 2) == [[2, [[2, 1]]]])
+    assert(1 not in data.reads)
+    assert(sent_steps(4, data, 2) == encode_steps([(2, [[2, 1]])], (1, [[1, 1]]), 4))
+    assert(1 in data.reads)
+
+    # once it has been dropped, the frame is sent whole instead
+    data.drop_before(2)
+    assert(sent_steps(4, data, 2) == [[2, [[2, 1]]]])
@@ -0,0 +1,52 @@
+from decimal import Decimal as Dec
+
+from managers.feemanager import pro_rata_shares
+from test.test_orderbook import make_model_without_agents, add_market_player
+
+
+def test_pro_rata_shares():
+    # shares are rounded down, and the leftover goes to the largest remainders
+    assert(pro_rata_shares(10, [1, 1, 1], 3) == [4, 3, 3])
+    assert(pro_rata_shares(7, [5, 0, 5], 10) == [4, 0, 3])
+    assert(pro_rata_shares(100, [1, 2], 3) == [33, 67])
+    # only the weights' part of the total is paid out
+    assert(pro_rata_shares(10, [1, 1, 1], 6) == [2, 2, 1])
+    assert(pro_rata_shares(10, [], 0) == [])
+    assert(pro_rata_shares(0, [1, 1], 2) == [0, 0])
+
+
+def test_distribute_fees():
+    havven_model = make_model_without_agents()
+    manager = havven_model.manager
+    players = [add_market_player(havven_model) for _ in range(3)]
+    for player, issued in zip(players, ["1", "2", "0"]):
+        player.issued_nomins = Dec(issued)
+    manager.nomin_supply = Dec(3)
+    manager.nomins = Dec(1)
+
+    havven_model.fee_manager.distribute_fees(havven_model.agent_manager.ordered_agents())
+    assert(players[0].nomins == Dec("0.33333333"))
+    assert(players[1].nomins == Dec("0.66666667"))
+    assert(players[2].nomins == Dec(0))
+    assert(manager.nomins == Dec(0))
+    assert(havven_model.fee_manager.fees_distributed == Dec(1))
+
+
+def test_motility_distribution():
+    havven_model = make_model_without_agents()
+    manager = havven_model.manager
+    fee_manager = havven_model.fee_manager
+    fee_manager.distribution_mode = "motility"
+    players = [add_market_player(havven_model) for _ in range(3)]
+    players[0].nomins = Dec(3)
+    havven_model.market_manager.transfer_nomins(players[0], players[1], Dec(1), Dec(0))
+    havven_model.market_manager.transfer_nomins(players[0], players[2], Dec(2), Dec(0))
+    manager.nomins = Dec(6)
+
+    # each agent is weighted by the nomins it sent and received
+    fee_manager.distribute_fees(havven_model.agent_manager.ordered_agents())
+    assert(players[0].nomins == Dec(3))
+    assert(players[1].nomins == Dec(2))
+    assert(players[2].nomins == Dec(4))
+    assert(fee_manager.nomins_moved == {})
+    assert(fee_manager.total_nomins_moved == 0)
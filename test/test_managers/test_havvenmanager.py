@@ -0,0 +1,27 @@
+import threading
+from decimal import getcontext, ROUND_HALF_UP
+
+from core import model, settingsloader
+
+
+def test_rounding_on_stepping_thread():
+    settings = settingsloader.get_defaults()
+    model_settings = settings['Model']
+    model_settings['agent_fractions'] = settings['AgentFractions']
+    model_settings['num_agents'] = 10
+    havven_model = model.HavvenModel(model_settings, settings['Fees'], settings['Agents'],
+                                     settings['Havven'], seed=1)
+
+    # decimal contexts are per-thread, so a new thread starts with the default rounding
+    roundings = []
+
+    def step():
+        roundings.append(getcontext().rounding)
+        havven_model.step()
+        roundings.append(getcontext().rounding)
+
+    thread = threading.Thread(target=step)
+    thread.start()
+    thread.join()
+    assert(roundings[0] != ROUND_HALF_UP)
+    assert(roundings[1] == ROUND_HALF_UP)
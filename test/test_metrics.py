@@ -0,0 +1,47 @@
+import pytest
+
+from core.metrics import Counter, Gauge, Histogram, Metric, Registry
+
+
+def test_exposition():
+    registry = Registry()
+    requests = Counter("requests_total", "Requests served.", registry=registry)
+    sessions = Gauge("sessions", "Open sessions.", registry=registry)
+    pool = Gauge("pool", "Workers, by state.", registry=registry,
+                 read=lambda: [({"state": "busy"}, 2), ({"state": "idle"}, 1)])
+    latency = Histogram("latency_seconds", "Latency.", registry=registry, buckets=[0.1, 1])
+
+    requests.inc(endpoint="a")
+    requests.inc(2, endpoint="a")
+    sessions.inc()
+    sessions.inc()
+    sessions.dec()
+    latency.observe(0.05, session=1)
+    latency.observe(0.5, session=1)
+    latency.observe(5, session=1)
+
+    lines = registry.expose().splitlines()
+    assert("# TYPE requests_total counter" in lines)
+    assert('requests_total{endpoint="a"} 3.0' in lines)
+    assert("sessions 1.0" in lines)
+    assert('pool{state="busy"} 2.0' in lines)
+    assert('pool{state="idle"} 1.0' in lines)
+    # buckets are cumulative, with a last +Inf bucket counting every observation
+    assert('latency_seconds_bucket{session="1",le="0.1"} 1' in lines)
+    assert('latency_seconds_bucket{session="1",le="1.0"} 2' in lines)
+    assert('latency_seconds_bucket{session="1",le="+Inf"} 3' in lines)
+    assert('latency_seconds_sum{session="1"} 5.55' in lines)
+    assert('latency_seconds_count{session="1"} 3' in lines)
+
+    latency.remove(session=1)
+    assert("latency_seconds_count" not in registry.expose())
+
+
+def test_metrics_must_have_samples():
+    class Untyped(Metric):
+        pass
+
+    with pytest.raises(TypeError):
+        Metric("metric", "A metric.", Registry())
+    with pytest.raises(TypeError):
+        Untyped("untyped", "A metric without samples.", Registry())
@@ -24,8 +24,8 @@ def make_model_without_agents(continuous_order_matching=True):
         settings['Agents'],
         settings['Havven']
     )
-    for item in havven_model.schedule.agents:
-        havven_model.schedule.remove(item)
+    for item in list(havven_model.schedule.agents):
+        havven_model.agent_manager.remove(item)
     havven_model.agent_manager.agents = {"others": []}
     return havven_model
 
@@ -647,3 +647,48 @@ TODO: testing continuous buying/selling for decimal imprecision
   - one test could be quantity and price are both 1/7, for 100 bids, matched with an ask of
       70, at the same price etc.
 """
+
+
+def test_filled_volume():
+    havven_model = make_model_without_agents()
+    book = havven_model.market_manager.nomin_fiat_market
+    alice = add_market_player(havven_model)
+    alice.nomins = Dec(100)
+    bob = add_market_player(havven_model)
+    bob.fiat = Dec(100)
+
+    assert (book.filled_quantities(alice) == (Dec(0), Dec(0)))
+    alice.place_nomin_fiat_ask(Dec(10), Dec(1))
+    bob.place_nomin_fiat_bid(Dec(4), Dec(1))
+    bob.place_nomin_fiat_bid(Dec(3), Dec(1))
+    assert (book.filled_quantities(alice) == (Dec(0), Dec(7)))
+    assert (book.filled_quantities(bob) == (Dec(7), Dec(0)))
+    # the other markets are unaffected
+    assert (havven_model.market_manager.havven_fiat_market.filled_quantities(bob) == (Dec(0), Dec(0)))
+
+
+def test_open_quantity():
+    havven_model = make_model_without_agents()
+    book = havven_model.market_manager.nomin_fiat_market
+    alice = add_market_player(havven_model)
+    alice.nomins = Dec(100)
+    bob = add_market_player(havven_model)
+    bob.fiat = Dec(100)
+
+    ask = alice.place_nomin_fiat_ask(Dec(10), Dec(2))
+    bid = bob.place_nomin_fiat_bid(Dec(5), Dec(1))
+    assert (book.open_quantities(alice) == (Dec(10), Dec(0)))
+    assert (book.open_quantities(bob) == (Dec(0), Dec(5)))
+
+    ask.update_quantity(Dec(8))
+    bid.update_price(Dec('1.5'))
+    assert (book.open_quantities(alice) == (Dec(8), Dec(0)))
+    assert (book.open_quantities(bob) == (Dec(0), Dec(5)))
+
+    # a partial fill leaves the remainder open
+    bob.place_nomin_fiat_bid(Dec(5), Dec(2))
+    assert (book.open_quantities(alice) == (Dec(3), Dec(0)))
+    assert (book.open_quantities(bob) == (Dec(0), Dec(5)))
+
+    ask.cancel()
+    assert (book.open_quantities(alice) == (Dec(0), Dec(0)))
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+import agents  # core.orderbook and the agents import each other, so the agents have to come first
+from core.snapshot import BookSnapshot, FrameSnapshot
+from visualization.modules.orderbook_depth import OrderBookModule
+
+
+def make_frame(bids, asks, price=1.0):
+    """A frame holding a single book, given its ([price, ...], [quantity, ...]) of each side, best first."""
+    book = BookSnapshot(
+        price=price, candle=None, rolling_price=None, volume=None,
+        bid_prices=np.array(bids[0], dtype=float), bid_quantities=np.array(bids[1], dtype=float),
+        ask_prices=np.array(asks[0], dtype=float), ask_quantities=np.array(asks[1], dtype=float)
+    )
+    return FrameSnapshot(first=False, model_vars={}, books={"Book": book}, agents=None)
+
+
+def make_module(**kwargs):
+    return OrderBookModule([{"Label": "Book"}], **kwargs)
+
+
+def test_bin_edges():
+    linear = make_module(bins=4, price_range=0.5, spacing="linear")
+    assert(np.allclose(linear.distances(), [0.125, 0.25, 0.375, 0.5]))
+    relative = make_module(bins=3, price_range=0.1, min_distance=0.001)
+    assert(relative.spacing == "relative")
+    assert(np.allclose(relative.distances(), [0.001, 0.01, 0.1]))
+
+    # edges go out from the mid price, not the last traded price
+    frame = make_frame(([0.9], [1]), ([1.1], [1]), price=2.0)
+    price, bids, asks = linear.render(frame)
+    assert(price == 2.0)
+    assert(np.allclose([edge for edge, _ in bids], [0.875, 0.75, 0.625, 0.5]))
+    assert(np.allclose([edge for edge, _ in asks], [1.125, 1.25, 1.375, 1.5]))
+
+    with pytest.raises(ValueError):
+        make_module(spacing="logarithmic")
+
+
+def test_depth_conserved():
+    bid_prices = [0.999, 0.99, 0.95, 0.91, 0.7, 0.2]
+    ask_prices = [1.001, 1.002, 1.008, 1.05, 1.3, 1.9, 2.5]
+    frame = make_frame((bid_prices, [1, 2, 3, 4, 5, 6]), (ask_prices, [1, 2, 3, 4, 5, 6, 7]))
+
+    for spacing in ("linear", "relative"):
+        _, bids, asks = make_module(bins=16, spacing=spacing).render(frame)
+        assert(len(bids) == len(asks) == 16)
+        # everything within the range is kept, and the 2.5 ask is beyond it
+        assert(sum(quantity for _, quantity in bids) == 21)
+        assert(sum(quantity for _, quantity in asks) == 21)
+
+    # each bucket lands in the first bin whose far edge it is no further out than
+    _, bids, asks = make_module(bins=3, price_range=0.1, min_distance=0.001).render(frame)
+    assert([quantity for _, quantity in bids] == [1, 2, 7])
+    assert([quantity for _, quantity in asks] == [1, 5, 4])
+
+
+def test_unbinned_depth():
+    frame = make_frame(([0.9, 0.8], [0.1, 0.2]), ([1.1, 1.3], [0.3, 0.7]))
+    assert(make_module(bins=0).render(frame) == [1.0, [(0.9, 0.1), (0.8, 0.2)], [(1.1, 0.3), (1.3, 0.7)]])
+    # a book with an empty side has no mid price, so the bins are centred on its price
+    frame = make_frame(([], []), ([1.1], [1]), price=1.0)
+    _, bids, asks = make_module(bins=2, price_range=0.2, spacing="linear").render(frame)
+    assert(bids == [])
+    assert(asks == [(1.1, 1.0), (1.2, 0.0)])
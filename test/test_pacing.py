@@ -0,0 +1,52 @@
+import math
+
+from visualization import pacing
+from visualization.pacing import ConsumptionPacer, moving_average
+
+
+def test_moving_average():
+    assert(moving_average(None, 4.0) == 4.0)
+    assert(moving_average(4.0, 8.0, 0.25) == 5.0)
+
+
+def test_window(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(pacing.time, "time", lambda: now[0])
+    pacer = ConsumptionPacer(initial_window=16, min_window=2, max_window=256,
+                             lead_time=2.0, max_ahead_time=10.0)
+
+    # until the client has moved on, its rate is unknown
+    pacer.requested(0)
+    assert(pacer.rate is None and pacer.window(0.01) == 16)
+
+    # 10 steps a second, so 2 seconds of playback is 20 steps ahead
+    now[0] += 1.0
+    pacer.requested(10)
+    assert(pacer.rate == 10.0)
+    assert(pacer.window() == 20)
+    # but no more than 10 seconds of calculation, however slow a step is
+    assert(pacer.window(1.0) == 10)
+    assert(pacer.window(100.0) == 2)
+
+    # repeated requests without playing further don't change the rate
+    now[0] += 5.0
+    pacer.requested(10)
+    assert(pacer.rate == 10.0)
+
+    # the window grows while the client is starved, and shrinks back after
+    pacer.waited(True)
+    pacer.waited(True)
+    assert(pacer.boost == 4.0 and pacer.window() == 80)
+    for _ in range(5):
+        pacer.waited(True)
+    assert(pacer.boost == 8.0 and pacer.window() == 160)
+    for _ in range(50):
+        pacer.waited(False)
+    assert(pacer.boost == 1.0)
+
+    # resetting the run starts measuring from where the client is now
+    pacer.requested(0)
+    now[0] += 0.5
+    pacer.requested(40)
+    assert(pacer.rate == moving_average(10.0, 80.0))
+    assert(pacer.window() == math.ceil(pacer.rate * 2.0))
@@ -0,0 +1,179 @@
+import asyncio
+import datetime
+import itertools
+import json
+import multiprocessing
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from core import settingsloader
+from core.model import HavvenModel
+from core.server import get_vis_elements
+from visualization.model_pool import WarmModelPool, build_model
+from visualization.model_worker import ModelProcessPool
+from visualization.realtime_server import ModelHandler, ProcessModelHandler
+
+
+def default_settings(num_agents=20):
+    settings = settingsloader.get_defaults()
+    model_params = settings['Model']
+    model_params['agent_fractions'] = settings['AgentFractions']
+    model_params['num_agents'] = num_agents
+    return settings, model_params
+
+
+def test_model_thread_waits_for_demand():
+    settings, model_params = default_settings(10)
+
+    async def wait_for_steps(handler, steps):
+        while len(handler.data) < steps:
+            assert(await handler.new_data.wait(timeout=datetime.timedelta(seconds=30)))
+
+    async def run(handler):
+        handler.max_calc_step = 3
+        handler.reset_model(0)
+        threading.Thread(target=handler.run_model, args=(handler,)).start()
+
+        # the model thread calculates up to max_calc_step, and then waits
+        await wait_for_steps(handler, 4)
+        await asyncio.sleep(0.2)
+        assert(len(handler.data) == 4)
+
+        # it carries on when asked for more
+        handler.request_steps(6)
+        await wait_for_steps(handler, 7)
+        await asyncio.sleep(0.2)
+        assert([step for step, _ in handler.data] == list(range(7)))
+
+        # stopping wakes whoever is waiting for a step, and the thread calculates nothing more
+        waiting = asyncio.ensure_future(handler.new_data.wait())
+        await asyncio.sleep(0)
+        handler.stop()
+        assert(await waiting)
+        handler.request_steps(20)
+        await asyncio.sleep(0.2)
+        assert(len(handler.data) == 7)
+
+    async def main():
+        handler = ModelHandler(True, "Havven", HavvenModel, model_params, get_vis_elements(), settings)
+        try:
+            await run(handler)
+        finally:
+            handler.stop()
+
+    asyncio.run(main())
+
+
+def receive(worker, count):
+    """The next count messages from a worker."""
+    messages = []
+    for _ in range(count):
+        assert(worker.conn.poll(60))
+        messages.append(worker.conn.recv())
+    return messages
+
+
+def rendered_frames(model, steps, between_steps=lambda: None):
+    elements = get_vis_elements()
+    frames = []
+    for _ in range(steps):
+        between_steps()
+        model.step()
+        frame = model.frame_snapshot()
+        frames.append(json.dumps([element.render(frame) for element in elements]))
+    return frames
+
+
+def test_runs_ignore_global_random():
+    settings, model_params = default_settings(10)
+    direct_frames = rendered_frames(build_model(HavvenModel, model_params, settings, 1), 6)
+
+    # reseeding or drawing from the process's generator between steps changes nothing
+    model = build_model(HavvenModel, model_params, settings, 1)
+    assert(rendered_frames(model, 6, lambda: random.seed(random.random())) == direct_frames)
+
+    # nor does building the model on the pool's thread, and stepping it on another,
+    # while the pool builds the next model, seeding the global generator as it goes
+    pool = WarmModelPool(HavvenModel, settings, model_params, 1, seed=1)
+    try:
+        model = None
+        for _ in range(600):
+            model = pool.take(model_params, 1)
+            if model is not None:
+                break
+            time.sleep(0.05)
+        frames = []
+        thread = threading.Thread(target=lambda: frames.extend(rendered_frames(model, 6)))
+        thread.start()
+        while thread.is_alive():
+            random.random()
+        thread.join()
+        assert(frames == direct_frames)
+    finally:
+        pool.close()
+
+
+def test_worker_process_tokens():
+    settings, model_params = default_settings(10)
+    direct_frames = rendered_frames(build_model(HavvenModel, model_params, settings, 1), 7)
+
+    pool = ModelProcessPool(1, HavvenModel, settings, get_vis_elements())
+    worker = pool.acquire()
+    try:
+        # a reset straight after another: the steps of the first model are marked with its token
+        worker.send(("reset", model_params, 1, 10, 2))
+        worker.send(("reset", model_params, 1, 11, 4))
+        messages = []
+        while len([message for message in messages if message[0] == 11]) < 5:
+            messages.extend(receive(worker, 1))
+        assert({message[0] for message in messages} <= {10, 11})
+        steps = [message for message in messages if message[0] == 11]
+        assert([step for _, step, _, _ in steps] == list(range(5)))
+        assert([json.dumps(state) for _, _, state, _ in steps] == direct_frames[:5])
+
+        # a checkpoint carries on from where the model got to
+        worker.send(("checkpoint",))
+        (token, step, (checkpoint_step, state), _), = receive(worker, 1)
+        assert((token, step, checkpoint_step) == (11, None, 5))
+        worker.send(("resume", state, 5, 12, 6))
+        steps = receive(worker, 2)
+        assert([(token, step) for token, step, _, _ in steps] == [(12, 5), (12, 6)])
+        assert([json.dumps(state) for _, _, state, _ in steps] == direct_frames[5:])
+    finally:
+        pool.close()
+
+
+def test_process_handler_ignores_old_models():
+    settings, model_params = default_settings(10)
+    elements = get_vis_elements()
+    server_conn, worker_conn = multiprocessing.Pipe()
+    sent = []
+    worker = SimpleNamespace(conn=server_conn, send=sent.append, fileno=server_conn.fileno)
+    pool = SimpleNamespace(tokens=itertools.count(5), release=lambda released: None)
+    timings = (0.1, [0.0] * len(elements))
+
+    async def run():
+        handler = ProcessModelHandler(pool, worker, True, "Havven", HavvenModel, model_params, elements, settings,
+                                      seed=1)
+        handler.reset_model(0)
+        handler.reset_model(1)
+        assert([(message[0], message[3]) for message in sent] == [("reset", 5), ("reset", 6)])
+
+        # steps of the model before the reset are dropped
+        worker_conn.send((5, 0, ["old"], timings))
+        worker_conn.send((6, 0, ["new"], timings))
+        worker_conn.send((6, 1, ["newer"], timings))
+        handler.receive_steps(None, None)
+        assert(handler.data[:] == [(0, ["new"]), (1, ["newer"])])
+        assert(handler.current_step == 2)
+
+        checkpoint = handler.checkpoint()
+        worker_conn.send((5, None, (9, b"old"), None))
+        worker_conn.send((6, None, (2, b"state"), None))
+        handler.receive_steps(None, None)
+        assert(checkpoint.result() == (2, b"state"))
+        handler.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,82 @@
+import os
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from core.cache_store import CacheStore, DatasetReader
+from visualization.shared_runs import FrameLog, SharedRun, SharedRuns
+
+
+def frame(step):
+    return step, [step, [float(step)] * 3]
+
+
+def test_frame_log_window():
+    log = FrameLog()
+    for i in range(10):
+        log.append(frame(i))
+    log.drop_before(4)
+
+    assert((len(log), log.start, log.held) == (10, 4, 6))
+    assert(log[4] == frame(4) and log[-1] == frame(9))
+    with pytest.raises(IndexError):
+        log[3]
+    with pytest.raises(IndexError):
+        log[10]
+    # slices skip the dropped frames
+    assert(log[2:6] == [frame(4), frame(5)])
+    assert(log[:] == [frame(i) for i in range(4, 10)])
+
+    log.drop_before(20)
+    assert((len(log), log.held, log[:]) == (10, 0, []))
+    log.append(frame(10))
+    assert(log[10] == frame(10))
+
+
+def test_copy_frames():
+    log = FrameLog()
+    for i in range(5):
+        log.append((i, [i]))
+    log.drop_before(1)
+
+    reader, start, held = log.copy_frames(4)
+    assert((reader, start, held) == (None, 1, [[1], [2], [3]]))
+    # the copy is unaffected by the log changing afterwards
+    log.append((5, [5]))
+    log.drop_before(3)
+    assert(held == [[1], [2], [3]])
+
+
+def test_spill(tmpdir):
+    store = CacheStore(str(tmpdir), chunk_size=4)
+    shared_runs = SharedRuns(None, {}, 1, store)
+    handler = SimpleNamespace(data=FrameLog(), data_lock=threading.Lock(), model_kwargs={"num_agents": 5})
+    run = shared_runs.runs["key"] = SharedRun("key", handler)
+    log = handler.data
+    for i in range(10):
+        log.append(frame(i))
+
+    def spill(step):
+        shared_runs.memoise(run, step, b"state", shared_runs.copy_frames(run, step))
+        log.spill(DatasetReader(os.path.join(store.path, "key")), step)
+
+    # the frames before the checkpoint are read back from the store, and the rest held
+    spill(6)
+    assert((len(log), log.prefix, log.held) == (10, 6, 4))
+    assert([log[i] for i in range(10)] == [frame(i) for i in range(10)])
+
+    # a later spill writes the stored frames and the held ones out again
+    first_reader = log.reader
+    for i in range(10, 12):
+        log.append(frame(i))
+    spill(11)
+    assert(log.reader is not first_reader)
+    assert((len(log), log.prefix, log.held) == (12, 11, 1))
+    assert(log[:] == [frame(i) for i in range(12)])
+
+    # the run can be continued from the store
+    reader = shared_runs.memo_reader("key")
+    assert(reader.steps == 11 and reader.checkpoint() is not None)
+    reader.close()
+    log.close()
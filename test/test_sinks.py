@@ -0,0 +1,96 @@
+import csv
+import json
+import os
+from decimal import Decimal as Dec
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from core import stats
+from core.sinks import CSVSink, JSONLSink, ColumnSink, MetricSink
+
+
+def fake_model():
+    """Just enough of a model for the sinks: a datacollector and a clock."""
+    return SimpleNamespace(
+        datacollector=SimpleNamespace(model_vars={"Price": [], "Label": [], "Book": []}),
+        manager=SimpleNamespace(time=0)
+    )
+
+
+def step(havven_model, sinks):
+    time = havven_model.manager.time
+    model_vars = havven_model.datacollector.model_vars
+    model_vars["Price"].append(Dec(time) / 2)
+    model_vars["Label"].append(f"s{time}")
+    model_vars["Book"].append(object())
+    for sink in sinks:
+        sink.write(havven_model)
+    havven_model.manager.time += 1
+
+
+def run(sinks, steps):
+    havven_model = fake_model()
+    for _ in range(steps):
+        step(havven_model, sinks)
+    return havven_model
+
+
+def test_sink_formats(tmpdir):
+    csv_sink = CSVSink(str(tmpdir.join("run.csv")), buffer_size=2)
+    jsonl_sink = JSONLSink(str(tmpdir.join("run.jsonl")), buffer_size=2)
+    column_sink = ColumnSink(str(tmpdir.join("columns")), buffer_size=2)
+    sinks = [csv_sink, jsonl_sink, column_sink]
+    run(sinks, 3)
+
+    # full buffers are flushed, and the rest is held until close
+    assert(all(sink.rows_written == 2 and len(sink.buffer) == 1 for sink in sinks))
+    for sink in sinks:
+        sink.close()
+    assert(all(sink.rows_written == 3 and sink.buffer == [] for sink in sinks))
+
+    # objects are skipped, and column sinks only take numbers
+    assert(csv_sink.columns == ["step", "Price", "Label"])
+    assert(column_sink.columns == ["step", "Price"])
+
+    with open(csv_sink.path, newline="") as f:
+        assert(list(csv.reader(f)) == [["step", "Price", "Label"], ["0", "0.0", "s0"],
+                                       ["1", "0.5", "s1"], ["2", "1.0", "s2"]])
+    with open(jsonl_sink.path) as f:
+        assert([json.loads(line) for line in f] == [{"step": i, "Price": i / 2, "Label": f"s{i}"}
+                                                    for i in range(3)])
+    with open(os.path.join(column_sink.path, ColumnSink.header_name)) as f:
+        assert(json.load(f) == {"columns": ["step", "Price"], "rows": 3})
+    assert(list(np.fromfile(column_sink.column_path("Price"), dtype="<f8")) == [0.0, 0.5, 1.0])
+
+
+def test_sinks_replace_old_runs(tmpdir):
+    for _ in range(2):
+        with CSVSink(str(tmpdir.join("run.csv")), reporters=["Price"]) as csv_sink, \
+                JSONLSink(str(tmpdir.join("run.jsonl"))) as jsonl_sink, \
+                ColumnSink(str(tmpdir.join("columns"))) as column_sink:
+            run([csv_sink, jsonl_sink, column_sink], 2)
+
+    with open(csv_sink.path, newline="") as f:
+        assert(list(csv.reader(f)) == [["step", "Price"], ["0", "0.0"], ["1", "0.5"]])
+    with open(jsonl_sink.path) as f:
+        assert(len(f.readlines()) == 2)
+    assert(len(np.fromfile(column_sink.column_path("step"), dtype="<f8")) == 2)
+
+
+def test_sinks_must_write_rows(tmpdir):
+    class Unwritten(MetricSink):
+        pass
+
+    for sink_cls in (MetricSink, Unwritten):
+        with pytest.raises(TypeError):
+            sink_cls(str(tmpdir.join("run")))
+
+
+def test_trim_history():
+    datacollector = SimpleNamespace(model_vars={"a": list(range(5)), "b": [1]},
+                                    agent_vars={"Agents": list(range(4))})
+    stats.trim_history(datacollector, 2)
+    assert(datacollector.model_vars == {"a": [3, 4], "b": [1]})
+    assert(datacollector.agent_vars == {"Agents": [2, 3]})
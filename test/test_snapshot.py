@@ -0,0 +1,149 @@
+import pickle
+import random
+from decimal import Decimal as Dec
+
+import pytest
+
+import agents as ag  # noqa: F401, imported before core.orderbook, which imports it in turn
+from core import settingsloader
+from core.model import HavvenModel
+from core.orderbook import Ask
+from core.server import get_vis_elements
+from core.snapshot import take_snapshot
+
+ORDER_LEGEND = (
+    ["NomFiatAsk",  "NomFiatBid", "HavFiatAsk", "HavFiatBid", "HavNomAsk", "HavNomBid"],
+    ["deepskyblue", "#179473",    "red",        "#8C2E00",    "purple",    "#995266"],
+    [1, 1, 2, 2, 3, 3]
+)
+PORTFOLIO_LEGEND = (
+    ["Fiat", "Escrowed Havvens", "Havvens", "Nomins", "Issued Nomins"],
+    ["darkgreen", "darkred", "red", "deepskyblue", "blue"],
+    [1, 1, 1, 1, 1]
+)
+
+
+def make_model(continuous_order_matching, seed=3, num_agents=30):
+    settings = settingsloader.get_defaults()
+    model_params = settings['Model']
+    model_params['agent_fractions'] = settings['AgentFractions']
+    model_params['num_agents'] = num_agents
+    model_params['continuous_order_matching'] = continuous_order_matching
+    return HavvenModel(model_settings=model_params, fee_settings=settings['Fees'],
+                       agent_settings=settings['Agents'], havven_settings=settings['Havven'], seed=seed)
+
+
+def book_index(book):
+    """The position of a book in the order of the bar graphs: nomin/fiat, havven/fiat, havven/nomin."""
+    if book.quoted == "nomins":
+        return 2
+    return 0 if book.base == "nomins" else 1
+
+
+def legacy_order_totals(agent):
+    """An agent's open asks and bids per book, summed from its orders, as the modules used to."""
+    totals = [Dec(0)] * 6
+    for order in agent.orders:
+        totals[2 * book_index(order.book) + (0 if isinstance(order, Ask) else 1)] += order.quantity
+    return [float(total) for total in totals]
+
+
+def legacy_trade_totals(agent):
+    """
+    An agent's purchases and sales per book, summed from its trades. A trade
+    with itself is in its trades twice, so it is counted once bought and once sold.
+    """
+    totals = [Dec(0)] * 6
+    for trade in {id(trade): trade for trade in agent.trades}.values():
+        if trade.buyer is agent:
+            totals[2 * book_index(trade.book)] += trade.quantity
+        if trade.seller is agent:
+            totals[2 * book_index(trade.book) + 1] += trade.quantity
+    return [float(total) for total in totals]
+
+
+def legacy_bars(legend, names, rows, send_legend):
+    """The bar graph values of each agent's row, with every other column drawn downwards."""
+    vals = (*legend, list(names)) if send_legend else ()
+    columns = [[] for _ in range(len(rows[0]))]
+    for row in rows:
+        for i, value in enumerate(row):
+            columns[i].append(value)
+    return vals + tuple(columns)
+
+
+def legacy_render(element, havven_model, send_legend):
+    """What an element rendered straight from the model, before frame snapshots."""
+    collected = havven_model.datacollector
+    agents = [agent for _, agent in sorted(collected.agent_vars["Agents"][-1], key=lambda x: x[0])]
+    names = [agent.name for agent in agents]
+    kind = type(element).__name__
+
+    if kind == "ChartModule":
+        return [collected.model_vars[s["Label"]][-1] if collected.model_vars.get(s["Label"]) else 0
+                for s in element.series]
+    if kind == "CandleStickModule":
+        book = collected.model_vars[element.series[0]["orderbook"]][-1]
+        if len(book.candle_data) < 2 or len(book.price_data) < 2:
+            return (1., 1., 1., 1.), 1., 1.
+        return (tuple(float(value) for value in book.candle_data[-2]),
+                float(book.price_data[-1]), float(book.volume_data[-1]))
+    if kind == "OrderBookModule":
+        book = collected.model_vars[element.series[0]["Label"]][-1]
+        return [float(book.price),
+                [(float(price), float(quantity)) for price, quantity in book.bid_price_buckets.items()],
+                [(float(price), float(quantity)) for price, quantity in book.ask_price_buckets.items()]]
+    if kind == "WealthModule":
+        wealth = [float(agent.wealth()) for agent in agents]
+        return (["Wealth in fiat"], ["darkgreen"], [1], names, wealth) if send_legend else (wealth,)
+    if kind == "PortfolioModule":
+        rows = []
+        for agent in agents:
+            breakdown = [float(value) for value in agent.portfolio(element.fiat_values)]
+            # issued nomins are drawn downwards
+            rows.append(breakdown[:-1] + [-breakdown[-1]])
+        return legacy_bars(PORTFOLIO_LEGEND, names, rows, send_legend)
+    if kind in ("CurrentOrderModule", "PastOrdersModule"):
+        totals = legacy_order_totals if kind == "CurrentOrderModule" else legacy_trade_totals
+        rows = [[-value if i % 2 else value for i, value in enumerate(totals(agent))] for agent in agents]
+        return legacy_bars(ORDER_LEGEND, names, rows, send_legend)
+    raise AssertionError(f"No reference rendering for {kind}")
+
+
+@pytest.mark.parametrize("continuous_order_matching", [True, False])
+def test_frames_match_model(continuous_order_matching):
+    havven_model = make_model(continuous_order_matching)
+    elements = get_vis_elements()
+    for element in elements:
+        # compare every bucket of the books, rather than their binned depth
+        if hasattr(element, "bins"):
+            element.bins = 0
+
+    for step in range(40):
+        havven_model.step()
+        frame = havven_model.frame_snapshot()
+        assert(frame.first == (step == 0))
+        for element in elements:
+            assert(element.render(frame) == legacy_render(element, havven_model, step == 0))
+
+
+def test_take_snapshot():
+    havven_model = make_model(True, num_agents=20)
+    for _ in range(10):
+        havven_model.step()
+    # agents are listed in order of unique id, however the schedule holds them
+    agents = havven_model.agent_manager.ordered_agents()
+    random.shuffle(havven_model.schedule.agents)
+    frame = take_snapshot(havven_model)
+    assert(frame.agents.names == [agent.name for agent in agents])
+    assert([agent.unique_id for agent in agents] == sorted(agent.unique_id for agent in agents))
+    assert(not frame.first)
+
+    # only order books are snapshotted as books; the rest are the latest values
+    assert(sorted(frame.books) == ["HavvenFiatOrderBook", "HavvenNominOrderBook", "NominFiatOrderBook"])
+    assert(frame.model_vars["Gini"] == havven_model.datacollector.model_vars["Gini"][-1])
+
+    # a snapshot doesn't hold the model, so it can be sent elsewhere and renders the same there
+    copy = pickle.loads(pickle.dumps(frame))
+    assert([element.render(copy) for element in get_vis_elements()] ==
+           [element.render(frame) for element in get_vis_elements()])
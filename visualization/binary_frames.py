@@ -0,0 +1,102 @@
+"""
+binary_frames.py
+
+Binary encoding of the messages sent by the realtime server.
+
+Most of a viz_state message is numbers: chart values, order book depth
+buckets and the per-agent bar graphs. As JSON, every one of them is formatted
+as text on the server, and parsed back on the client. In a binary message,
+lists of numbers are instead packed as little-endian floats, which the client
+reads straight into typed arrays.
+
+A binary message is laid out as:
+    uint32      the length of the JSON skeleton, in bytes
+    bytes       the JSON skeleton: the message with each packed list replaced
+                by {"$b": [offset, length, bits, columns]}
+    padding     to a multiple of 8 bytes from the start of the message
+    arrays      the packed lists, each starting at a multiple of 8 bytes,
+                at offset bytes after the padding
+
+A list of numbers is packed as an array of its length. A list of equally long
+lists of numbers (like depth buckets, or a bar graph's datasets) is packed row
+by row, with columns giving the length of each row; the client splits it
+back into rows. Lists shorter than MIN_PACKED_LENGTH are left in the JSON.
+See unpackMessage in runcontrol.js for the client side.
+"""
+
+import array
+import itertools
+import json
+import struct
+import sys
+from typing import Any, List, Optional, Tuple
+
+MIN_PACKED_LENGTH = 8
+"""Lists of numbers shorter than this aren't worth packing."""
+
+TYPECODES = {32: 'f', 64: 'd'}
+
+
+class _Packer:
+    def __init__(self, bits: int) -> None:
+        self.typecode = TYPECODES[bits]
+        self.bits = bits
+        self.arrays: List[bytes] = []
+        self.offset = 0
+
+    def packed(self, value: Any) -> Tuple[Optional[array.array], int]:
+        """
+        value packed as an array, and its row length (0 for a list of numbers),
+        or None if it isn't a long enough list of numbers, or of rows of them.
+        """
+        if not value:
+            return None, 0
+        first = value[0]
+        if isinstance(first, (list, tuple)):
+            columns = len(first)
+            if columns == 0 or any(not isinstance(row, (list, tuple)) or len(row) != columns for row in value):
+                return None, 0
+            values = itertools.chain.from_iterable(value)
+        elif isinstance(first, (float, int)) and not isinstance(first, bool):
+            columns = 0
+            values = value
+        else:
+            return None, 0
+        if len(value) * max(columns, 1) < MIN_PACKED_LENGTH:
+            return None, 0
+        try:
+            # array raises TypeError for anything but numbers
+            return array.array(self.typecode, values), columns
+        except TypeError:
+            return None, 0
+
+    def pack(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            return {key: self.pack(item) for key, item in value.items()}
+        if not isinstance(value, (list, tuple)):
+            return value
+        packed, columns = self.packed(value)
+        if packed is None:
+            return [self.pack(item) for item in value]
+
+        if sys.byteorder == 'big':
+            packed.byteswap()
+        data = packed.tobytes()
+        placeholder = {"$b": [self.offset, len(packed), self.bits, columns]}
+        padding = -len(data) % 8
+        self.arrays.append(data)
+        self.arrays.append(bytes(padding))
+        self.offset += len(data) + padding
+        return placeholder
+
+
+def pack_message(message: Any, bits: int = 64) -> bytes:
+    """
+    Encode a JSON-ready message as a binary message, with floats of the given bits
+    (32 or 64). Bools in a list of numbers are sent as numbers.
+    """
+    packer = _Packer(bits)
+    skeleton = json.dumps(packer.pack(message), separators=(',', ':')).encode()
+    header = struct.pack('<I', len(skeleton))
+    padding = bytes(-(len(header) + len(skeleton)) % 8)
+    return b"".join([header, skeleton, padding] + packer.arrays)
@@ -1,4 +1,7 @@
 import copy
+import hashlib
+import itertools
+import json
 import os
 import threading
 import time
@@ -11,6 +14,16 @@ import tornado.web
 import tornado.websocket
 
 from core import cache_handler
+from core.cache_store import compressors
+from core.metrics import Counter, Gauge, Histogram, MetricsHandler
+
+sessions = Gauge("cached_sessions", "Open cached dataset connections.")
+step_latency = Histogram("cached_step_latency_seconds",
+                         "Seconds from a connection asking for steps to the first of them being sent, by connection.")
+frames_sent = Counter("cached_frames_sent_total", "Steps sent to connections.")
+bytes_sent = Counter("cached_bytes_sent_total", "Bytes of messages sent to connections.")
+http_requests = Counter("cached_http_requests_total",
+                        "Requests to the dataset HTTP endpoints, by endpoint and whether the client's copy was current.")
 
 
 class CachedPageHandler(tornado.web.RequestHandler):
@@ -29,19 +42,118 @@ class CachedPageHandler(tornado.web.RequestHandler):
                     fps_default=self.application.fps_default)
 
 
+class CachedDataRequestHandler(tornado.web.RequestHandler):
+    """
+    Base handler for the read-only HTTP endpoints serving the cached datasets as JSON.
+
+    Dataset listings and metadata can change when datasets are regenerated, so
+    they are revalidated on every use, while the chunks of an entry are
+    addressed by its key, so full chunks never change and can be cached for good.
+    """
+
+    immutable = "public, max-age=31536000, immutable"
+    revalidate = "no-cache"
+
+    def write_json(self, value, cache_control=revalidate):
+        body = json.dumps(value).encode()
+        self.set_header("Content-Type", "application/json")
+        self.set_header("Cache-Control", cache_control)
+        self.set_header("Etag", '"%s"' % hashlib.sha256(body).hexdigest()[:32])
+        if self.check_etag_header():
+            http_requests.inc(endpoint=type(self).__name__, result="not_modified")
+            self.set_status(304)
+            return
+        http_requests.inc(endpoint=type(self).__name__, result="sent")
+        self.write(body)
+
+
+class DatasetListHandler(CachedDataRequestHandler):
+    """ GET /data: every dataset's metadata. """
+    def get(self):
+        handler = self.application.cached_data_handler
+        self.write_json([handler.get_dataset_meta(name) for name in handler.store.names()])
+
+
+class DatasetHandler(CachedDataRequestHandler):
+    """ GET /data/<name>: a dataset's metadata, including the key its chunks are found under. """
+    def get(self, name):
+        meta = self.application.cached_data_handler.get_dataset_meta(name)
+        if meta is None:
+            raise tornado.web.HTTPError(404)
+        self.write_json(meta)
+
+
+class ChunkHandler(CachedDataRequestHandler):
+    """
+    GET /entries/<key>/chunks/<n>: the steps of the nth chunk of an entry, as a
+    JSON array of [step, frame] pairs. Sent precompressed when the client accepts it.
+    """
+    def get(self, key, chunk):
+        reader = self.application.cached_data_handler.store.entry_reader(key)
+        chunk = int(chunk)
+        if reader is None or chunk >= reader.chunk_count:
+            raise tornado.web.HTTPError(404)
+
+        steps = reader.chunk_steps(chunk)
+        # only the last chunk can be partly filled, and it grows if the entry is extended
+        full = len(steps) == reader.chunk_size
+        self.set_header("Content-Type", "application/json")
+        self.set_header("Cache-Control", self.immutable if full else self.revalidate)
+        self.set_header("Vary", "Accept-Encoding")
+        self.set_header("Etag", '"%s-%d-%d"' % (key, chunk, len(steps)))
+        if self.check_etag_header():
+            http_requests.inc(endpoint=type(self).__name__, result="not_modified")
+            self.set_status(304)
+            return
+        http_requests.inc(endpoint=type(self).__name__, result="sent")
+
+        accepted = [
+            encoding.split(";")[0].strip()
+            for encoding in self.request.headers.get("Accept-Encoding", "").split(",")
+        ]
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and encoding in compressors:
+                self.set_header("Content-Encoding", encoding)
+                self.write(reader.compressed_chunk(chunk, encoding))
+                return
+        self.write(reader.chunk_json(chunk))
+
+
+def end_message(dataset):
+    """The message sent once a client has every step of a dataset."""
+    return b'{"type":"end","dataset":%s}' % json.dumps(dataset).encode()
+
+
 class CachedSocketHandler(tornado.websocket.WebSocketHandler):
-    """ Handler for websocket. """
+    """
+    Handler for websocket.
+
+    Clients fetch steps with get_steps messages: {"step": n} for a single step,
+    or {"step": n, "end_step": m} for the steps in [n, m), with an end_step of
+    null for every step from n on. Ranges are streamed as viz_state messages of
+    up to steps_per_message steps each. Steps are numbered from 0 in requests
+    and from 1 in the replies.
+    """
+
+    steps_per_message = 32
+
+    session_ids = itertools.count()
+    """Ids telling connections apart in the metrics."""
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.resetlock = threading.Lock()
         self.step = 0
         self.last_step_time = time.time()
+        self.request_count = 0
+        self.session = next(self.session_ids)
 
     def open(self):
         """
         When a new user connects to the server via websocket create a new model
         i.e. the same IP can have multiple models.
         """
+        sessions.inc()
         if self.application.verbose:
             print("Socket connection opened")
 
@@ -54,17 +166,16 @@ class CachedSocketHandler(tornado.websocket.WebSocketHandler):
         msg = tornado.escape.json_decode(message)
 
         if msg["type"] == "get_steps":
-            cache_data = self.application.cached_data_handler.get_step(msg['dataset'], msg['step'])
-            if cache_data is False:
-                message = {"type": "end"}
+            # a newer request replaces any stream still being sent
+            self.request_count += 1
+            received = time.perf_counter()
+            if "end_step" not in msg:
+                self.write_message(self.step_range_message(msg['dataset'], msg['step'], msg['step'] + 1))
+                step_latency.observe(time.perf_counter() - received, session=self.session)
             else:
-                data = [(msg['step']+1, cache_data)]
-
-                message = {
-                    "type": "viz_state",
-                    "data": data,
-                }
-            self.write_message(message)
+                tornado.ioloop.IOLoop.current().spawn_callback(
+                    self.stream_steps, self.request_count, msg['dataset'], msg['step'], msg['end_step'], received
+                )
         elif msg["type"] == "get_datasets":
             data = self.application.cached_data_handler.get_dataset_info()
             message = {
@@ -76,45 +187,120 @@ class CachedSocketHandler(tornado.websocket.WebSocketHandler):
             if self.application.verbose:
                 print("Unexpected message!")
 
+    def step_range_message(self, dataset, step_start, step_end):
+        """
+        The viz_state message for the steps in [step_start, step_end) of a dataset,
+        or the end message if there are none.
+        """
+        message = self.application.cached_data_handler.get_steps(dataset, step_start, step_end)
+        if message is None:
+            return end_message(dataset)
+        frames_sent.inc(step_end - step_start)
+        return message
+
+    @tornado.gen.coroutine
+    def stream_steps(self, request, dataset, step_start, step_end, received=None):
+        """
+        Send the steps in [step_start, step_end) of a dataset, or every step from
+        step_start if step_end is None, as a burst of batched messages, followed
+        by the end message if the stream reaches the end of the dataset, or
+        runs out of steps to send.
+        Each batch is written once the previous one has been flushed, and the
+        stream stops early if the client makes a newer request or disconnects.
+        """
+        handler = self.application.cached_data_handler
+        step_count = handler.get_step_count(dataset)
+        to_end = step_end is None or step_end >= step_count
+        if to_end:
+            step_end = step_count
+        try:
+            for step in range(step_start, step_end, self.steps_per_message):
+                if request != self.request_count:
+                    return
+                batch_end = min(step + self.steps_per_message, step_end)
+                message = handler.get_steps(dataset, step, batch_end)
+                if message is None:
+                    # the range was out of bounds, or the dataset got shorter
+                    self.write_message(end_message(dataset))
+                    return
+                yield self.write_message(message)
+                frames_sent.inc(batch_end - step)
+                if received is not None:
+                    step_latency.observe(time.perf_counter() - received, session=self.session)
+                    received = None
+            if to_end and request == self.request_count:
+                self.write_message(end_message(dataset))
+        except tornado.websocket.WebSocketClosedError:
+            pass
+
     def on_close(self):
         """When the user closes the connection destroy the model"""
         if self.application.verbose:
             print("Connection closed:", self)
+        sessions.dec()
+        step_latency.remove(session=self.session)
         del self
 
+    def write_message(self, message, binary=False):
+        """Send a message, counting the bytes sent."""
+        if isinstance(message, dict):
+            message = tornado.escape.json_encode(message)
+        bytes_sent.inc(len(message))
+        return super().write_message(message, binary)
+
 
 class CachedDataHandler:
+    """
+    Serve steps of the cached datasets, read on demand from the cache store.
+    """
     def __init__(self, default_settings):
         self.default_settings = default_settings
-        data = cache_handler.load_saved()
-        all_cached = False
-        for i in cache_handler.run_settings:
-            if i['name'] not in data:
-                break
-        else:
-            all_cached = True
-
-        if not all_cached:
-            data = cache_handler.generate_new_caches(data)
-            cache_handler.save_data(data)
-
-        self.data = data
+        self.store = cache_handler.load_saved()
+        cache_handler.generate_new_caches(
+            self.store,
+            workers=default_settings['Server']['cache_workers'],
+            max_bytes=default_settings['Server']['cache_max_mb'] * 2**20,
+            checkpoint_interval=default_settings['Server']['cache_checkpoint_interval']
+        )
 
     def get_steps(self, dataset, step_start, step_end):
-        if dataset in self.data and \
-                0 <= step_start < step_end < len(self.data[dataset]):
-            return self.data[dataset]['data'][step_start:step_end]
-        return False
+        """
+        The encoded viz_state message holding the steps in [step_start, step_end),
+        built around the stored frame bytes without decoding them. step_end is
+        clamped to the length of the dataset; None if there are no such steps.
+        """
+        reader = self.store.reader(dataset)
+        if reader is None:
+            return None
+        step_end = min(step_end, reader.steps)
+        if not 0 <= step_start < step_end:
+            return None
+        frames = b",".join(
+            b'[%d,%s]' % (step + 1, reader.frame_bytes(step)) for step in range(step_start, step_end)
+        )
+        return b'{"type":"viz_state","dataset":%s,"data":[%s]}' % (json.dumps(dataset).encode(), frames)
 
-    def get_step(self, dataset, step):
-        if dataset in self.data and 0 <= step < len(self.data[dataset]['data']):
-            return self.data[dataset]['data'][step]
-        return False
+    def get_step_count(self, dataset):
+        reader = self.store.reader(dataset)
+        return reader.steps if reader is not None else 0
+
+    def get_dataset_meta(self, dataset):
+        """
+        The metadata of a dataset, with everything needed to fetch its chunks,
+        or None if there is no such dataset.
+        """
+        reader = self.store.reader(dataset)
+        if reader is None:
+            return None
+        meta = dict(reader.meta)
+        meta["chunks"] = reader.chunk_count
+        meta["chunk_url"] = f"/entries/{meta['key']}/chunks/{{chunk}}"
+        return meta
 
     def get_dataset_info(self):
         to_send = []
-        for name in self.data:
-            i = self.data[name]
+        for name in self.store.names():
+            i = self.store.meta(name)
             settings = copy.deepcopy(self.default_settings)
             for section in i["settings"]:
                 if section not in settings:
@@ -147,7 +333,14 @@ class CachedModularServer(tornado.web.Application):
     local_handler = (r'/local/(.*)', tornado.web.StaticFileHandler,
                      {"path": ''})
 
-    handlers = [page_handler, socket_handler, static_handler, local_handler]
+    dataset_list_handler = (r'/data', DatasetListHandler)
+    dataset_handler = (r'/data/([^/]+)', DatasetHandler)
+    chunk_handler = (r'/entries/([0-9a-f]+)/chunks/([0-9]+)', ChunkHandler)
+
+    metrics_handler = (r'/metrics', MetricsHandler)
+
+    handlers = [page_handler, socket_handler, static_handler, local_handler,
+                dataset_list_handler, dataset_handler, chunk_handler, metrics_handler]
 
     settings = {"debug": True,
                 "autoreload": False,
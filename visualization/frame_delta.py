@@ -0,0 +1,88 @@
+"""
+frame_delta.py
+
+Delta encoding of the visualization frames sent by the realtime server.
+
+Consecutive frames mostly repeat each other: the per-agent bar graphs and the
+order book depth buckets only change in a few places from one step to the
+next. Rather than resending every value, a step can be sent as a delta: one
+patch per visualization element, against the frame of the step before it.
+
+A patch is either:
+    None
+        the element's state is unchanged
+    {"r": value}
+        the element's state (or an item of it) is replaced by value
+    {"n": length, "s": [[index, value], ...], "d": [[index, patch], ...]}
+        a list keeps its first length items, with the items at the indices
+        of "s" replaced by their value, and those of "d" patched in turn
+
+Every keyframe_interval steps a whole frame (a keyframe) is sent instead,
+so that a client can start from any keyframe without the steps before it.
+In a viz_state message, a keyframe is sent as [step, frame] and a delta as
+[step, patches, 1]. The client applies patches in runcontrol.js.
+"""
+
+from typing import Any, List, Optional, Sequence, Tuple
+
+MIN_PATCHED_LENGTH = 4
+"""Lists shorter than this are replaced whole, as a patch would be no smaller."""
+
+
+def diff(prev: Any, value: Any) -> Optional[dict]:
+    """The patch turning prev into value, or None if they're equal."""
+    if prev == value:
+        return None
+    if not isinstance(prev, (list, tuple)) or not isinstance(value, (list, tuple)) \
+            or len(value) < MIN_PATCHED_LENGTH:
+        return {"r": value}
+
+    replaced = []
+    patched = []
+    for index, item in enumerate(value):
+        if index >= len(prev):
+            replaced.append([index, item])
+            continue
+        patch = diff(prev[index], item)
+        if patch is None:
+            continue
+        if "r" in patch:
+            replaced.append([index, patch["r"]])
+        else:
+            patched.append([index, patch])
+
+    # a patch changing most of the list is no smaller than the list
+    if len(replaced) + len(patched) > len(value) // 2:
+        return {"r": value}
+    patch = {"n": len(value)}
+    if replaced:
+        patch["s"] = replaced
+    if patched:
+        patch["d"] = patched
+    return patch
+
+
+def diff_frame(prev: Sequence[Any], frame: Sequence[Any]) -> List[Optional[dict]]:
+    """The patch of each element's state, from the frame prev to frame."""
+    return [diff(prev[i], state) if i < len(prev) else {"r": state} for i, state in enumerate(frame)]
+
+
+def encode_steps(steps: Sequence[Tuple[int, Any]], prev: Optional[Tuple[int, Any]],
+                 keyframe_interval: int) -> List[list]:
+    """
+    The items of a viz_state message for (step, frame) pairs, sending
+    each frame as a delta against the step before it where possible.
+
+    :param prev: the (step, frame) pair before the first of steps, which
+     the client already has, or None if the first must be a keyframe
+    :param keyframe_interval: steps between keyframes, 0 to send whole frames
+    """
+    items = []
+    for step, frame in steps:
+        if keyframe_interval <= 0 or step % keyframe_interval == 0 \
+                or prev is None or prev[0] != step - 1:
+            items.append([step, frame])
+        else:
+            items.append([step, diff_frame(prev[1], frame), 1])
+        prev = (step, frame)
+    return items
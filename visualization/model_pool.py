@@ -0,0 +1,74 @@
+"""
+model_pool.py
+
+Models built ahead of time for the realtime server, so that a connection
+(or reset) using the default parameters can start stepping straight away,
+rather than waiting for every agent to be created first.
+"""
+
+import collections
+import json
+import threading
+from typing import Any, Deque, Dict, Optional
+
+
+def build_model(model_cls, model_params: Dict[str, Any], model_settings: Dict[str, Any],
+                seed: Optional[int] = None):
+    """Create a model with the given parameters, and the rest of its settings."""
+    return model_cls(model_params,
+                     model_settings['Fees'],
+                     model_settings['Agents'],
+                     model_settings['Havven'],
+                     seed=seed)
+
+
+def params_key(model_params: Dict[str, Any]) -> str:
+    """A key which is equal for equal sets of resolved model parameters."""
+    return json.dumps(model_params, sort_keys=True, default=str)
+
+
+class WarmModelPool:
+    """
+    Keep up to size models with one set of parameters and seed (the server's
+    defaults) built ahead of time. Whenever one is taken, a background thread builds
+    another to replace it.
+    """
+
+    def __init__(self, model_cls, model_settings: Dict[str, Any],
+                 model_params: Dict[str, Any], size: int, seed: Optional[int] = None) -> None:
+        self.model_cls = model_cls
+        self.model_settings = model_settings
+        self.model_params = model_params
+        self.seed = seed
+        self.key = params_key(model_params)
+        self.size = size
+
+        self.models: Deque[Any] = collections.deque()
+        self.lock = threading.Lock()
+        self.refill_needed = threading.Event()
+        self.running = True
+        self.refill_needed.set()
+        threading.Thread(target=self.refill, daemon=True).start()
+
+    def take(self, model_params: Dict[str, Any], seed: Optional[int] = None) -> Optional[Any]:
+        """A prebuilt model with these parameters and seed, or None if there isn't one."""
+        if params_key(model_params) != self.key or seed != self.seed:
+            return None
+        with self.lock:
+            model = self.models.popleft() if self.models else None
+        self.refill_needed.set()
+        return model
+
+    def refill(self) -> None:
+        """Build models until the pool is full, and then wait until one is taken."""
+        while self.running:
+            self.refill_needed.wait()
+            self.refill_needed.clear()
+            while self.running and len(self.models) < self.size:
+                model = build_model(self.model_cls, self.model_params, self.model_settings, self.seed)
+                with self.lock:
+                    self.models.append(model)
+
+    def close(self) -> None:
+        self.running = False
+        self.refill_needed.set()
@@ -0,0 +1,195 @@
+"""
+model_worker.py
+
+Worker processes for the realtime server, so that each session's model can
+run on its own core, instead of sharing the server process (and its GIL)
+with every other session and the websocket I/O.
+
+A ModelProcessPool holds up to a fixed number of worker processes, started
+as they are first needed, and each session borrows one while it is open.
+Idle workers build a spare model with the server's default parameters and seed,
+which the next reset with those takes instead of building one.
+
+The session and its worker talk over a pipe:
+
+Server -> Worker:
+    ("reset", model_params, seed, token, max_calc_step)
+        create a new model, and calculate steps up to max_calc_step
+    ("resume", state, step, token, max_calc_step)
+        continue a model from a pickled checkpoint state, made at step
+    ("checkpoint",)
+        send back a pickled checkpoint state of the model
+    ("steps", max_calc_step)
+        calculate steps up to max_calc_step
+    ("release",)
+        drop the model, as the session is over
+    ("close",)
+        exit the process
+
+Worker -> Server:
+    (token, step, visualization_state, (step_seconds, render_seconds))
+        the rendered state of a step of the model created by the reset
+        carrying token, so that steps of an old model can be told apart,
+        with the seconds the step took, and those each element took to render
+    (token, None, (step, state), None)
+        a checkpoint: the model and elements, pickled at step
+"""
+
+import copy
+import itertools
+import multiprocessing
+import pickle
+import time
+import traceback
+from typing import Any, Dict, List, Optional
+
+from visualization.model_pool import build_model, params_key
+
+
+def run_worker(conn, model_cls, model_settings: Dict[str, Any], visualization_elements: List[Any],
+               default_params: Optional[Dict[str, Any]] = None, default_seed: Optional[int] = None) -> None:
+    """The main loop of a worker process."""
+    model = None
+    spare = None
+    elements = None
+    token = None
+    step = 0
+    max_calc_step = 0
+    try:
+        while True:
+            # wait for a command whenever there is nothing to calculate
+            if model is None or step > max_calc_step or conn.poll():
+                if spare is None and default_params is not None and not conn.poll():
+                    spare = build_model(model_cls, default_params, model_settings, default_seed)
+                    continue
+                message = conn.recv()
+                if message[0] == "reset":
+                    _, model_params, seed, token, max_calc_step = message
+                    if spare is not None and seed == default_seed \
+                            and params_key(model_params) == params_key(default_params):
+                        model, spare = spare, None
+                    else:
+                        model = build_model(model_cls, model_params, model_settings, seed)
+                    elements = copy.deepcopy(visualization_elements)
+                    step = 0
+                elif message[0] == "resume":
+                    _, state, step, token, max_calc_step = message
+                    model, elements = pickle.loads(state)
+                elif message[0] == "checkpoint":
+                    state = pickle.dumps((model, elements))
+                    conn.send((token, None, (step, state), None))
+                elif message[0] == "steps":
+                    max_calc_step = message[1]
+                elif message[0] == "release":
+                    model = None
+                elif message[0] == "close":
+                    return
+                continue
+
+            started = time.perf_counter()
+            model.step()
+            step_seconds = time.perf_counter() - started
+            frame = model.frame_snapshot()
+            visualization_state = []
+            render_seconds = []
+            for element in elements:
+                started = time.perf_counter()
+                visualization_state.append(element.render(frame))
+                render_seconds.append(time.perf_counter() - started)
+            conn.send((token, step, visualization_state, (step_seconds, render_seconds)))
+            step += 1
+    except (EOFError, BrokenPipeError, KeyboardInterrupt):
+        # the server has gone away
+        return
+    except Exception:
+        print("==========-ERROR-==========")
+        traceback.print_exc()
+        print("Model worker process closed.")
+        print("=========-END ERR-=========")
+
+
+class ModelWorker:
+    """A worker process, and the server's end of its pipe."""
+
+    def __init__(self, context, model_cls, model_settings: Dict[str, Any],
+                 visualization_elements: List[Any], default_params: Optional[Dict[str, Any]],
+                 default_seed: Optional[int]) -> None:
+        self.conn, worker_conn = context.Pipe()
+        self.process = context.Process(
+            target=run_worker,
+            args=(worker_conn, model_cls, model_settings, visualization_elements, default_params, default_seed),
+            daemon=True
+        )
+        self.process.start()
+        worker_conn.close()
+
+    def send(self, message: tuple) -> None:
+        self.conn.send(message)
+
+    def fileno(self) -> int:
+        return self.conn.fileno()
+
+    def close(self) -> None:
+        try:
+            self.conn.send(("close",))
+        except (BrokenPipeError, OSError):
+            pass
+        self.conn.close()
+
+
+class ModelProcessPool:
+    """
+    A bounded pool of model worker processes, started as they're first needed,
+    and reused by later sessions once released.
+    """
+
+    tokens = itertools.count()
+    """Tokens to mark which model a rendered step belongs to, unique across workers."""
+
+    def __init__(self, size: int, model_cls, model_settings: Dict[str, Any],
+                 visualization_elements: List[Any], default_params: Optional[Dict[str, Any]] = None,
+                 default_seed: Optional[int] = None) -> None:
+        self.size = size
+        self.model_cls = model_cls
+        self.model_settings = model_settings
+        self.visualization_elements = visualization_elements
+        self.default_params = default_params
+        self.default_seed = default_seed
+        # workers are started fresh, rather than forked from a server running threads
+        self.context = multiprocessing.get_context("spawn")
+        self.workers: List[ModelWorker] = []
+        self.idle: List[ModelWorker] = []
+
+    def acquire(self) -> Optional[ModelWorker]:
+        """Borrow an idle worker, starting one if there's room, or None if every worker is busy."""
+        # forget any workers which have died
+        self.workers = [worker for worker in self.workers if worker.process.is_alive()]
+        self.idle = [worker for worker in self.idle if worker in self.workers]
+        if self.idle:
+            return self.idle.pop()
+        if len(self.workers) < self.size:
+            return self.start_worker()
+        return None
+
+    def start_worker(self) -> ModelWorker:
+        worker = ModelWorker(self.context, self.model_cls, self.model_settings,
+                             self.visualization_elements, self.default_params, self.default_seed)
+        self.workers.append(worker)
+        return worker
+
+    def start_workers(self, count: int) -> None:
+        """Start up to count idle workers ahead of time, so the first connections don't wait for them."""
+        while len(self.workers) < min(count, self.size):
+            self.idle.append(self.start_worker())
+
+    def release(self, worker: ModelWorker) -> None:
+        """Give a worker back to the pool, once its session is over."""
+        if worker.process.is_alive():
+            worker.send(("release",))
+            self.idle.append(worker)
+
+    def close(self) -> None:
+        for worker in self.workers:
+            worker.close()
+        self.workers = []
+        self.idle = []
@@ -2,9 +2,7 @@
 
 from typing import List, Tuple, Dict
 
-from mesa.datacollection import DataCollector
-
-from core.model import HavvenModel
+from core.snapshot import FrameSnapshot
 from visualization.visualization_element import VisualizationElement
 
 
@@ -30,13 +28,10 @@ class BarGraphModule(VisualizationElement):
         self.js_code: str = f"""elements.push(new BarGraphModule("{group}", "{title}", "{desc}",
             "{series[0]['Label']}",{width},{height}));"""
 
-    def render(self, model: HavvenModel) -> List[Tuple[str, float]]:
+    def render(self, frame: FrameSnapshot) -> List[Tuple[str, float]]:
         """
         return the data to be sent to the websocket to be rendered on the page
         """
-        data_collector: "DataCollector" = getattr(
-            model, self.data_collector_name
-        )
         vals: List[Tuple[str, float]] = []
 
         return vals
@@ -1,10 +1,6 @@
-from decimal import Decimal as Dec
 from typing import List, Tuple, Dict
 
-from mesa.datacollection import DataCollector
-
-from core import orderbook as ob
-from core.model import HavvenModel
+from core.snapshot import FrameSnapshot
 from visualization.visualization_element import VisualizationElement
 
 
@@ -34,39 +30,15 @@ class CandleStickModule(VisualizationElement):
             )
         );"""
 
-    def render(self, model: HavvenModel) -> Tuple[Tuple[float, float, float, float], float, float]:
+    def render(self, frame: FrameSnapshot) -> Tuple[Tuple[float, float, float, float], float, float]:
         """
         return the data to be sent to the websocket to be rendered on the page
         in the format of [[candle data (hi,lo,open,close)], rolling price, volume]
         """
-        data_collector: "DataCollector" = getattr(
-            model, self.data_collector_name
-        )
-        price_data: List[Dec] = []
-        candle_data: List[Dec] = []
-        vol_data: List[Dec] = []
-
+        book = None
         for s in self.series:  # TODO: not use series, as it should only really be one graph
-            name: str = s['orderbook']
-
-            # get the buy and sell orders of the named market and add together
-            # the quantities or orders with the same rates
+            book = frame.books.get(s['orderbook'])
 
-            try:
-                order_book: "ob.OrderBook" = data_collector.model_vars[name][-1]
-                candle_data = order_book.candle_data[:-1]
-                price_data = order_book.price_data[1:]
-                vol_data = order_book.volume_data[1:]
-            except Exception:
-                return (1., 1., 1., 1.), 1., 1.
-        # convert decimals to floats
-        return (
-            (
-                float(candle_data[-1][0]),
-                float(candle_data[-1][1]),
-                float(candle_data[-1][2]),
-                float(candle_data[-1][3])
-            ),
-            float(price_data[-1]),
-            float(vol_data[-1])
-        )
+        if book is None or book.candle is None or book.rolling_price is None or book.volume is None:
+            return (1., 1., 1., 1.), 1., 1.
+        return book.candle, book.rolling_price, book.volume
@@ -66,15 +66,11 @@ class ChartModule(VisualizationElement):
                 new ChartModule("{group}", "{title}", "{desc}", {series_json},
                 {canvas_width}, {canvas_height}));"""
 
-    def render(self, model):
+    def render(self, frame):
         current_values = []
-        data_collector = getattr(model, self.data_collector_name)
 
         for s in self.series:
             name = s["Label"]
-            try:
-                val = data_collector.model_vars[name][-1]  # Latest value
-            except:
-                val = 0
-            current_values.append(val)
+            # Latest value
+            current_values.append(frame.model_vars.get(name, 0))
         return current_values
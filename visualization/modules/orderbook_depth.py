@@ -1,10 +1,8 @@
-from decimal import Decimal as Dec
 from typing import List, Tuple, Dict
 
-from mesa.datacollection import DataCollector
+import numpy as np
 
-from core import orderbook as ob
-from core.model import HavvenModel
+from core.snapshot import FrameSnapshot
 from visualization.visualization_element import VisualizationElement
 
 
@@ -12,6 +10,15 @@ class OrderBookModule(VisualizationElement):
     """
     Display a depth graph for order books to show the quantity
       of buy/sell orders for the given market
+
+    Rather than every price bucket of the book, each side's depth is summed
+      into a fixed number of price bins, going out from the mid price to
+      price_range times it, so frames stay the same size however many
+      distinct prices the book holds. With "relative" spacing, the default,
+      the bins' far edges are spaced geometrically from min_distance times
+      the mid price, so the bins nearest the mid, where most of the orders
+      sit, are the finest; with "linear" spacing, the bins are equally wide.
+      With bins of 0, every bucket is sent.
     """
     package_includes: List[str] = ["DepthGraphModule.js"]
     local_includes: List[str] = []
@@ -19,44 +26,79 @@ class OrderBookModule(VisualizationElement):
     def __init__(
             self, series: List[Dict[str, str]], height: int = 150,
             width: int = 500, data_collector_name: str = "datacollector",
-            desc: str = "", title: str = "", group: str = "") -> None:
+            desc: str = "", title: str = "", group: str = "",
+            bins: int = 64, price_range: float = 1.0, spacing: str = "relative",
+            min_distance: float = 0.001) -> None:
+
+        if spacing not in ("linear", "relative"):
+            raise ValueError(f"Unknown depth bin spacing {spacing}")
 
         self.series = series
         self.height = height
         # currently width does nothing, as it stretches the whole page
         self.width = width
         self.data_collector_name = data_collector_name
+        self.bins = bins
+        self.price_range = price_range
+        self.spacing = spacing
+        self.min_distance = min_distance
 
         self.js_code = f"""elements.push(
             new DepthGraphModule("{group}", "{title}", "{desc}", "{series[0]['Label']}",{width},{height})
         );"""
 
-    def render(self, model: HavvenModel) -> List[List[Tuple[float, float]]]:
+    def distances(self) -> np.ndarray:
+        """The far edge of each bin, as a fraction of the mid price away from it."""
+        if self.spacing == "relative":
+            return np.geomspace(self.min_distance, self.price_range, self.bins)
+        return self.price_range * np.arange(1, self.bins + 1) / self.bins
+
+    @staticmethod
+    def binned(prices: np.ndarray, quantities: np.ndarray, edges: np.ndarray,
+               descending: bool) -> List[Tuple[float, float]]:
+        """
+        The (far edge, quantity) of each bin, given the side's prices, best first,
+        and the quantity at each of them. Each bin holds the quantity at
+        prices between its far edge and the previous bin's, and the first bin
+        everything better than its far edge as well.
+        """
+        if len(prices) == 0:
+            return []
+        # the number of buckets at least as good as each edge
+        if descending:
+            counts = np.searchsorted(-prices, -edges, side="right")
+        else:
+            counts = np.searchsorted(prices, edges, side="right")
+        cumulative = np.concatenate(([0.0], np.cumsum(quantities)))[counts]
+        return list(zip(edges.tolist(), np.diff(cumulative, prepend=0.0).tolist()))
+
+    def render(self, frame: FrameSnapshot) -> List[List[Tuple[float, float]]]:
         """
         return the data to be sent to the websocket to be rendered on the page
         """
-        data_collector: "DataCollector" = getattr(
-            model, self.data_collector_name
-        )
         price = 1.0
-        bids: List[Tuple[Dec, Dec]] = []
-        asks: List[Tuple[Dec, Dec]] = []
+        bids: List[Tuple[float, float]] = []
+        asks: List[Tuple[float, float]] = []
 
         for s in self.series:  # TODO: not use series, as it should only really be one graph
-            name: str = s['Label']
-
-            # get the buy and sell orders of the named market and add together
-            # the quantities or orders with the same rates
-
-            try:
-                order_book: "ob.OrderBook" = data_collector.model_vars[name][-1]
-                price = order_book.price
-                bids = order_book.bid_price_buckets.items()
-                asks = order_book.ask_price_buckets.items()
-            except Exception:
+            book = frame.books.get(s['Label'])
+            if book is None:
                 bids = []
                 asks = []
+                continue
+            price = book.price
+
+            if self.bins <= 0:
+                bids = list(zip(book.bid_prices.tolist(), book.bid_quantities.tolist()))
+                asks = list(zip(book.ask_prices.tolist(), book.ask_quantities.tolist()))
+                continue
 
-        # convert decimals to floats
+            if len(book.bid_prices) and len(book.ask_prices):
+                mid = (book.bid_prices[0] + book.ask_prices[0]) / 2
+            else:
+                mid = price
+            distances = self.distances()
+            bids = self.binned(book.bid_prices, book.bid_quantities, mid * (1 - distances), True)
+            asks = self.binned(book.ask_prices, book.ask_quantities, mid * (1 + distances), False)
 
-        return [float(price), [(float(i[0]), float(i[1])) for i in bids], [(float(i[0]), float(i[1])) for i in asks]]
+        return [price, bids, asks]
@@ -2,10 +2,7 @@
 
 from typing import List, Tuple, Dict
 
-from mesa.datacollection import DataCollector
-
-from core.model import HavvenModel
-from core.orderbook import Bid, Ask
+from core.snapshot import FrameSnapshot
 from .bargraph import BarGraphModule
 
 
@@ -19,12 +16,8 @@ class WealthModule(BarGraphModule):
         # ensure the data for agent names/colours only appears in the first tick
         self.sent_data = False
 
-    def render(self, model: HavvenModel) -> Tuple[List[str], List[str], List[float]]:
-        data_collector: "DataCollector" = getattr(
-            model, self.data_collector_name
-        )
-
-        if len(data_collector.agent_vars["Agents"]) <= 1:
+    def render(self, frame: FrameSnapshot) -> Tuple[List[str], List[str], List[float]]:
+        if frame.first:
             self.sent_data = False
 
         if not self.sent_data:
@@ -35,18 +28,10 @@ class WealthModule(BarGraphModule):
             vals = ([],)
             static_val_len = 0
 
-        try:
-            agents = sorted(
-                data_collector.agent_vars["Agents"][-1],
-                key=lambda x: x[0]
-            )  # [:-1]
-            for item in agents:
-                if not self.sent_data:
-                    vals[3].append(item[1].name)
-                vals[0 + static_val_len].append(float(item[1].wealth()))
-            self.sent_data = True
-        except Exception:
-            vals = []
+        if not self.sent_data:
+            vals[3].extend(frame.agents.names)
+        vals[0 + static_val_len].extend(frame.agents.wealth)
+        self.sent_data = True
 
         return vals
 
@@ -71,12 +56,8 @@ class PortfolioModule(BarGraphModule):
         # ensure the data for agent names/colours only appears in the first tick
         self.sent_data = False
 
-    def render(self, model: HavvenModel) -> PortfolioTuple:
-        data_collector: "DataCollector" = getattr(
-            model, self.data_collector_name
-        )
-
-        if len(data_collector.agent_vars["Agents"]) <= 1:
+    def render(self, frame: FrameSnapshot) -> PortfolioTuple:
+        if frame.first:
             self.sent_data = False
 
         # vals are [datasets],[colours],[bar #],[playername],[dataset 1],...[dataset n]
@@ -89,25 +70,17 @@ class PortfolioModule(BarGraphModule):
             vals = ([], [], [], [], [])
             static_val_len = 0
 
-        try:
-            agents = sorted(
-                data_collector.agent_vars["Agents"][-1],
-                key=lambda x: x[0]
-            )  # [:-1]
-
-            for item in agents:
-                if not self.sent_data:
-                    vals[3].append(item[1].name)
-                breakdown = item[1].portfolio(self.fiat_values)
-                for i in range(len(breakdown)):
-                    # assume that issued nomins are last
-                    if i+1 == len(breakdown):
-                        vals[i + static_val_len].append(-float(breakdown[i]))
-                    else:
-                        vals[i + static_val_len].append(float(breakdown[i]))
-            self.sent_data = True
-        except Exception:
-            vals = []
+        if not self.sent_data:
+            vals[3].extend(frame.agents.names)
+        portfolios = frame.agents.fiat_portfolio if self.fiat_values else frame.agents.portfolio
+        for breakdown in portfolios:
+            for i in range(len(breakdown)):
+                # assume that issued nomins are last
+                if i+1 == len(breakdown):
+                    vals[i + static_val_len].append(-breakdown[i])
+                else:
+                    vals[i + static_val_len].append(breakdown[i])
+        self.sent_data = True
 
         return vals
 
@@ -116,6 +89,30 @@ OrderbookValueTuple = Tuple[List[str], List[str], List[int], List[str], List[flo
                             List[float], List[float], List[float], List[float]]
 
 
+
+def _order_values(sent_data: bool, totals: List[Tuple[float, ...]], names: List[str]) -> OrderbookValueTuple:
+    """
+    The bar graph values of each agent's totals per market, with the ask
+    columns drawn upwards and the bid columns downwards.
+    """
+    # vals are [datasets],[colours],[bar #],[playername],[dataset 1],...[dataset n]
+    if not sent_data:
+        vals: OrderbookValueTuple = (
+            ["NomFiatAsk",  "NomFiatBid", "HavFiatAsk", "HavFiatBid", "HavNomAsk", "HavNomBid"],
+            ["deepskyblue", "#179473",    "red",        "#8C2E00",    "purple",    "#995266"],
+            [1, 1, 2, 2, 3, 3], list(names), [], [], [], [], [], []
+        )
+        static_val_length = 4
+    else:
+        vals = ([], [], [], [], [], [])
+        static_val_length = 0
+
+    for agent_totals in totals:
+        for i, total in enumerate(agent_totals):
+            vals[i + static_val_length].append(-total if i % 2 else total)
+    return vals
+
+
 class CurrentOrderModule(BarGraphModule):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -123,72 +120,12 @@ class CurrentOrderModule(BarGraphModule):
         # ensure the data for agent names/colours only appears in the first tick
         self.sent_data = False
 
-    def render(self, model: HavvenModel) -> OrderbookValueTuple:
-        data_collector: "DataCollector" = getattr(
-            model, self.data_collector_name
-        )
-
-        if len(data_collector.agent_vars["Agents"]) <= 1:
+    def render(self, frame: FrameSnapshot) -> OrderbookValueTuple:
+        if frame.first:
             self.sent_data = False
 
-        # vals are [datasets],[colours],[bar #],[playername],[dataset 1],...[dataset n]
-        if not self.sent_data:
-            vals: OrderbookValueTuple = (
-                ["NomFiatAsk",  "NomFiatBid", "HavFiatAsk", "HavFiatBid", "HavNomAsk", "HavNomBid"],
-                ["deepskyblue", "#179473",    "red",        "#8C2E00",    "purple",    "#995266"],
-                [1, 1, 2, 2, 3, 3], [], [], [], [], [], [], []
-            )
-            static_val_length = 4
-        else:
-            vals = ([], [], [], [], [], [])
-            static_val_length = 0
-
-        try:
-            agents = sorted(
-                data_collector.agent_vars["Agents"][-1],
-                key=lambda x: x[0]
-            )  # [:-1]
-
-            for item in agents:
-                if not self.sent_data:
-                    vals[3].append(item[1].name)
-                orders = item[1].orders
-                nomin_fiat_ask_tot = 0
-                nomin_fiat_bid_tot = 0
-                havven_fiat_ask_tot = 0
-                havven_fiat_bid_tot = 0
-                nomin_havven_ask_tot = 0
-                nomin_havven_bid_tot = 0
-
-                for order in orders:
-                    if order.book.quoted == "fiat":
-                        if order.book.base == "nomins":
-                            # FIAT/NOM
-                            if type(order) == Ask:
-                                nomin_fiat_ask_tot += order.quantity
-                            if type(order) == Bid:
-                                nomin_fiat_bid_tot += order.quantity
-                        if order.book.base == "havvens":
-                            if type(order) == Ask:
-                                havven_fiat_ask_tot += order.quantity
-                            if type(order) == Bid:
-                                havven_fiat_bid_tot += order.quantity
-                    elif order.book.quoted == "nomins":
-                        if type(order) == Ask:
-                            nomin_havven_ask_tot += order.quantity
-                        if type(order) == Bid:
-                            nomin_havven_bid_tot += order.quantity
-
-                vals[0 + static_val_length].append(float(nomin_fiat_ask_tot))
-                vals[1 + static_val_length].append(-float(nomin_fiat_bid_tot))
-                vals[2 + static_val_length].append(float(havven_fiat_ask_tot))
-                vals[3 + static_val_length].append(-float(havven_fiat_bid_tot))
-                vals[4 + static_val_length].append(float(nomin_havven_ask_tot))
-                vals[5 + static_val_length].append(-float(nomin_havven_bid_tot))
-            self.sent_data = True
-        except Exception as e:
-            print(e)
-            vals = []
+        vals = _order_values(self.sent_data, frame.agents.order_totals, frame.agents.names)
+        self.sent_data = True
         return vals
 
 
@@ -199,70 +136,10 @@ class PastOrdersModule(BarGraphModule):
         # ensure the data for agent names/colours only appears in the first tick
         self.sent_data = False
 
-    def render(self, model: HavvenModel) -> OrderbookValueTuple:
-        data_collector: "DataCollector" = getattr(
-            model, self.data_collector_name
-        )
-
-        if len(data_collector.agent_vars["Agents"]) <= 1:
+    def render(self, frame: FrameSnapshot) -> OrderbookValueTuple:
+        if frame.first:
             self.sent_data = False
 
-        # vals are [datasets],[colours],[bar #],[playername],[dataset 1],...[dataset n]
-        if not self.sent_data:
-            vals: OrderbookValueTuple = (
-                ["NomFiatAsk",  "NomFiatBid", "HavFiatAsk", "HavFiatBid", "HavNomAsk", "HavNomBid"],
-                ["deepskyblue", "#179473",    "red",        "#8C2E00",    "purple",    "#995266"],
-                [1, 1, 2, 2, 3, 3], [], [], [], [], [], [], []
-            )
-            static_val_length = 4
-        else:
-            vals = ([], [], [], [], [], [])
-            static_val_length = 0
-        try:
-            agents = sorted(
-                data_collector.agent_vars["Agents"][-1],
-                key=lambda x: x[0]
-            )  # [:-1]
-
-            for item in agents:
-                if not self.sent_data:
-                    vals[3].append(item[1].name)
-                trades = item[1].trades
-                nomin_fiat_ask_tot = 0
-                nomin_fiat_bid_tot = 0
-                havven_fiat_ask_tot = 0
-                havven_fiat_bid_tot = 0
-                nomin_havven_ask_tot = 0
-                nomin_havven_bid_tot = 0
-
-                for trade in trades:
-                    if trade.book.quoted == "fiat":
-                        if trade.book.base == "nomins":
-                            # FIAT/NOM
-                            if trade.buyer == item[1]:
-                                nomin_fiat_ask_tot += trade.quantity
-                            elif trade.seller == item[1]:
-                                nomin_fiat_bid_tot += trade.quantity
-                        if trade.book.base == "havvens":
-                            if trade.buyer == item[1]:
-                                havven_fiat_ask_tot += trade.quantity
-                            elif trade.seller == item[1]:
-                                havven_fiat_bid_tot += trade.quantity
-                    elif trade.book.quoted == "nomins":
-                        if trade.buyer == item[1]:
-                            nomin_havven_ask_tot += trade.quantity
-                        elif trade.seller == item[1]:
-                            nomin_havven_bid_tot += trade.quantity
-
-                vals[0 + static_val_length].append(float(nomin_fiat_ask_tot))
-                vals[1 + static_val_length].append(-float(nomin_fiat_bid_tot))
-                vals[2 + static_val_length].append(float(havven_fiat_ask_tot))
-                vals[3 + static_val_length].append(-float(havven_fiat_bid_tot))
-                vals[4 + static_val_length].append(float(nomin_havven_ask_tot))
-                vals[5 + static_val_length].append(-float(nomin_havven_bid_tot))
-
-            self.sent_data = True
-        except Exception as e:
-            print(e)
-            vals = []
+        vals = _order_values(self.sent_data, frame.agents.trade_totals, frame.agents.names)
+        self.sent_data = True
         return vals
@@ -0,0 +1,80 @@
+"""
+pacing.py
+
+How far ahead of a realtime connection its model should calculate.
+
+Rather than a fixed buffer of steps, each connection measures how quickly its
+client actually goes through steps, and its model handler measures how long
+a step takes to calculate. The model is then kept far enough ahead to cover
+lead_time seconds of playback, but never more than max_ahead_time seconds
+of calculation, so an abandoned tab or paused client only wastes a few steps,
+while fast playback isn't left waiting on the model.
+"""
+
+import math
+import time
+from typing import Optional
+
+SMOOTHING = 0.3
+"""The weight of each new measurement in the moving averages."""
+
+
+def moving_average(average: Optional[float], value: float, smoothing: float = SMOOTHING) -> float:
+    """An exponentially weighted moving average, updated with a new value."""
+    if average is None:
+        return value
+    return average + smoothing * (value - average)
+
+
+class ConsumptionPacer:
+    """
+    Measure the rate a client plays through steps at, and size the window of steps
+    to calculate ahead of it from that and the cost of a step.
+    """
+
+    def __init__(self, initial_window: int = 16, min_window: int = 2, max_window: int = 256,
+                 lead_time: float = 2.0, max_ahead_time: float = 10.0) -> None:
+        """
+        :param initial_window: the window until the client's rate is known
+        :param lead_time: seconds of playback to keep calculated ahead of the client
+        :param max_ahead_time: the most seconds of calculation to do ahead of the client
+        """
+        self.initial_window = initial_window
+        self.min_window = min_window
+        self.max_window = max_window
+        self.lead_time = lead_time
+        self.max_ahead_time = max_ahead_time
+
+        self.rate: Optional[float] = None
+        """Steps per second the client goes through."""
+        self.boost = 1.0
+        """Grows while the client is left waiting for steps, and shrinks back when it isn't."""
+        self.last_position: Optional[int] = None
+        self.last_time: Optional[float] = None
+
+    def requested(self, position: int) -> None:
+        """Note that the client has played up to position."""
+        now = time.time()
+        if self.last_position is not None and position > self.last_position and now > self.last_time:
+            self.rate = moving_average(self.rate, (position - self.last_position) / (now - self.last_time))
+            self.last_position, self.last_time = position, now
+        elif self.last_position is None or position < self.last_position:
+            # the first request, or the run was reset
+            self.last_position, self.last_time = position, now
+
+    def waited(self, starved: bool) -> None:
+        """Note whether the client ran out of steps, and had to wait for the model."""
+        if starved:
+            self.boost = min(self.boost * 2, 8.0)
+        else:
+            self.boost = max(self.boost * 0.9, 1.0)
+
+    def window(self, step_time: Optional[float] = None) -> int:
+        """The number of steps to calculate ahead of the client, given the seconds a step takes."""
+        if self.rate is None:
+            return self.initial_window
+        window = math.ceil(self.rate * self.lead_time * self.boost)
+        limit = self.max_window
+        if step_time:
+            limit = min(limit, math.ceil(self.max_ahead_time / step_time))
+        return max(self.min_window, min(window, limit))
@@ -22,6 +22,11 @@ PageHandler: The handler for the visualization page, generated from a template
              and built from the various visualization elements.
 SocketHandler: Handles the websocket connection between the client page and
                 the server.
+ModelHandler: Runs a model, in the server process.
+ProcessModelHandler: Runs a model in a worker process, from the server's
+                     ModelProcessPool (see model_worker.py).
+SharedRuns: Hands out model handlers to connections, sharing them between
+            connections with the same parameters (see shared_runs.py).
 ModularServer: The overall visualization application class which stores and
                controls the model and visualization instance.
 
@@ -60,6 +65,13 @@ Server -> Client:
     "run_num": current model's run
     }
 
+    With delta_keyframe_interval set, the data items of a viz_state are
+    [step, state] for keyframes, and [step, patches, 1] for steps sent as
+    changes from the step before (see frame_delta.py).
+
+    With binary_frames set, viz_state messages are sent as binary messages
+    instead, with their numbers packed as floats (see binary_frames.py).
+
     Informs the client that the model is over.
     {"type": "end"}
 
@@ -81,7 +93,8 @@ Client -> Server:
     "type": "get_step",
     "step": index of the step to get from,
     "run_num": reset count,
-    "fps": current user fps for having a calculation buffer.
+    "tick": the step the client is showing, to measure how quickly it plays through them,
+    "fps": current user fps.
     }
 
     Submit model parameter updates
@@ -97,21 +110,49 @@ Client -> Server:
     }
 
 """
+import collections
 import copy
+import itertools
 import os
+import pickle
 import threading
 import time
+import weakref
 
 import tornado.autoreload
+import tornado.concurrent
 import tornado.escape
 import tornado.gen
 import tornado.ioloop
+import tornado.locks
 import tornado.web
 import tornado.websocket
 
+from core import cache_handler
+from core.cache_store import CacheStore
+from core.metrics import Counter, Gauge, Histogram, MetricsHandler
+from visualization.binary_frames import pack_message
+from visualization.frame_delta import encode_steps
+from visualization.model_pool import WarmModelPool, build_model
+from visualization.model_worker import ModelProcessPool
+from visualization.pacing import ConsumptionPacer, moving_average
+from visualization.shared_runs import FrameLog, SharedRuns
 from visualization.userparam import UserSettableParameter
 
 
+sessions = Gauge("realtime_sessions", "Open realtime connections.")
+step_latency = Histogram("realtime_step_latency_seconds",
+                         "Seconds from a connection asking for steps to them being sent, by connection.")
+model_step_time = Histogram("realtime_model_step_seconds", "Seconds to calculate a step of a model.")
+render_time = Histogram("realtime_render_seconds", "Seconds to render a step, by visualization element.")
+frames_calculated = Counter("realtime_frames_calculated_total", "Steps calculated and rendered.")
+frames_sent = Counter("realtime_frames_sent_total", "Steps sent to connections.")
+frames_held = Gauge("realtime_frames_held", "Rendered steps held in memory, waiting to be sent or stored.")
+bytes_sent = Counter("realtime_bytes_sent_total", "Bytes of messages sent to connections.")
+worker_processes = Gauge("realtime_model_processes", "Model worker processes, by whether they are running a model.")
+ready_models = Gauge("realtime_warm_models", "Models with the default parameters built ahead of time, ready to use.")
+
+
 class PageHandler(tornado.web.RequestHandler):
     """ Handler for the HTML template which holds the visualization. """
     def get(self):
@@ -130,13 +171,17 @@ class PageHandler(tornado.web.RequestHandler):
 
 class SocketHandler(tornado.websocket.WebSocketHandler):
     """ Handler for websocket. """
+    session_ids = itertools.count()
+    """Ids telling connections apart in the metrics."""
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.resetlock = threading.Lock()
         self.step = -1
         self.last_step_time = time.time()
         self.current_run_num = 0
         self.last_run_num = 0
+        self.pacer = None
+        self.session = next(self.session_ids)
 
     def open(self):
         """
@@ -144,44 +189,39 @@ class SocketHandler(tornado.websocket.WebSocketHandler):
         i.e. same IP can have multiple models
         """
         # self is the connection, not a single socket object
-        self.model_handler = ModelHandler(
-            self.application.threaded,
-            self.application.model_name,
-            copy.deepcopy(self.application.model_cls),
-            copy.deepcopy(self.application.model_params),
-            copy.deepcopy(self.application.visualization_elements),
-            copy.deepcopy(self.application.model_settings)
-        )
-        self.model_handler.reset_model(self.current_run_num)
-        if self.application.threaded:
-            self.model_run_thread = threading.Thread(
-                target=self.model_handler.run_model,
-                args=(self.model_handler,)
-            ).start()
+        self.model_kwargs = copy.deepcopy(self.application.model_params)
+        self.model_handler = self.application.runs.join(self, resolve_model_params(self.model_kwargs))
+        self.pacer = ConsumptionPacer(self.application.calculation_buffer,
+                                      max_window=self.application.fps_max * 10)
 
+        sessions.inc()
         if self.application.verbose:
             print("Socket opened:", self)
 
-    def collect_data_from_step(self, step, fps=None):
+    @tornado.gen.coroutine
+    def collect_data_from_step(self, step, tick=None):
         """
-        Get the data from the model_handler from step to step+fps*2
+        Get the data from the model_handler from step on, waiting for the model
+        thread to calculate the step if it hasn't yet, and have the model calculate
+        ahead of the client's tick by a window sized by the pacer.
         """
-        data = []
-        while len(data) < 1:
-            if fps is None:
-                self.model_handler.max_calc_step = min(
-                    step + self.application.calculation_buffer,
-                    self.application.max_steps
-                )
-                data = self.model_handler.data[step:]
-            else:
-                self.model_handler.max_calc_step = min(
-                    step + max(self.application.calculation_buffer, fps * 10),
-                    self.application.max_steps
-                )
-                data = self.model_handler.data[step:]
+        # the handler is replaced if the model is reset while waiting
+        handler = self.model_handler
+        position = tick if tick is not None else step
+        self.pacer.requested(position)
+        window = self.pacer.window(handler.step_time)
+        handler.request_steps(min(max(step + 1, position + window), self.application.max_steps))
+
+        data = handler.data[step:step + window]
+        # the client only ran out if it has shown everything it has
+        starved = not data and position >= step - 1
+        while len(data) < 1 and handler.running:
+            yield handler.new_data.wait()
+            data = handler.data[step:step + window]
+        self.pacer.waited(starved)
         return data
 
+    @tornado.gen.coroutine
     def on_message(self, message):
         """
         Receiving a message from the websocket, parse, and act accordingly.
@@ -189,51 +229,75 @@ class SocketHandler(tornado.websocket.WebSocketHandler):
         if self.application.verbose:
             print(message)
         msg = tornado.escape.json_decode(message)
+        received = time.perf_counter()
 
         if msg["type"] == "get_steps":
             # message format: {'type':'get_steps', 'run_num':int, 'step':int, 'fps':int}
-            with self.resetlock:
-                # ignore old messages...
-                if msg['run_num'] != self.model_handler.current_run_num:
-                    return
-                client_current_step = msg['step']
-                if client_current_step > self.application.max_steps:
-                    message = {"type": "end"}
-                    self.write_message(message)
+            # ignore old messages...
+            if msg['run_num'] != self.current_run_num:
+                return
+            client_current_step = msg['step']
+            self.application.runs.acknowledge(self, self.model_handler, client_current_step)
+            if client_current_step > self.application.max_steps:
+                message = {"type": "end"}
+                self.write_message(message)
+                return
+            elif self.model_handler.threaded:
+                data = yield self.collect_data_from_step(client_current_step, msg.get('tick'))
+                # the model may have been reset while waiting for the data
+                if msg['run_num'] != self.current_run_num or not data:
                     return
-                elif self.model_handler.threaded:
-                    client_fps = msg['fps']
-                    data = self.collect_data_from_step(client_current_step, client_fps)
-
-                else:
+            else:
+                # another connection sharing the run may have calculated the step already
+                if len(self.model_handler.data) <= client_current_step:
                     curr_time = time.time()
                     # added first less than just in case the time rolls back to 0...
                     # this will prevent someone spamming get_steps, to stop both repeated steps being sent,
                     # as well as clogging up the server with requests
                     if self.last_step_time < curr_time < self.last_step_time + self.application.min_step_time:
                         return
-                    self.last_step_time = curr_time
-                    self.model_handler.step()
+                    # the model may be being checkpointed, in which case the client asks again
+                    if not self.model_handler.data_lock.acquire(blocking=False):
+                        return
+                    try:
+                        self.last_step_time = curr_time
+                        self.model_handler.step()
+                    finally:
+                        self.model_handler.data_lock.release()
+                data = self.model_handler.data[client_current_step:client_current_step + 1]
+                if not data:
                     data = [self.model_handler.data[-1]]
-                self.current_run_num = self.model_handler.current_run_num
+            first_step = data[0][0]
+            prev = None
+            if self.application.delta_keyframe_interval and first_step > 0:
+                try:
+                    prev = self.model_handler.data[first_step - 1]
+                except IndexError:
+                    # the step before has been dropped, so the first frame is sent whole
+                    prev = None
             message = {
                 "type": "viz_state",
-                "data": data,
+                "data": encode_steps(data, prev, self.application.delta_keyframe_interval),
                 "run_num": self.current_run_num
             }
-            self.write_message(message)
+            if self.application.binary_frames:
+                self.write_message(pack_message(message, self.application.binary_frames), binary=True)
+            else:
+                self.write_message(message)
+            frames_sent.inc(len(data))
+            step_latency.observe(time.perf_counter() - received, session=self.session)
 
         elif msg["type"] == "reset":
             # message format: {'type':'reset', 'run_num':int}
-            with self.resetlock:
-                self.current_run_num = msg["run_num"]
-                self.model_handler.reset_model(self.current_run_num)
+            self.current_run_num = msg["run_num"]
+            self.application.runs.leave(self, self.model_handler)
+            self.model_handler = self.application.runs.join(self, resolve_model_params(self.model_kwargs))
 
         elif msg["type"] == "submit_params":
             # message format: {'type':'submit_params', 'param':"str", 'value':<object>}
             param = msg["param"]
             value = msg["value"]
-            self.model_handler.set_model_kwargs(param, value)
+            self.model_kwargs[param] = value
 
         elif msg["type"] == "get_params":
             # message format: {'type':'get_params'}
@@ -249,18 +313,53 @@ class SocketHandler(tornado.websocket.WebSocketHandler):
         """When the user closes the connection destroy the model"""
         if self.application.verbose:
             print("Connection closed:", self)
+        # let the model finish, unless other connections are viewing it
+        self.application.runs.leave(self, self.model_handler)
+        sessions.dec()
+        step_latency.remove(session=self.session)
         del self
 
+    def write_message(self, message, binary=False):
+        """Send a message, counting the bytes sent."""
+        if isinstance(message, dict):
+            message = tornado.escape.json_encode(message)
+        bytes_sent.inc(len(message))
+        return super().write_message(message, binary)
+
+
+def resolve_model_params(model_kwargs):
+    """Model parameters, with the values of user settable parameters filled in."""
+    model_params = {}
+    for key, val in model_kwargs.items():
+        if isinstance(val, UserSettableParameter):
+            if val.param_type == 'static_text':  # static_text is never used for setting params
+                continue
+            model_params[key] = val.value
+        else:
+            model_params[key] = val
+    return model_params
+
 
 class ModelHandler:
     """
     Handle the Model data collection and resetting
+
+    When threaded, the model runs in its own thread, calculating steps until it
+    is max_calc_step steps ahead, and then waiting on the demand condition until
+    a client asks for more. Each new step is announced to the IOLoop through the
+    new_data condition, which clients waiting for a step yield on, so neither
+    side polls.
     """
     model = None
     current_run_num = -1
 
-    def __init__(self, threaded, name, model_cls, model_params, visualization_elements, model_settings):
+    def __init__(self, threaded, name, model_cls, model_params, visualization_elements, model_settings,
+                 warm_pool=None, seed=None, memo=None):
         self.threaded = threaded
+        self.warm_pool = warm_pool
+        self.seed = seed
+        # the reader of a memoised run to continue from its checkpoint, if any
+        self.memo = memo
         self.model_name = name
         self.model_cls = model_cls
         self.description = 'No description available'
@@ -273,55 +372,119 @@ class ModelHandler:
 
         self.model_settings = model_settings
 
-        self.resetting = False
         self.current_step = 0
         self.max_calc_step = 10
+        # moving average of the seconds a step takes to calculate and render
+        self.step_time = None
 
         self.running = True
-        self.data = []
-        self.data_lock = threading.Lock()
-        self.lock = threading.Lock()
+        self.data = FrameLog()
+        # held while the model is stepped or replaced; reentrant, as create_model takes it too
+        self.data_lock = threading.RLock()
+        # notified when the model thread may be allowed to calculate more steps, or should stop
+        self.demand = threading.Condition()
+        # notified on the IOLoop when a new step has been calculated
+        self.io_loop = tornado.ioloop.IOLoop.current()
+        self.new_data = tornado.locks.Condition()
 
     def reset_model(self, run_num):
         """Clear old and create a new model"""
-        self.resetting = True
-        with self.lock:
+        with self.data_lock:
             self.create_model()
-        self.current_run_num = run_num
-        self.resetting = False
-        self.current_step = 0
+            self.current_run_num = run_num
+        with self.demand:
+            self.demand.notify_all()
+
+    def request_steps(self, max_calc_step):
+        """
+        Allow the model thread to calculate up to max_calc_step. Other connections
+        may be viewing the same run, so it never calculates less than before.
+        """
+        with self.demand:
+            self.max_calc_step = max(self.max_calc_step, max_calc_step)
+            self.demand.notify_all()
+
+    def stop(self):
+        """Stop the model thread, and wake anything waiting for steps."""
+        self.running = False
+        with self.demand:
+            self.demand.notify_all()
+        self.new_data.notify_all()
+
+    def start(self):
+        """Start calculating steps ahead in the model thread, if threaded."""
+        if self.threaded:
+            threading.Thread(target=self.run_model, args=(self,)).start()
+
+    def get_model_params(self):
+        """The model parameters, with the values of user settable parameters filled in."""
+        return resolve_model_params(self.model_kwargs)
 
     def create_model(self):
-        """Create a new model, with changed parameters"""
-        model_params = {}
-        for key, val in self.model_kwargs.items():
-            if isinstance(val, UserSettableParameter):
-                if val.param_type == 'static_text':  # static_text is never used for setting params
-                    continue
-                model_params[key] = val.value
-            else:
-                model_params[key] = val
-        self.model = self.model_cls(model_params,
-                                    self.model_settings['Fees'],
-                                    self.model_settings['Agents'],
-                                    self.model_settings['Havven']
-                                    )
+        """
+        Create a new model, with changed parameters, taking a prebuilt one if there is one,
+        or continue the memoised run
+        """
+        if self.memo is not None:
+            checkpoint = self.memo.checkpoint()
+            self.model, self.visualization_elements = pickle.loads(checkpoint["state"])
+            with self.data_lock:
+                self.data = FrameLog(self.memo, checkpoint["step"])
+                self.current_step = checkpoint["step"]
+            return
+
+        model_params = self.get_model_params()
+        model = None
+        if self.warm_pool is not None:
+            model = self.warm_pool.take(model_params, self.seed)
+        if model is None:
+            model = build_model(self.model_cls, model_params, self.model_settings, self.seed)
+        self.model = model
         # clear the data queue
         with self.data_lock:
-            self.data = []
+            self.data = FrameLog()
+            self.current_step = 0
+
+    def checkpoint(self):
+        """
+        A future of the step the model is at, and a pickled checkpoint of the
+        model and its elements, to carry on from that step.
+        The model is pickled on a thread of its own, holding the data lock so
+        it isn't stepped meanwhile, while the IOLoop carries on.
+        """
+        future = tornado.concurrent.Future()
+
+        def pickle_model():
+            try:
+                with self.data_lock:
+                    state = pickle.dumps((self.model, self.visualization_elements))
+                    step = self.current_step
+            except Exception as e:
+                self.io_loop.add_callback(future.set_exception, e)
+            else:
+                self.io_loop.add_callback(future.set_result, (step, state))
+
+        threading.Thread(target=pickle_model, daemon=True).start()
+        return future
 
     def render_model(self):
         """collect the data from the model and put it in the queue to be sent for rendering"""
         visualization_state = []
-        for element in self.visualization_elements:
-            element_state = element.render(self.model)
+        frame = self.model.frame_snapshot()
+        for i, element in enumerate(self.visualization_elements):
+            with render_time.time(element=type(element).__name__, index=i):
+                element_state = element.render(frame)
             visualization_state.append(element_state)
         self.data.append((self.current_step, visualization_state))
+        frames_calculated.inc()
 
     def step(self):
+        started = time.perf_counter()
         self.model.step()
+        model_step_time.observe(time.perf_counter() - started)
         self.render_model()
         self.current_step += 1
+        self.step_time = moving_average(self.step_time, time.perf_counter() - started)
 
     def set_model_kwargs(self, key, val):
         self.model_kwargs[key] = val
@@ -330,17 +493,16 @@ class ModelHandler:
     def run_model(model_handler):
         try:
             while model_handler.running:
-                # allow the model to reset if it hasn't already
-                # TODO: does this cause the lag?
-                while model_handler.resetting:
-                    time.sleep(0.02)
-                # slow it down significantly if the data isn't being used
-                # higher value causes lag when the page is first created
-                while len(model_handler.data) > model_handler.max_calc_step:
-                    time.sleep(0.02)
+                # wait until the data is being used, rather than calculating ahead forever
+                with model_handler.demand:
+                    while model_handler.running and len(model_handler.data) > model_handler.max_calc_step:
+                        model_handler.demand.wait()
+                if not model_handler.running:
+                    break
 
                 with model_handler.data_lock:
                     model_handler.step()
+                model_handler.io_loop.add_callback(model_handler.new_data.notify_all)
 
         except Exception as e:
             print("==========-ERROR-==========")
@@ -356,6 +518,94 @@ class ModelHandler:
             self.model_kwargs[param] = value
 
 
+class ProcessModelHandler(ModelHandler):
+    """
+    Handle a model run by a worker process from the server's pool.
+
+    The steps the worker sends back over its pipe are read on the IOLoop, so
+    this behaves like a threaded ModelHandler, without the model sharing the
+    server process.
+    """
+
+    def __init__(self, pool, worker, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threaded = True
+        self.pool = pool
+        self.worker = worker
+        self.token = None
+        # futures of the checkpoints asked of the worker, in the order they were asked
+        self.pending_checkpoints = collections.deque()
+        self.io_loop.add_handler(worker.fileno(), self.receive_steps, tornado.ioloop.IOLoop.READ)
+
+    def start(self):
+        """The worker calculates steps as soon as the model is created."""
+
+    def create_model(self):
+        """Have the worker create a new model, with changed parameters, or continue the memoised run"""
+        self.token = next(self.pool.tokens)
+        if self.memo is not None:
+            checkpoint = self.memo.checkpoint()
+            self.data = FrameLog(self.memo, checkpoint["step"])
+            self.current_step = checkpoint["step"]
+            self.worker.send(("resume", checkpoint["state"], self.current_step, self.token, self.max_calc_step))
+        else:
+            self.data = FrameLog()
+            self.current_step = 0
+            self.worker.send(("reset", self.get_model_params(), self.seed, self.token, self.max_calc_step))
+
+    def reset_model(self, run_num):
+        """Clear old and create a new model"""
+        self.create_model()
+        self.current_run_num = run_num
+
+    def request_steps(self, max_calc_step):
+        """Allow the worker to calculate up to max_calc_step, never less than before."""
+        if max_calc_step > self.max_calc_step and self.running:
+            self.max_calc_step = max_calc_step
+            self.worker.send(("steps", max_calc_step))
+
+    def checkpoint(self):
+        """A future of the step the worker's model is at, and a pickled checkpoint of it."""
+        future = tornado.concurrent.Future()
+        self.pending_checkpoints.append(future)
+        self.worker.send(("checkpoint",))
+        return future
+
+    def receive_steps(self, fd, events):
+        """Read the steps the worker has sent, ignoring those of old models."""
+        try:
+            while self.worker.conn.poll():
+                token, step, visualization_state, timings = self.worker.conn.recv()
+                if token != self.token:
+                    continue
+                if step is None:
+                    self.pending_checkpoints.popleft().set_result(visualization_state)
+                else:
+                    self.data.append((step, visualization_state))
+                    self.current_step = step + 1
+                    step_seconds, render_seconds = timings
+                    model_step_time.observe(step_seconds)
+                    for i, (element, seconds) in enumerate(zip(self.visualization_elements, render_seconds)):
+                        render_time.observe(seconds, element=type(element).__name__, index=i)
+                    frames_calculated.inc()
+                    self.step_time = moving_average(self.step_time, step_seconds + sum(render_seconds))
+        except (EOFError, OSError):
+            print("Model worker process closed.")
+            self.stop()
+        self.new_data.notify_all()
+
+    def stop(self):
+        """Give the worker back to the pool, and wake anything waiting for steps."""
+        if not self.running:
+            return
+        self.running = False
+        self.io_loop.remove_handler(self.worker.fileno())
+        self.pool.release(self.worker)
+        while self.pending_checkpoints:
+            self.pending_checkpoints.popleft().set_result(None)
+        self.new_data.notify_all()
+
+
 class ModularServer(tornado.web.Application):
     """ Main visualization application. """
     verbose = True
@@ -370,7 +620,9 @@ class ModularServer(tornado.web.Application):
     local_handler = (r'/local/(.*)', tornado.web.StaticFileHandler,
                      {"path": ''})
 
-    handlers = [page_handler, socket_handler, static_handler, local_handler]
+    metrics_handler = (r'/metrics', MetricsHandler)
+
+    handlers = [page_handler, socket_handler, static_handler, local_handler, metrics_handler]
 
     settings = {"debug": True,
                 "autoreload": False,
@@ -392,6 +644,35 @@ class ModularServer(tornado.web.Application):
         self.model_params = model_params
         self.max_steps = settings['Server']['max_steps']
         self.calculation_buffer = 16
+        self.seed = settings['Server']['realtime_seed'] if settings['Server']['realtime_seed'] >= 0 else None
+        default_params = resolve_model_params(model_params)
+        warm_models = settings['Server']['warm_models']
+        self.warm_pool = None
+        if warm_models > 0:
+            self.warm_pool = WarmModelPool(model_cls, settings, default_params, warm_models, self.seed)
+        self.model_pool = None
+        if settings['Server']['model_processes'] > 0:
+            self.model_pool = ModelProcessPool(
+                settings['Server']['model_processes'], model_cls, settings, visualization_elements,
+                default_params, self.seed
+            )
+            self.model_pool.start_workers(warm_models)
+        store = None
+        if self.seed is not None:
+            store = CacheStore(cache_handler.cache_path)
+        self.runs = SharedRuns(self.create_model_handler, settings, self.seed, store,
+                               settings['Server']['cache_max_mb'] * 2**20,
+                               settings['Server']['realtime_held_frames'])
+        # every handler created, for the metrics, until it's no longer used
+        self.model_handlers = weakref.WeakSet()
+        frames_held.read = lambda: sum(handler.data.held for handler in list(self.model_handlers))
+        worker_processes.read = self.model_process_counts
+        ready_models.read = lambda: len(self.warm_pool.models) if self.warm_pool is not None else 0
+        self.delta_keyframe_interval = settings['Server']['delta_keyframe_interval']
+        self.binary_frames = settings['Server']['binary_frames']
+        if self.binary_frames not in (0, 32, 64):
+            print(f"binary_frames should be 0, 32 or 64, not {self.binary_frames}; sending JSON.")
+            self.binary_frames = 0
         self.fps_max = settings['Server']['fps_max']
         self.min_step_time = 1/(self.fps_max + 5)  # give some extra buffer room, just in case
         self.fps_default = settings['Server']['fps_default']
@@ -412,6 +693,40 @@ class ModularServer(tornado.web.Application):
         # Initializing the application itself:
         super().__init__(self.handlers, **self.settings)
 
+    def create_model_handler(self, model_params, seed, memo):
+        """
+        Create and start a handler for a run, in a worker process if one is free;
+        memo is the reader of a memoised run to continue, if any.
+        """
+        handler_args = (
+            self.threaded,
+            self.model_name,
+            self.model_cls,
+            model_params,
+            copy.deepcopy(self.visualization_elements),
+            copy.deepcopy(self.model_settings)
+        )
+        worker = None
+        if self.model_pool is not None:
+            worker = self.model_pool.acquire()
+            if worker is None and self.verbose:
+                print("Every model process is busy, running the model in the server process.")
+        if worker is not None:
+            handler = ProcessModelHandler(self.model_pool, worker, *handler_args, seed=seed, memo=memo)
+        else:
+            handler = ModelHandler(*handler_args, warm_pool=self.warm_pool, seed=seed, memo=memo)
+        handler.reset_model(0)
+        handler.start()
+        self.model_handlers.add(handler)
+        return handler
+
+    def model_process_counts(self):
+        """The number of model worker processes running a model, and idle, for the metrics."""
+        if self.model_pool is None:
+            return []
+        idle = len(self.model_pool.idle)
+        return [({"state": "busy"}, len(self.model_pool.workers) - idle), ({"state": "idle"}, idle)]
+
     @property
     def user_params(self):
         result = {}
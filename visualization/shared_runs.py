@@ -0,0 +1,281 @@
+"""
+shared_runs.py
+
+Runs of the realtime server shared between connections.
+
+A seeded model run is fully determined by its parameters and seed, so every
+connection viewing a run with the same ones is handed the same ModelHandler,
+whose frames are kept in a FrameLog; each connection only keeps track of the
+step it is at. The server's load then grows with the number of distinct runs
+being viewed, rather than the number of viewers.
+
+Once the last viewer of a shared run leaves, the run is memoised into the
+cache store: its frames are saved, along with a checkpoint of the model, so
+a later visitor is sent the saved frames, and the model carries on from the
+checkpoint if they go past them. A long shared run is also memoised as it
+goes, so that only a bounded number of its frames are held in memory, and
+the rest are read back from the store.
+"""
+
+import collections
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+import tornado.gen
+import tornado.ioloop
+
+from core.cache_handler import code_fingerprint
+from core.cache_store import CacheStore, DatasetReader
+from core.metrics import Counter
+
+runs_joined = Counter("realtime_runs_joined_total",
+                      "Runs handed to connections, by source: a live shared run, one continued from "
+                      "the store, a new shared run, or a private run.")
+runs_spilled = Counter("realtime_runs_spilled_total", "Times frames of a shared run were written out to the store.")
+
+
+class FrameLog:
+    """
+    The (step, visualization_state) pairs of a run, starting with a prefix of
+    memoised frames read from a stored entry, followed by the calculated ones.
+    Supports the list operations handlers use: len, indexing, slicing and append.
+
+    Only a window of the calculated frames is held in memory: frames every
+    viewer has been sent are dropped, and a shared run's frames are written
+    out to the store (see SharedRuns.spill) and read back from there.
+    """
+
+    def __init__(self, reader: Optional[DatasetReader] = None, prefix: int = 0) -> None:
+        self.reader = reader
+        self.prefix = prefix if reader is not None else 0
+        # the step of the first frame held in memory
+        self.start = self.prefix
+        self.frames: Deque[Tuple[int, Any]] = collections.deque()
+
+    def __len__(self) -> int:
+        return self.start + len(self.frames)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            # dropped frames are skipped, as whoever they were for has them
+            return [self[i] for i in range(*index.indices(len(self))) if not self.prefix <= i < self.start]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("frame log index out of range")
+        if index < self.prefix:
+            return index, self.reader.frame(index)
+        if index < self.start:
+            raise IndexError("frame has been dropped")
+        return self.frames[index - self.start]
+
+    def append(self, frame: Tuple[int, Any]) -> None:
+        self.frames.append(frame)
+
+    @property
+    def held(self) -> int:
+        """The number of frames held in memory."""
+        return len(self.frames)
+
+    def drop_before(self, step: int) -> None:
+        """Stop holding the frames before step in memory."""
+        while self.frames and self.start < step:
+            self.frames.popleft()
+            self.start += 1
+
+    def copy_frames(self, stop: int) -> Tuple[Optional[DatasetReader], int, List[Any]]:
+        """
+        The reader of the memoised prefix, and the step of the first frame held
+        in memory, with a copy of the visualization states of the held frames
+        before stop, so they can be read elsewhere while this log is added to.
+        """
+        held = [state for _, state in itertools.islice(self.frames, 0, max(0, stop - self.start))]
+        return self.reader, self.start, held
+
+    def spill(self, reader: DatasetReader, steps: int) -> None:
+        """Read the first steps frames from reader, now that they're stored, rather than memory."""
+        if self.reader is not None and self.reader is not reader:
+            self.reader.close()
+        self.reader = reader
+        self.prefix = max(self.prefix, steps)
+        self.drop_before(steps)
+
+    def close(self) -> None:
+        if self.reader is not None:
+            self.reader.close()
+
+
+def run_key(model_params: Dict[str, Any], seed: int, model_settings: Dict[str, Any]) -> str:
+    """
+    The key of a realtime run in the cache store: a hash of its parameters,
+    the settings the model is built with, its seed and the model code.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps({
+        "realtime": model_params,
+        "settings": {section: model_settings[section] for section in ('Fees', 'Agents', 'Havven')}
+    }, sort_keys=True, default=str).encode())
+    digest.update(str(seed).encode())
+    digest.update(code_fingerprint().encode())
+    return digest.hexdigest()[:32]
+
+
+class SharedRun:
+    """A run, and the connections viewing it."""
+
+    def __init__(self, key: str, handler) -> None:
+        self.key = key
+        self.handler = handler
+        self.viewers: Set[Any] = set()
+        self.spilling = False
+
+
+class SharedRuns:
+    """
+    Hand out ModelHandlers to connections, sharing one between every
+    connection with the same parameters, if the server seeds its models.
+    Without a seed, every connection gets a run of its own.
+    """
+
+    def __init__(self, create_handler: Callable, model_settings: Dict[str, Any], seed: Optional[int],
+                 store: Optional[CacheStore] = None, max_bytes: Optional[int] = None,
+                 held_frames: int = 256) -> None:
+        """
+        :param create_handler: create_handler(model_params, seed, memo) creates
+         and starts a ModelHandler, continuing the memoised run read by memo if given
+        :param store: the cache store to memoise runs in, if any
+        :param max_bytes: the size to keep the store within, evicting old entries
+        :param held_frames: the frames of a shared run to hold in memory,
+         before they're written out to the store with a checkpoint
+        """
+        self.create_handler = create_handler
+        self.model_settings = model_settings
+        self.seed = seed
+        self.store = store
+        self.max_bytes = max_bytes
+        self.held_frames = held_frames
+        self.runs: Dict[str, SharedRun] = {}
+        # memoised runs are written one at a time, off the IOLoop
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def join(self, viewer, model_params: Dict[str, Any]):
+        """The handler of the run with these parameters, for a connection to view."""
+        if self.seed is None:
+            runs_joined.inc(source="private")
+            return self.create_handler(model_params, None, None)
+        key = run_key(model_params, self.seed, self.model_settings)
+        run = self.runs.get(key)
+        if run is None:
+            memo = self.memo_reader(key)
+            runs_joined.inc(source="store" if memo is not None else "new")
+            run = SharedRun(key, self.create_handler(model_params, self.seed, memo))
+            self.runs[key] = run
+        else:
+            runs_joined.inc(source="live")
+        run.viewers.add(viewer)
+        return run.handler
+
+    def leave(self, viewer, handler) -> None:
+        """Stop viewing a run, which is stopped, and memoised if shared, once nobody views it."""
+        for run in self.runs.values():
+            if run.handler is handler:
+                run.viewers.discard(viewer)
+                if not run.viewers:
+                    tornado.ioloop.IOLoop.current().spawn_callback(self.retire, run)
+                return
+        handler.stop()
+
+    def acknowledge(self, viewer, handler, step: int) -> None:
+        """
+        Note that a viewer has every frame before step. A run of its own drops
+        them from memory, keeping the last for deltas against it; a shared run
+        writes them out to the store once it holds too many.
+        """
+        for run in self.runs.values():
+            if run.handler is handler:
+                if handler.data.held > self.held_frames and not run.spilling:
+                    tornado.ioloop.IOLoop.current().spawn_callback(self.spill, run)
+                return
+        handler.data.drop_before(step - 1)
+
+    def memo_reader(self, key: str) -> Optional[DatasetReader]:
+        """A reader for the memoised run with this key, if there is one to continue."""
+        if self.store is None or not self.store.has_entry(key):
+            return None
+        reader = DatasetReader(os.path.join(self.store.path, key))
+        if reader.checkpoint() is None:
+            reader.close()
+            return None
+        return reader
+
+    @tornado.gen.coroutine
+    def retire(self, run: SharedRun):
+        """Stop a run nobody is viewing, and memoise it if it got further than before."""
+        checkpoint = None
+        if self.store is not None and len(run.handler.data) > run.handler.data.prefix:
+            checkpoint = yield run.handler.checkpoint()
+        if run.viewers or self.runs.get(run.key) is not run:
+            # somebody started viewing it again in the meantime
+            return
+        del self.runs[run.key]
+        run.handler.stop()
+        if checkpoint is not None:
+            step, state = checkpoint
+            yield self.executor.submit(self.memoise, run, step, state, self.copy_frames(run, step))
+        run.handler.data.close()
+
+    @tornado.gen.coroutine
+    def spill(self, run: SharedRun):
+        """Write the frames of a shared run out to the store, with a checkpoint, and stop holding them."""
+        run.spilling = True
+        try:
+            checkpoint = yield run.handler.checkpoint()
+            if checkpoint is None:
+                return
+            step, state = checkpoint
+            yield self.executor.submit(self.memoise, run, step, state, self.copy_frames(run, step))
+            runs_spilled.inc()
+            if self.runs.get(run.key) is run:
+                run.handler.data.spill(DatasetReader(os.path.join(self.store.path, run.key)), step)
+        finally:
+            run.spilling = False
+
+    @staticmethod
+    def copy_frames(run: SharedRun, step: int) -> Tuple[Optional[DatasetReader], int, List[Any]]:
+        """
+        Copy the frames of a run before step on the IOLoop, under the handler's
+        lock, as the model thread appends to its frame log, and the IOLoop
+        drops frames from it, while the run is memoised.
+        """
+        with run.handler.data_lock:
+            return run.handler.data.copy_frames(step)
+
+    def memoise(self, run: SharedRun, step: int, state: bytes,
+                frames: Tuple[Optional[DatasetReader], int, List[Any]]) -> None:
+        """
+        Save the frames of a run up to a checkpoint made at step, with the
+        checkpoint; frames is the copy of them made by copy_frames.
+        """
+        reader, start, held = frames
+        writer = self.store.writer(None, run.key, {
+            "model_params": run.handler.model_kwargs,
+            "seed": self.seed,
+            "max_steps": step,
+            "description": "Memoised realtime run"
+        })
+        writer.start()
+        if writer.steps >= step:
+            # what is stored already got as far
+            writer.abort()
+            return
+        for i in range(writer.steps, step):
+            writer.append(held[i - start] if i >= start else reader.frame(i))
+        writer.checkpoint(state)
+        self.store.install(None, run.key, writer.finish())
+        if self.max_bytes is not None:
+            # the entries of runs still going are read from
+            self.store.evict(self.max_bytes, keep=list(self.runs))
@@ -103,6 +103,9 @@ var DepthGraphModule = function (group, title, desc, label, width, height) {
         }
 
         let avg_price = (max_bid + min_ask) / 2;
+        // the server bins depth out to exactly the edge of the range,
+        // so leave some slack for rounding in the average
+        let slack = 1e-9;
 
         let cumulative_quant = 0;
         let added_bid = false;
@@ -110,7 +113,7 @@ var DepthGraphModule = function (group, title, desc, label, width, height) {
         let _ask_data = [];
         for (let i in bids) {
             let price = bids[i][0];
-            if (price < avg_price * (1 - price_range)) break;
+            if (price < avg_price * (1 - price_range) - slack) break;
             added_bid = true;
             cumulative_quant += bids[i][1];
             _bid_data.unshift(
@@ -133,7 +136,7 @@ var DepthGraphModule = function (group, title, desc, label, width, height) {
         let added_ask = false;
         for (let i in asks) {
             let price = asks[i][0];
-            if (price > avg_price * (1 + price_range)) break;
+            if (price > avg_price * (1 + price_range) + slack) break;
             added_ask = true;
             cumulative_quant += asks[i][1];
             _ask_data.push(
@@ -27,6 +27,7 @@ var MesaVisualizationControl = function() {
     this.description = "";
     this.dataset_name = "";
     this.dataset_max_steps = 1;
+    this.streaming = null; // The dataset whose remaining steps are being streamed
 };
 
 var player; // Variable to store the continuous player
@@ -359,9 +360,11 @@ ws.onmessage = function(message) {
         case "viz_state":
 
             var data = msg["data"];
+            // a stream may still be sending steps of the previously selected dataset
+            var steps = control.data[msg["dataset"] || control.dataset];
 
             // workaround for first step being skipped
-            if (control.data[control.dataset].length === 0 && data.length > 0) {
+            if (steps.length === 0 && data.length > 0) {
                 if (data[0][0] !== 1) {
                     control.tick = -1;
                     return;
@@ -371,14 +374,18 @@ ws.onmessage = function(message) {
             for (var i in data) {
                 let step = data[i][0];
                 let dataset = data[i][1];
-                if (control.data[control.dataset].length <= step) {
-                    control.data[control.dataset].push(dataset);
+                if (steps.length <= step) {
+                    steps.push(dataset);
                 }
             }
             break;
 
         case "end":
+            if (msg["dataset"] !== undefined && msg["dataset"] !== control.dataset) {
+                break;
+            }
             // We have reached the end of the model
+            control.streaming = null;
             control.done = true;
             console.log("Done!");
             $(playPauseButton.children()[0]).html("<span style=\"font-size: 16.5px;text-shadow: 0 0 12px rgba(0,255,125,1);\" class=\"glyphicon glyphicon-stop\"></span>");
@@ -426,6 +433,7 @@ var reset = function($e) {
     }
     control.tick = 0;
     control.last_sent = control.data[control.dataset].length - 1;
+    control.streaming = null;
     control.done = false;
     if (control.running) {
         run();
@@ -453,9 +461,13 @@ var single_step = function() {
     }
     control.tick += 1;
     let fps = parseInt(control.fps);
-    if (control.tick >= control.data[control.dataset].length && control.last_sent !== control.data[control.dataset].length) {
+    // request every remaining step at once, which the server streams in batches
+    if (control.tick >= control.data[control.dataset].length && control.streaming !== control.dataset) {
         control.last_sent = control.data[control.dataset].length;
-        if (!control.done) send({"type": "get_steps", "step": control.data[control.dataset].length, "fps": fps, "dataset": control.dataset});
+        if (!control.done) {
+            control.streaming = control.dataset;
+            send({"type": "get_steps", "step": control.data[control.dataset].length, "end_step": null, "fps": fps, "dataset": control.dataset});
+        }
     }
 
 };
@@ -56,6 +56,8 @@ var agent_values = {};
 
 // Open the websocket connection; support TLS-specific URLs when appropriate
 var ws = new WebSocket((window.location.protocol === "https:" ? "wss://" : "ws://") + location.host + "/ws");
+// binary messages are read as ArrayBuffers, for their arrays to be viewed in place
+ws.binaryType = "arraybuffer";
 
 ws.onopen = function() {
     console.log("Connection opened!");
@@ -286,9 +288,70 @@ var initGUI = function() {
     }
 };
 
+/**
+ * Apply a patch (see frame_delta.py) to a value, returning the patched copy,
+ * so that the frames of earlier steps are left as they were.
+ */
+var applyPatch = function(value, patch) {
+    if (patch === null) {
+        return value;
+    }
+    if (patch.hasOwnProperty("r")) {
+        return patch["r"];
+    }
+    // copied into an Array even if value is a typed array, as the patch may lengthen it
+    let patched = Array.prototype.slice.call(value, 0, patch["n"]);
+    for (let [index, item] of (patch["s"] || [])) {
+        patched[index] = item;
+    }
+    for (let [index, item_patch] of (patch["d"] || [])) {
+        patched[index] = applyPatch(patched[index], item_patch);
+    }
+    return patched;
+};
+
+/** The frame of a step, from the frame of the step before it and the patches of each element. */
+var applyFrameDelta = function(prev, patches) {
+    return patches.map((patch, i) => applyPatch(prev[i], patch));
+};
+
+/**
+ * Decode a binary message (see binary_frames.py): a JSON skeleton, with the
+ * packed lists of numbers it refers to read into typed arrays.
+ */
+var unpackMessage = function(buffer) {
+    let skeleton_length = new DataView(buffer).getUint32(0, true);
+    let skeleton = new TextDecoder().decode(new Uint8Array(buffer, 4, skeleton_length));
+    let arrays_start = Math.ceil((4 + skeleton_length) / 8) * 8;
+
+    let unpack = function(value) {
+        if (value === null || typeof value !== "object") {
+            return value;
+        }
+        if (value.hasOwnProperty("$b")) {
+            let [offset, length, bits, columns] = value["$b"];
+            let ArrayType = bits === 32 ? Float32Array : Float64Array;
+            let values = new ArrayType(buffer, arrays_start + offset, length);
+            if (columns === 0) {
+                return values;
+            }
+            let rows = [];
+            for (let i = 0; i < length; i += columns) {
+                rows.push(values.subarray(i, i + columns));
+            }
+            return rows;
+        }
+        for (let key in value) {
+            value[key] = unpack(value[key]);
+        }
+        return value;
+    };
+    return unpack(JSON.parse(skeleton));
+};
+
 /** Parse and handle an incoming message on the WebSocket connection. */
 ws.onmessage = function(message) {
-    var msg = JSON.parse(message.data);
+    var msg = (message.data instanceof ArrayBuffer) ? unpackMessage(message.data) : JSON.parse(message.data);
     console.log(msg);
     switch (msg["type"]) {
         case "viz_state":
@@ -303,6 +366,13 @@ ws.onmessage = function(message) {
                 let step = data[i][0];
                 let dataset = data[i][1];
 
+                // a delta is only sent for a step when the step before it was sent
+                if (data[i][2]) {
+                    if (control.data.length !== step || step === 0) {
+                        continue;
+                    }
+                    dataset = applyFrameDelta(control.data[step - 1], dataset);
+                }
                 if (control.data.length <= step) {
                     control.data.push(dataset);
                 }
@@ -363,9 +433,9 @@ var single_step = function() {
 
     if (control.tick > control.data.length - fps*2 && control.last_sent !== control.data.length) {
         control.last_sent = control.data.length;
-        if (!control.done) send({"type": "get_steps", "step": control.data.length, "fps": fps, "run_num": control.run_number});
+        if (!control.done) send({"type": "get_steps", "step": control.data.length, "tick": control.tick, "fps": fps, "run_num": control.run_number});
     } else {
-        if (!control.done) send({"type": "get_steps", "step": control.data.length, "fps": fps, "run_num": control.run_number});
+        if (!control.done) send({"type": "get_steps", "step": control.data.length, "tick": control.tick, "fps": fps, "run_num": control.run_number});
     }
     update_graphs();
 };
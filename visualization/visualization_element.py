@@ -11,8 +11,8 @@ class VisualizationElement:
         js_code: A JavaScript code string to instantiate the element.
 
     Methods:
-        render: Takes a model object, and produces JSON data which can be sent
-                to the client.
+        render: Takes a frame snapshot of the model (see core/snapshot.py),
+                and produces JSON data which can be sent to the client.
 
     """
 
@@ -24,11 +24,11 @@ class VisualizationElement:
     def __init__(self):
         pass
 
-    def render(self, model):
-        """ Build visualization data from a model object.
+    def render(self, frame):
+        """ Build visualization data from a frame snapshot of a model.
 
         Args:
-            model: A model object
+            frame: A FrameSnapshot of the model's latest step
 
         Returns:
             A JSON-ready object.